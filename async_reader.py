@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Async Reader - asyncio driver for NFC readers and the continuous card station
+
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from clock import DEFAULT_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncReader:
+    """
+    asyncio wrapper around a blocking reader (nfc.ContactlessFrontend or SimulatedDevice)
+
+    Every reader call runs on one dedicated thread, so RF commands stay
+    serialized (frontends are not thread-safe) while the event loop stays
+    free for scheduling, reporting and persistence.
+    """
+
+    def __init__(self, device, targets=()):
+        self.device = device
+        self.targets = tuple(targets)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nfc-reader')
+
+    async def call(self, func, *args, **kwargs):
+        """Run a blocking, reader-bound function on the reader thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def sense(self):
+        """Poll once for any of the configured target types"""
+        return await self.call(self.device.sense, *self.targets)
+
+    async def wait_for_card(self, poll_interval=DEFAULT_POLL_INTERVAL):
+        """Poll until a card shows up and return its target"""
+        while True:
+            try:
+                target = await self.sense()
+                if target:
+                    return target
+            except Exception as e:
+                logger.error(f"Error scanning for targets: {e}")
+            await asyncio.sleep(poll_interval)
+
+    def shutdown(self):
+        """Stop the reader thread (the device itself is closed by its owner)"""
+        self._executor.shutdown(wait=True)
+
+
+class AsyncStation:
+    """
+    Continuous card station built on AsyncReader
+
+    Three stages overlap: the reader thread detects cards and runs the
+    attack on them back to back; progress arrives as events on an asyncio
+    queue and is rendered by a reporter task instead of blocking prints on
+    the reader thread; and the key dictionary is saved on a separate
+    persistence thread while the reader already waits for the next card.
+    """
+
+    def __init__(self, cracker, targets=(), poll_interval=DEFAULT_POLL_INTERVAL, render=None):
+        self.cracker = cracker
+        self.reader = AsyncReader(cracker.device, targets)
+        self.poll_interval = poll_interval
+        self.render = render or cracker.print_event
+        self.events = None
+        self.cards = 0
+        self._persist = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nfc-persist')
+
+    async def _report(self):
+        while True:
+            kind, data = await self.events.get()
+            try:
+                self.render(kind, data)
+            except Exception as e:
+                logger.error(f"Error reporting {kind} event: {e}")
+            finally:
+                self.events.task_done()
+
+    def _save(self):
+        try:
+            self.cracker.key_store.save()
+        except Exception as e:
+            logger.error(f"Error saving key store: {e}")
+
+    async def run(self, continuous=True, max_cards=None):
+        """Process cards until cancelled, after one card if not continuous, or after max_cards"""
+        loop = asyncio.get_running_loop()
+        self.events = asyncio.Queue()
+
+        def on_event(kind, data):
+            loop.call_soon_threadsafe(self.events.put_nowait, (kind, data))
+
+        self.cracker.on_event = on_event
+        self.cracker.autosave = False
+        reporter = asyncio.create_task(self._report())
+        saves = set()
+
+        try:
+            while True:
+                on_event('waiting', {})
+                target = await self.reader.wait_for_card(self.poll_interval)
+                await self.reader.call(self.cracker.analyze_card, target)
+                self.cards += 1
+
+                # Persist in the background while the reader looks for the next card
+                save = loop.run_in_executor(self._persist, self._save)
+                saves.add(save)
+                save.add_done_callback(saves.discard)
+
+                if not continuous or (max_cards is not None and self.cards >= max_cards):
+                    break
+        finally:
+            if saves:
+                await asyncio.gather(*saves, return_exceptions=True)
+            # Let the reporter drain queued events (events posted from the
+            # reader thread land on the next loop iteration)
+            await asyncio.sleep(0)
+            await self.events.join()
+            reporter.cancel()
+            self.cracker.on_event = None
+            self.cracker.autosave = True
+            self.reader.shutdown()
+            self._persist.shutdown(wait=True)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Attack Planner - Minimal MIFARE Classic authentications for a full dump from access bits
+
+from collections import namedtuple
+
+from access_conditions import readable_blocks
+
+KEY_TYPES = ('A', 'B')
+
+# One authentication of a plan and the sector offsets to read after it
+PlanStep = namedtuple('PlanStep', ['sector', 'key_type', 'key', 'blocks'])
+
+
+def plan_key_types(conditions, block_count, missing=None, preferred=()):
+    """
+    Ordered key types needed to read the `missing` block offsets of a sector
+
+    With valid access conditions this is the smallest set of key types whose
+    read permissions cover every missing block any key may read (one key
+    type when it covers them all, preferring `preferred` and then key A),
+    or nothing when no missing block is readable. Without them both key
+    types are returned, A first, as nothing can be ruled out.
+    """
+    order = sorted(KEY_TYPES, key=lambda key_type: (key_type not in preferred, key_type))
+    if conditions is None or not conditions.valid:
+        return tuple(order)
+
+    missing = set(range(block_count)) if missing is None else set(missing)
+    readable = {key_type: readable_blocks(conditions, block_count, key_type) & missing
+                for key_type in KEY_TYPES}
+    needed = readable['A'] | readable['B']
+    if not needed:
+        return ()
+    for key_type in order:
+        if readable[key_type] >= needed:
+            return (key_type,)
+    return tuple(order)
+
+
+class DumpPlan:
+    """
+    Authentications needed to dump a card whose keys and trailers are known
+
+    `naive_attempts` counts what a blind dump costs, authenticating every
+    sector it has a key for with key A and then key B; `saved` is the
+    difference.
+    """
+
+    def __init__(self, steps, unreadable, naive_attempts):
+        self.steps = steps
+        self.unreadable = unreadable
+        self.naive_attempts = naive_attempts
+
+    @property
+    def attempts(self):
+        return len(self.steps)
+
+    @property
+    def saved(self):
+        return self.naive_attempts - self.attempts
+
+    def __repr__(self):
+        return f"DumpPlan({self.attempts} authentications, {self.saved} saved)"
+
+
+def plan_dump(geometry, trailers, keys):
+    """
+    Build the minimal DumpPlan for a card
+
+    `trailers` maps sectors to decoded AccessConditions and `keys` maps
+    sectors to {'A': key or None, 'B': key or None}. Sectors with unknown or
+    invalid access bits are authenticated with every known key, since no
+    key type can be ruled out for them.
+    """
+    steps = []
+    unreadable = {}
+    naive_attempts = 0
+
+    for sector, layout in enumerate(geometry.sectors):
+        sector_keys = keys.get(sector, {})
+        known = [key_type for key_type in KEY_TYPES if sector_keys.get(key_type)]
+        if known:
+            naive_attempts += len(KEY_TYPES)
+        conditions = trailers.get(sector)
+
+        if conditions is None or not conditions.valid:
+            steps.extend(PlanStep(sector, key_type, sector_keys[key_type], None) for key_type in known)
+            continue
+
+        # The planned key types first, then any other known key for what they leave
+        missing = set(range(layout.block_count))
+        order = [key_type for key_type in plan_key_types(conditions, layout.block_count, missing, known)
+                 if key_type in known]
+        order += [key_type for key_type in known if key_type not in order]
+        for key_type in order:
+            blocks = readable_blocks(conditions, layout.block_count, key_type) & missing
+            if blocks:
+                steps.append(PlanStep(sector, key_type, sector_keys[key_type], tuple(sorted(blocks))))
+                missing -= blocks
+        if missing:
+            unreadable[sector] = tuple(sorted(missing))
+
+    return DumpPlan(steps, unreadable, naive_attempts)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# Checkpoint - Resumable attack progress per card UID
+
+import os
+import json
+import time
+import logging
+import threading
+
+from key_store import _atomic_write
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = "nfc_checkpoints.json"
+
+CHECKPOINT_VERSION = 1
+
+KEY_FIELDS = {'A': 'key_a', 'B': 'key_b'}
+
+
+class CardCheckpoint:
+    """
+    Attack progress on one card
+
+    Per sector it holds the keys found, how many keys of the dictionary
+    each key type has definitely rejected, and nonces captured for offline
+    key recovery that were not solved yet. Dictionary positions only mean
+    something for the same dictionary order, so the size of the dictionary
+    and its ranked keys are kept with them.
+    """
+
+    def __init__(self, uid, data=None):
+        data = data or {}
+        self.uid = uid
+        self.card_type = data.get('card_type')
+        self.updated = data.get('updated')
+        self.dictionary_size = data.get('dictionary_size')
+        self.ranked = [bytes.fromhex(key) for key in data['ranked']] if 'ranked' in data else None
+        self.sectors = {int(sector): entry for sector, entry in data.get('sectors', {}).items()}
+
+    def __bool__(self):
+        """True when there is progress to resume"""
+        return bool(self.sectors)
+
+    def _sector(self, sector):
+        self.updated = time.time()
+        return self.sectors.setdefault(sector, {})
+
+    def key(self, sector, key_type):
+        """Key of `key_type` ("A" or "B") found for a sector, or None"""
+        key = self.sectors.get(sector, {}).get(KEY_FIELDS[key_type])
+        return bytes.fromhex(key) if key else None
+
+    def set_key(self, sector, key_type, key):
+        entry = self._sector(sector)
+        entry[KEY_FIELDS[key_type]] = key.hex().upper()
+        entry.pop(f"nonces_{key_type.lower()}", None)
+
+    def keys(self):
+        """Every key found on the card"""
+        return {bytes.fromhex(entry[field]) for entry in self.sectors.values()
+                for field in KEY_FIELDS.values() if entry.get(field)}
+
+    def tried(self, sector, key_type):
+        """Number of dictionary keys the card rejected for this sector and key type"""
+        return self.sectors.get(sector, {}).get(f"tried_{key_type.lower()}", 0)
+
+    def set_tried(self, sector, key_type, count):
+        self._sector(sector)[f"tried_{key_type.lower()}"] = count
+
+    def reset_dictionary(self, size, ranked):
+        """Bind the checkpoint to a new dictionary order, forgetting positions in the old one"""
+        for entry in self.sectors.values():
+            entry.pop('tried_a', None)
+            entry.pop('tried_b', None)
+        self.dictionary_size = size
+        self.ranked = list(ranked)
+
+    def traces(self, sector, key_type):
+        """Captured but unsolved nonce traces, as tuples of integers"""
+        return [tuple(trace) for trace in self.sectors.get(sector, {}).get(f"nonces_{key_type.lower()}", [])]
+
+    def set_traces(self, sector, key_type, traces):
+        self._sector(sector)[f"nonces_{key_type.lower()}"] = [list(trace) for trace in traces]
+
+    def to_dict(self):
+        data = {
+            'card_type': self.card_type,
+            'updated': self.updated,
+            'dictionary_size': self.dictionary_size,
+            'sectors': {str(sector): entry for sector, entry in sorted(self.sectors.items())},
+        }
+        if self.ranked is not None:
+            data['ranked'] = [key.hex().upper() for key in self.ranked]
+        return data
+
+
+class CheckpointStore:
+    """
+    CardCheckpoints of every unfinished card, keyed by UID
+
+    The whole store is one JSON file, rewritten atomically on every save,
+    so an interrupted run never leaves a torn checkpoint behind. One store
+    may be shared by the crackers of several readers.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH):
+        self.path = path
+        self._cards = {}
+        self._lock = threading.RLock()
+        # Serializes disk writes; save() numbers its snapshots so that a
+        # slow writer never replaces a newer file with an older snapshot
+        self._write_lock = threading.Lock()
+        self._snapshots = 0
+        self._written = 0
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == CHECKPOINT_VERSION:
+                    self._cards = {uid: CardCheckpoint(uid, card) for uid, card in data['cards'].items()}
+            except Exception as e:
+                logger.error(f"Error loading checkpoints {path}: {e}")
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __contains__(self, uid):
+        return uid.hex().upper() in self._cards
+
+    def get(self, uid, card_type=None):
+        """Checkpoint of a card, empty if it was never interrupted"""
+        name = uid.hex().upper()
+        with self._lock:
+            checkpoint = self._cards.get(name)
+            if checkpoint is None:
+                checkpoint = self._cards[name] = CardCheckpoint(name)
+            if card_type:
+                checkpoint.card_type = card_type
+            return checkpoint
+
+    def discard(self, uid):
+        """Forget a card once its attack finished"""
+        with self._lock:
+            checkpoint = self._cards.pop(uid.hex().upper(), None)
+        if checkpoint:
+            self.save()
+
+    def save(self):
+        """Persist every checkpoint (no-op for in-memory stores)"""
+        if not self.path:
+            return
+        # Snapshot under the lock, write outside it so readers never wait on disk I/O
+        with self._lock:
+            cards = {uid: checkpoint.to_dict() for uid, checkpoint in self._cards.items() if checkpoint}
+            data = json.dumps({'version': CHECKPOINT_VERSION, 'cards': cards}, sort_keys=True).encode()
+            self._snapshots += 1
+            snapshot = self._snapshots
+        with self._write_lock:
+            if snapshot < self._written:
+                return
+            try:
+                _atomic_write(self.path, data)
+                self._written = snapshot
+            except Exception as e:
+                logger.error(f"Error saving checkpoints {self.path}: {e}")
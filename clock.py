@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Clock - Pluggable time source for attack timing, real on hardware and virtual in simulation
+
+import time
+import threading
+
+# Seconds between reader polls while no card is present
+DEFAULT_POLL_INTERVAL = 0.1
+
+
+class SystemClock:
+    """Wall-clock time: sleep() really waits"""
+
+    def now(self):
+        """Monotonic seconds"""
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    Simulated time: sleep() advances the clock instead of waiting
+
+    Used in simulation mode and tests so simulated RF latency and attack
+    pacing cost no wall time, while now() still reports how long the run
+    would have taken on hardware. Safe to share between reader threads;
+    slept() tells the time each thread spent apart from the others.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = start
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            with self._lock:
+                self._now += seconds
+            self._local.slept = self.slept() + seconds
+
+    def slept(self):
+        """Virtual seconds the calling thread has slept"""
+        return getattr(self._local, 'slept', 0.0)
+
+
+# Shared default for code that is not given a clock
+SYSTEM_CLOCK = SystemClock()
+
+
+def clock_for(simulation):
+    """Pick the clock for a run: virtual in simulation, real on hardware"""
+    return VirtualClock() if simulation else SYSTEM_CLOCK
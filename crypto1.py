@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# Crypto1 - MIFARE Classic Crypto1 cipher and batched offline key recovery
+
+import sys
+import time
+import random
+import argparse
+from itertools import islice
+from collections import namedtuple
+
+# NumPy is optional - without it recovery falls back to the (slow)
+# one-key-at-a-time reference implementation below. It is only imported
+# by _numpy() once keys are searched, so the cipher itself (all the
+# simulator needs) loads without it.
+np = None
+_numpy_checked = False
+
+# LFSR feedback taps: x48 = x0 ^ x5 ^ x9 ^ ... ^ x43
+LFSR_TAPS = (0, 5, 9, 10, 12, 14, 15, 17, 19, 24, 25, 27, 29, 35, 39, 41, 42, 43)
+LFSR_MASK = sum(1 << tap for tap in LFSR_TAPS)
+
+# Number of candidate keys processed per bitsliced batch (multiple of 64)
+DEFAULT_BATCH_SIZE = 1 << 16
+
+# Default numeric key range searched in addition to the dictionary keys
+DEFAULT_KEY_RANGE = (0, 1 << 20)
+
+# Below this many surviving candidates the scalar reference is cheaper
+# than another bitsliced pass
+SCALAR_THRESHOLD = 256
+
+# The encrypted 4-bit NACK sent by the card during a darkside attack
+NACK = 0x5
+
+# A nested authentication: the plaintext tag nonce (predicted from the PRNG
+# distance) and the same nonce as it was sent encrypted under the target key
+NestedTrace = namedtuple('NestedTrace', ['uid', 'nt', 'nt_enc'])
+
+# A darkside attempt: the tag nonce, the encrypted reader nonce we sent and
+# the encrypted NACK the card answered with
+DarksideTrace = namedtuple('DarksideTrace', ['uid', 'nt', 'nr_enc', 'nack_enc'])
+
+
+def _fa(y0, y1, y2, y3):
+    """Crypto1 filter function fa (works on bits and on bitsliced words)"""
+    return ((y0 | y1) ^ (y0 & y3)) ^ (y2 & ((y0 ^ y1) | y3))
+
+
+def _fb(y0, y1, y2, y3):
+    """Crypto1 filter function fb (works on bits and on bitsliced words)"""
+    return ((y0 & y1) | y2) ^ ((y0 ^ y1) & (y2 | y3))
+
+
+def _fc(y0, y1, y2, y3, y4):
+    """Crypto1 output function fc (works on bits and on bitsliced words)"""
+    return (y0 | ((y1 | y4) & (y3 ^ y4))) ^ ((y0 ^ (y1 & y3)) & ((y2 ^ y3) | (y1 & y4)))
+
+
+def _filter(x, o=0):
+    """Keystream bit for the LFSR window x[o:o + 48]"""
+    return _fc(_fa(x[o + 9], x[o + 11], x[o + 13], x[o + 15]),
+               _fb(x[o + 17], x[o + 19], x[o + 21], x[o + 23]),
+               _fb(x[o + 25], x[o + 27], x[o + 29], x[o + 31]),
+               _fa(x[o + 33], x[o + 35], x[o + 37], x[o + 39]),
+               _fb(x[o + 41], x[o + 43], x[o + 45], x[o + 47]))
+
+
+def _parity(value):
+    return bin(value).count('1') & 1
+
+
+def _swap32(value):
+    return int.from_bytes(value.to_bytes(4, 'big'), 'little')
+
+
+def prng_successor(nonce, steps):
+    """Advance the 16-bit card PRNG that generates 32-bit tag nonces"""
+    x = _swap32(nonce)
+    for _ in range(steps):
+        x = (x >> 1) | (((x >> 16) ^ (x >> 18) ^ (x >> 19) ^ (x >> 21)) & 1) << 31
+    return _swap32(x)
+
+
+def key_to_int(key):
+    """Convert a 6-byte key to the integer used for key ranges"""
+    return int.from_bytes(key, 'big')
+
+
+def int_to_key(value):
+    """Convert a key-range integer back to a 6-byte key"""
+    return int(value).to_bytes(6, 'big')
+
+
+class Crypto1:
+    """
+    Reference Crypto1 implementation, one bit at a time
+
+    Bit i of self.state is LFSR cell x_i. The key is loaded byte by byte,
+    least significant bit first, so x0..x7 come from key[0].
+    """
+
+    def __init__(self, key):
+        self.state = int.from_bytes(key, 'little')
+
+    def peek(self):
+        """Return the next keystream bit without clocking the LFSR"""
+        s = self.state
+        return _filter([(s >> i) & 1 for i in range(48)])
+
+    def bit(self, value=0, encrypted=False):
+        """Clock the LFSR once, shifting in `value`, and return the keystream bit"""
+        ks = self.peek()
+        feedback = _parity(self.state & LFSR_MASK) ^ (value & 1)
+        if encrypted:
+            feedback ^= ks
+        self.state = (self.state >> 1) | (feedback << 47)
+        return ks
+
+    def word(self, value=0, encrypted=False):
+        """Clock 32 bits in transmission order and return the keystream word"""
+        ks = 0
+        for i in range(32):
+            ks |= self.bit((value >> (i ^ 24)) & 1, encrypted) << (i ^ 24)
+        return ks
+
+
+def nested_trace(key, uid, nt):
+    """Build the trace a card holding `key` produces for a nested auth"""
+    cipher = Crypto1(key)
+    return NestedTrace(uid, nt, nt ^ cipher.word(uid ^ nt))
+
+
+def darkside_trace(key, uid, nt, nr_enc):
+    """Build the trace a card holding `key` produces for a darkside attempt"""
+    cipher = Crypto1(key)
+    cipher.word(uid ^ nt)
+    cipher.word(nr_enc, encrypted=True)
+    cipher.word()
+    ks = 0
+    for i in range(4):
+        ks |= cipher.bit() << i
+    return DarksideTrace(uid, nt, nr_enc, NACK ^ ks)
+
+
+def _trace_program(trace):
+    """
+    Translate a trace into (input_bit, encrypted, expected_keystream) steps
+
+    expected_keystream is None for steps whose keystream is not observed.
+    """
+    steps = []
+    if isinstance(trace, NestedTrace):
+        feed = trace.uid ^ trace.nt
+        ks = trace.nt ^ trace.nt_enc
+        for i in range(32):
+            steps.append(((feed >> (i ^ 24)) & 1, False, (ks >> (i ^ 24)) & 1))
+    elif isinstance(trace, DarksideTrace):
+        feed = trace.uid ^ trace.nt
+        for i in range(32):
+            steps.append(((feed >> (i ^ 24)) & 1, False, None))
+        for i in range(32):
+            steps.append(((trace.nr_enc >> (i ^ 24)) & 1, True, None))
+        steps.extend([(0, False, None)] * 32)
+        ks = trace.nack_enc ^ NACK
+        for i in range(4):
+            steps.append((0, False, (ks >> i) & 1))
+    else:
+        raise TypeError(f"Unsupported trace type: {type(trace).__name__}")
+    return steps
+
+
+def _matches(key, program):
+    """Check one key against a trace program with the reference cipher"""
+    cipher = Crypto1(key)
+    for value, encrypted, expected in program:
+        ks = cipher.bit(value, encrypted)
+        if expected is not None and ks != expected:
+            return False
+    return True
+
+
+def _numpy():
+    """Import NumPy on first use; returns None when it is not installed"""
+    global np, _ONES, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+        _ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+    return np
+
+
+# Bitsliced words for key-integer bits 0-5 when lane j holds base + j
+_LANE_PATTERNS = [sum(1 << lane for lane in range(64) if (lane >> bit) & 1)
+                  for bit in range(6)]
+
+
+def _bitslice(keys):
+    """
+    Transpose candidate keys into 48 bitsliced uint64 arrays
+
+    Lane j of word w in slice i holds LFSR cell x_i of keys[64 * w + j].
+    `keys` must have a length that is a multiple of 64.
+    """
+    words = len(keys) // 64
+    key_bytes = keys.astype('>u8').view(np.uint8).reshape(-1, 8)[:, 2:]
+    bits = np.unpackbits(key_bytes, axis=1, bitorder='little')
+    bits = bits.reshape(words, 64, 48).transpose(2, 0, 1)
+    packed = np.packbits(bits, axis=-1, bitorder='little')
+    return list(np.ascontiguousarray(packed).view('<u8').reshape(48, words).astype(np.uint64))
+
+
+def _bitslice_range(base, words):
+    """
+    Bitsliced LFSR cells for the consecutive keys base .. base + 64 * words - 1
+
+    `base` must be a multiple of 64, so the low six key bits are the same
+    fixed lane pattern in every word and no transpose is needed.
+    """
+    bases = np.uint64(base) + np.arange(words, dtype=np.uint64) * np.uint64(64)
+    window = []
+    for i in range(48):
+        position = (5 - i // 8) * 8 + i % 8
+        if position < 6:
+            window.append(np.full(words, _LANE_PATTERNS[position], dtype=np.uint64))
+        else:
+            window.append(((bases >> np.uint64(position)) & np.uint64(1)) * _ONES)
+    return window
+
+
+def _run_bitsliced(window, alive, program):
+    """
+    Clock every lane of `window` through `program`
+
+    Returns (alive, words): the surviving lane mask for each word still
+    in play and the index of that word in the original batch.
+    """
+    words = np.arange(len(alive))
+    for step, (value, encrypted, expected) in enumerate(program):
+        ks = _filter(window)
+        feedback = window[0]
+        for tap in LFSR_TAPS[1:]:
+            feedback = feedback ^ window[tap]
+        if value:
+            feedback = ~feedback
+        if encrypted:
+            feedback = feedback ^ ks
+        window = window[1:]
+        window.append(feedback)
+
+        if expected is not None:
+            alive &= ks if expected else ~ks
+
+        # Drop dead words so later clocks only touch live candidates
+        if step % 8 == 7:
+            live = np.flatnonzero(alive)
+            if len(live) < len(alive) // 2:
+                window = [w[live] for w in window]
+                alive = alive[live]
+                words = words[live]
+            if len(live) == 0:
+                break
+    return alive, words
+
+
+def _surviving_lanes(alive, words):
+    """Global lane indices (64 * word + lane) of the set bits in `alive`"""
+    lanes = np.unpackbits(alive.astype('<u8').view(np.uint8), bitorder='little')
+    word_idx, lane_idx = np.nonzero(lanes.reshape(len(words), 64))
+    return words[word_idx].astype(np.uint64) * np.uint64(64) + lane_idx.astype(np.uint64)
+
+
+def _bitsliced_batch(keys):
+    """
+    Lay out a candidate batch (uint64 array or range) for _run_bitsliced
+
+    Returns (base, padded, window, alive). Ranges start at lane `base`
+    and need no transpose (padded is None); arrays are padded to whole
+    words. The result can be shared by several programs, as running one
+    never modifies the window and only a copy of `alive`.
+    """
+    if isinstance(keys, range):
+        base = keys.start - keys.start % 64
+        words = -(-(keys.stop - base) // 64)
+        alive = np.full(words, _ONES, dtype=np.uint64)
+        alive[0] &= np.uint64((_ONES << np.uint64(keys.start - base)) & _ONES)
+        tail = keys.stop - base - 64 * (words - 1)
+        alive[-1] &= np.uint64((1 << tail) - 1)
+        return base, None, _bitslice_range(base, words), alive
+
+    pad = -len(keys) % 64
+    if pad:
+        keys = np.concatenate([keys, np.zeros(pad, dtype=np.uint64)])
+    alive = np.full(len(keys) // 64, _ONES, dtype=np.uint64)
+    if pad:
+        alive[-1] = np.uint64((1 << (64 - pad)) - 1)
+    return 0, keys, _bitslice(keys), alive
+
+
+def _filter_bitsliced(keys, program, batch=None):
+    """Return the subset of `keys` (uint64 array or range) consistent with `program`"""
+    base, padded, window, alive = batch or _bitsliced_batch(keys)
+    alive, words = _run_bitsliced(window, alive.copy(), program)
+    lanes = _surviving_lanes(alive, words)
+    if padded is None:
+        return lanes + np.uint64(base)
+    return padded[lanes]
+
+
+def filter_keys(keys, traces):
+    """
+    Return the candidate keys (as integers) consistent with every trace
+
+    The first traces are evaluated bitsliced over the whole batch; once only
+    a handful of candidates survive the rest are checked one at a time.
+    Candidate order is preserved.
+    """
+    return _filter_programs(keys, [_trace_program(trace) for trace in traces])
+
+
+def _filter_programs(keys, programs, batch=None):
+    """filter_keys() on trace programs; `batch` is the bitsliced layout of `keys`, if already built"""
+    if _numpy() is None:
+        survivors = list(keys)
+        for program in programs:
+            survivors = [k for k in survivors if _matches(int_to_key(k), program)]
+        return survivors
+
+    survivors = keys if isinstance(keys, range) else np.asarray(keys, dtype=np.uint64)
+    for index, program in enumerate(programs):
+        if len(survivors) > SCALAR_THRESHOLD:
+            survivors = _filter_bitsliced(survivors, program, batch if index == 0 else None)
+        else:
+            survivors = [k for k in survivors if _matches(int_to_key(int(k)), program)]
+            survivors = np.asarray(survivors, dtype=np.uint64)
+    return [int(k) for k in survivors]
+
+
+def key_chunks(keys=None, key_range=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield candidate keys in batches: first `keys` (an iterable of 6-byte
+    values, or a packed dictionary with int_chunks()), then every integer
+    in the half-open `key_range` (start, stop)
+    """
+    if keys is not None:
+        if hasattr(keys, 'int_chunks'):
+            yield from keys.int_chunks(batch_size)
+        else:
+            iterator = iter(keys)
+            while True:
+                batch = [key_to_int(key) for key in islice(iterator, batch_size)]
+                if not batch:
+                    break
+                yield batch
+
+    if key_range:
+        start, stop = key_range
+        for low in range(start, stop, batch_size):
+            yield range(low, min(low + batch_size, stop))
+
+
+def recover_key(traces, candidates):
+    """
+    Search candidate batches for the key that produced `traces`
+
+    Returns the first matching key in candidate order as 6 bytes, or None.
+    """
+    if not traces:
+        return None
+    for batch in candidates:
+        matches = filter_keys(batch, traces)
+        if matches:
+            return int_to_key(matches[0])
+    return None
+
+
+def recover_keys(trace_sets, candidates):
+    """
+    Search candidate batches for the keys of several targets at once
+
+    `trace_sets` maps each target to its traces. Every batch is bitsliced
+    once and then filtered for each target still unsolved, so a batch of
+    targets costs one pass over the candidates instead of one per target.
+    Returns {target: key or None}, keys being the first match in candidate
+    order as with recover_key().
+    """
+    found = {target: None for target in trace_sets}
+    pending = {target: [_trace_program(trace) for trace in traces]
+               for target, traces in trace_sets.items() if traces}
+    for keys in candidates:
+        if not pending:
+            break
+        batch = None
+        if _numpy() is not None:
+            if not isinstance(keys, range):
+                keys = np.asarray(keys, dtype=np.uint64)
+            if len(keys) > SCALAR_THRESHOLD:
+                batch = _bitsliced_batch(keys)
+        for target, programs in list(pending.items()):
+            matches = _filter_programs(keys, programs, batch)
+            if matches:
+                found[target] = int_to_key(matches[0])
+                del pending[target]
+    return found
+
+
+def benchmark(num_states=1 << 22, batch_size=DEFAULT_BATCH_SIZE, seed=0):
+    """
+    Measure bitsliced candidate throughput against one nested trace
+
+    Returns the number of candidate states checked per second. For reference,
+    one core of a recent x86 machine checks about 60M states/sec over key
+    ranges with NumPy (dictionary batches pay for a transpose and run near
+    5M states/sec) and about 45k states/sec with the pure-Python fallback.
+    """
+    rng = random.Random(seed)
+    key = rng.getrandbits(48).to_bytes(6, 'big')
+    uid = rng.getrandbits(32)
+    traces = [nested_trace(key, uid, rng.getrandbits(32))]
+
+    if _numpy() is None:
+        num_states = min(num_states, 1 << 12)
+    start = time.perf_counter()
+    for batch in key_chunks(key_range=(1 << 47, (1 << 47) + num_states), batch_size=batch_size):
+        filter_keys(batch, traces)
+    elapsed = time.perf_counter() - start
+    return num_states / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crypto1 engine benchmark')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Measure candidate states checked per second')
+    parser.add_argument('--states', type=int, default=1 << 22,
+                        help='Number of candidate states to check (default: 4194304)')
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    backend = "numpy bitsliced" if _numpy() is not None else "pure Python"
+    rate = benchmark(args.states)
+    print(f"Crypto1 {backend}: {rate:,.0f} states/sec")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Dump Analyzer - Vectorized analysis of raw MIFARE Classic card images
+
+from functools import lru_cache
+from collections import namedtuple
+
+from nfc_utils import CLASSIC_SECTORS, card_geometry, dump_geometry
+from access_conditions import decode_access_bytes
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional - without it images are analyzed block by block
+    np = None
+
+BLOCK_SIZE = 16
+
+# Result of analyze_images() for a batch of card images of one geometry.
+# Per block (cards x blocks): readable, value_mask, values, value_addresses
+# and block_access (C1C2C3 access bits of the block as a 3-bit number).
+# Per sector (cards x sectors): access_bytes (trailer bytes 6-8),
+# access_bits (C1C2C3 of the four block groups) and access_valid (the
+# inverted copies of the access bits match).
+ImageAnalysis = namedtuple('ImageAnalysis', [
+    'geometry', 'readable', 'value_mask', 'values', 'value_addresses', 'block_access',
+    'access_bytes', 'access_bits', 'access_valid',
+])
+
+
+@lru_cache(maxsize=None)
+def _block_layout(card_type):
+    """Per-block sector index, access group and trailer flag of a card geometry"""
+    geometry = card_geometry(card_type)
+    sectors, groups, trailers = [], [], []
+    for sector, (first_block, block_count, trailer_block) in enumerate(geometry.sectors):
+        for block in range(first_block, first_block + block_count):
+            offset = block - first_block
+            sectors.append(sector)
+            # 16-block sectors share one set of access bits per 5 blocks
+            groups.append(3 if block == trailer_block else (offset if block_count == 4 else offset // 5))
+            trailers.append(block == trailer_block)
+    return tuple(sectors), tuple(groups), tuple(trailers)
+
+
+def _decode_access_array(access_bytes):
+    """
+    C1C2C3 per block group and validity of an array of trailer bytes 6-8
+
+    Cards share a handful of access byte combinations, so each distinct one
+    is decoded once by access_conditions and the results are spread back
+    over the array.
+    """
+    packed = ((access_bytes[..., 0].astype(np.uint32) << 16)
+              | (access_bytes[..., 1].astype(np.uint32) << 8) | access_bytes[..., 2])
+    codes, inverse = np.unique(packed, return_inverse=True)
+    decoded = [decode_access_bytes(int(code).to_bytes(3, 'big')) for code in codes]
+    bits = np.array([conditions.bits for conditions in decoded], dtype=np.uint8).reshape(-1, 4)
+    valid = np.array([conditions.valid for conditions in decoded], dtype=bool)
+    inverse = inverse.reshape(packed.shape)
+    return bits[inverse], valid[inverse]
+
+
+def _analyze_numpy(images, readable, geometry):
+    sectors, groups, trailers = (np.asarray(column) for column in _block_layout(geometry.card_type))
+    blocks = images.reshape(len(images), geometry.num_blocks, BLOCK_SIZE)
+    words = blocks.view('<u4')
+
+    # Value blocks: value, inverted value, value, then addr/~addr/addr/~addr
+    value_mask = ((words[..., 0] == words[..., 2]) & ((words[..., 0] ^ words[..., 1]) == 0xFFFFFFFF)
+                  & (blocks[..., 12] == blocks[..., 14]) & (blocks[..., 13] == blocks[..., 15])
+                  & ((blocks[..., 12] ^ blocks[..., 13]) == 0xFF))
+    value_mask &= readable & ~trailers
+    value_mask[:, 0] = False  # Manufacturer block
+
+    trailer_blocks = blocks[:, [layout.trailer_block for layout in geometry.sectors]]
+    access_bytes = trailer_blocks[..., 6:9]
+    access_bits, access_valid = _decode_access_array(access_bytes)
+    access_valid &= readable[:, [layout.trailer_block for layout in geometry.sectors]]
+
+    return ImageAnalysis(
+        geometry=geometry,
+        readable=readable,
+        value_mask=value_mask,
+        values=words[..., 0].view('<i4'),
+        value_addresses=blocks[..., 12],
+        block_access=access_bits[:, sectors, groups],
+        access_bytes=access_bytes,
+        access_bits=access_bits,
+        access_valid=access_valid,
+    )
+
+
+def _analyze_python(images, readable, geometry):
+    sectors, groups, trailers = _block_layout(geometry.card_type)
+    result = {field: [] for field in ImageAnalysis._fields[2:]}
+
+    for image, card_readable in zip(images, readable):
+        value_mask, values, addresses = [], [], []
+        for block in range(geometry.num_blocks):
+            data = image[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+            value = int.from_bytes(data[0:4], 'little')
+            inverted = int.from_bytes(data[4:8], 'little')
+            copy = int.from_bytes(data[8:12], 'little')
+            is_value = (value == copy and value ^ inverted == 0xFFFFFFFF
+                        and data[12] == data[14] and data[13] == data[15] and data[12] ^ data[13] == 0xFF)
+            value_mask.append(is_value and card_readable[block] and not trailers[block] and block != 0)
+            values.append(int.from_bytes(data[0:4], 'little', signed=True))
+            addresses.append(data[12])
+
+        access_bytes, access_bits, access_valid = [], [], []
+        for layout in geometry.sectors:
+            offset = layout.trailer_block * BLOCK_SIZE
+            trailer_access = image[offset + 6:offset + 9]
+            conditions = decode_access_bytes(trailer_access)
+            access_bytes.append(trailer_access)
+            access_bits.append(list(conditions.bits))
+            access_valid.append(conditions.valid and card_readable[layout.trailer_block])
+
+        result['value_mask'].append(value_mask)
+        result['values'].append(values)
+        result['value_addresses'].append(addresses)
+        result['block_access'].append([access_bits[sectors[block]][groups[block]]
+                                       for block in range(geometry.num_blocks)])
+        result['access_bytes'].append(access_bytes)
+        result['access_bits'].append(access_bits)
+        result['access_valid'].append(access_valid)
+
+    return ImageAnalysis(geometry=geometry, readable=readable, **result)
+
+
+def analyze_images(images, geometry=None, readable=None):
+    """
+    Analyze a batch of raw card images of the same geometry in one pass
+
+    `images` is a sequence of bytes-like images (or a cards x bytes NumPy
+    uint8 array); `readable` optionally marks, per card and block, which
+    blocks were actually read. With NumPy every check runs as one
+    vectorized operation over all blocks of all cards.
+    """
+    if geometry is None:
+        first = images[0]
+        size = first.nbytes if hasattr(first, 'nbytes') else len(first)
+        geometry = next((card_geometry(card_type) for card_type in CLASSIC_SECTORS
+                         if card_geometry(card_type).num_blocks * BLOCK_SIZE == size), None)
+        if geometry is None:
+            raise ValueError(f"No MIFARE Classic card has a {size} byte image")
+
+    size = geometry.num_blocks * BLOCK_SIZE
+    if np is not None:
+        if isinstance(images, np.ndarray):
+            array = images.reshape(-1, size).astype(np.uint8, copy=False)
+        else:
+            array = np.frombuffer(b''.join(bytes(image) for image in images), dtype=np.uint8).reshape(-1, size)
+        if readable is None:
+            readable = np.ones((len(array), geometry.num_blocks), dtype=bool)
+        return _analyze_numpy(array, np.asarray(readable, dtype=bool), geometry)
+
+    images = [bytes(image) for image in images]
+    if readable is None:
+        readable = [[True] * geometry.num_blocks for _ in images]
+    return _analyze_python(images, readable, geometry)
+
+
+def analyze_image(image, geometry=None, readable=None):
+    """Analyze a single raw card image (see analyze_images)"""
+    return analyze_images([image], geometry, None if readable is None else [readable])
+
+
+def dump_to_image(dump, geometry=None):
+    """Flatten an NFCDump dump into (image, readable) for the analyzer"""
+    geometry = geometry or dump_geometry(dump)
+    image = bytearray(geometry.num_blocks * BLOCK_SIZE)
+    readable = [False] * geometry.num_blocks
+    for sector, entry in dump.items():
+        if not entry.get('data'):
+            continue
+        first_block = geometry.sector(sector).first_block
+        for i, block in enumerate(entry['data']):
+            if block is not None:
+                image[(first_block + i) * BLOCK_SIZE:(first_block + i + 1) * BLOCK_SIZE] = block
+                readable[first_block + i] = True
+    return bytes(image), readable
+
+
+def value_blocks(analysis, card=0):
+    """Value blocks of one analyzed card as [{'block', 'value', 'address'}]"""
+    return [{'block': block, 'value': int(analysis.values[card][block]),
+             'address': int(analysis.value_addresses[card][block])}
+            for block, is_value in enumerate(analysis.value_mask[card]) if is_value]
+
+
+def access_conditions(analysis, card=0):
+    """Trailer access bytes (hex) of the readable sectors of one analyzed card"""
+    return {sector: bytes(analysis.access_bytes[card][sector]).hex().upper()
+            for sector, layout in enumerate(analysis.geometry.sectors)
+            if analysis.readable[card][layout.trailer_block]}
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# Dump Corpus - Bulk offline analysis of a directory of archived card dumps
+
+import os
+import sys
+import json
+import argparse
+from collections import Counter, deque
+
+from lazy import LazyImport
+from dump_analyzer import BLOCK_SIZE, analyze_images, dump_to_image
+from dump_writer import load_dump
+from key_search import resolve_workers
+from key_store import _atomic_write
+from nfc_utils import CLASSIC_SECTORS, card_geometry
+
+# Dump files handed to a worker per task
+DEFAULT_CHUNK_SIZE = 256
+
+# Chunks queued per worker; bounds memory no matter how large the corpus is
+CHUNKS_IN_FLIGHT = 2
+
+# Keys reported in the summary
+TOP_KEYS = 20
+
+STATE_VERSION = 2
+
+# Only loaded by an actual analysis run
+ProcessPoolExecutor = LazyImport('concurrent.futures', 'ProcessPoolExecutor')
+tqdm = LazyImport('tqdm', 'tqdm')
+
+
+class CorpusStats:
+    """Aggregated statistics of many card dumps, mergeable across workers"""
+
+    def __init__(self):
+        self.cards = 0
+        self.incomplete = 0
+        self.errors = 0
+        self.card_types = Counter()
+        # Cards each key opened at least one sector of
+        self.key_cards = Counter()
+        self.access_conditions = Counter()
+        self.invalid_access = 0
+        self.value_blocks = 0
+        self.value_blocks_per_block = Counter()
+        self.value_min = None
+        self.value_max = None
+        self.value_sum = 0
+
+    def add_values(self, blocks, values):
+        for block, value in zip(blocks, values):
+            value = int(value)
+            self.value_blocks += 1
+            self.value_blocks_per_block[int(block)] += 1
+            self.value_sum += value
+            self.value_min = value if self.value_min is None else min(self.value_min, value)
+            self.value_max = value if self.value_max is None else max(self.value_max, value)
+
+    def merge(self, other):
+        self.cards += other.cards
+        self.incomplete += other.incomplete
+        self.errors += other.errors
+        self.card_types.update(other.card_types)
+        self.key_cards.update(other.key_cards)
+        self.access_conditions.update(other.access_conditions)
+        self.invalid_access += other.invalid_access
+        self.value_blocks += other.value_blocks
+        self.value_blocks_per_block.update(other.value_blocks_per_block)
+        self.value_sum += other.value_sum
+        for bound, pick in (('value_min', min), ('value_max', max)):
+            theirs = getattr(other, bound)
+            if theirs is not None:
+                ours = getattr(self, bound)
+                setattr(self, bound, theirs if ours is None else pick(ours, theirs))
+
+    def to_dict(self):
+        return {
+            'cards': self.cards,
+            'incomplete': self.incomplete,
+            'errors': self.errors,
+            'card_types': dict(self.card_types),
+            'key_cards': dict(self.key_cards),
+            'access_conditions': dict(self.access_conditions),
+            'invalid_access': self.invalid_access,
+            'value_blocks': self.value_blocks,
+            'value_blocks_per_block': {str(block): count for block, count in self.value_blocks_per_block.items()},
+            'value_min': self.value_min,
+            'value_max': self.value_max,
+            'value_sum': self.value_sum,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name in ('cards', 'incomplete', 'errors', 'invalid_access', 'value_blocks',
+                     'value_min', 'value_max', 'value_sum'):
+            setattr(stats, name, data[name])
+        stats.card_types = Counter(data['card_types'])
+        stats.key_cards = Counter(data['key_cards'])
+        stats.access_conditions = Counter(data['access_conditions'])
+        stats.value_blocks_per_block = Counter({int(block): count
+                                                for block, count in data['value_blocks_per_block'].items()})
+        return stats
+
+    def report(self, top_keys=TOP_KEYS):
+        """Summary report of the corpus (ties are ordered by name, so reports are reproducible)"""
+        def ranked(counter):
+            return sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+
+        return {
+            'cards': self.cards,
+            'incomplete_dumps': self.incomplete,
+            'unreadable_files': self.errors,
+            'card_types': dict(ranked(self.card_types)),
+            'key_reuse': [{'key': key, 'cards': count, 'share': count / self.cards if self.cards else 0.0}
+                          for key, count in ranked(self.key_cards)[:top_keys]],
+            'distinct_keys': len(self.key_cards),
+            'access_conditions': dict(ranked(self.access_conditions)),
+            'invalid_access_conditions': self.invalid_access,
+            'value_blocks': {
+                'count': self.value_blocks,
+                'min': self.value_min,
+                'max': self.value_max,
+                'mean': self.value_sum / self.value_blocks if self.value_blocks else None,
+                'per_block': {str(block): count for block, count in sorted(self.value_blocks_per_block.items())},
+            },
+        }
+
+
+def find_dumps(directory):
+    """Every .mfd card image below `directory`, in a stable order"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.mfd'))
+    return sorted(paths)
+
+
+def _load(path):
+    """
+    Load one dump as (geometry, image, readable, keys, complete)
+
+    Streamed dumps take keys and readable blocks from their NDJSON file;
+    plain .mfd images (e.g. from other tools) hold both keys in their
+    trailers and count as fully read.
+    """
+    base = path[:-4]
+    if os.path.exists(f"{base}.ndjson"):
+        dump, complete, geometry = load_dump(base)
+        image, readable = dump_to_image(dump, geometry)
+        keys = {entry[name] for entry in dump.values() for name in ('key_a', 'key_b')
+                if entry[name] is not None}
+        return geometry, image, readable, keys, complete
+
+    with open(path, 'rb') as f:
+        image = f.read()
+    geometry = next((card_geometry(card_type) for card_type in CLASSIC_SECTORS
+                     if card_geometry(card_type).num_blocks * BLOCK_SIZE == len(image)), None)
+    if geometry is None:
+        raise ValueError(f"{path} is not a MIFARE Classic image")
+    keys = set()
+    for layout in geometry.sectors:
+        trailer = image[layout.trailer_block * BLOCK_SIZE:(layout.trailer_block + 1) * BLOCK_SIZE]
+        keys.update((trailer[0:6], trailer[10:16]))
+    return geometry, image, [True] * geometry.num_blocks, keys, True
+
+
+def analyze_chunk(paths):
+    """Analyze a chunk of dump files and return their aggregated statistics (pool task)"""
+    stats = CorpusStats()
+    batches = {}
+    for path in paths:
+        try:
+            geometry, image, readable, keys, complete = _load(path)
+        except Exception:
+            stats.errors += 1
+            continue
+        stats.cards += 1
+        stats.incomplete += not complete
+        stats.card_types[geometry.card_type] += 1
+        stats.key_cards.update(key.hex().upper() for key in keys)
+        batch = batches.setdefault(geometry.card_type, ([], []))
+        batch[0].append(image)
+        batch[1].append(readable)
+
+    # One vectorized pass per card size
+    for card_type, (images, readable) in batches.items():
+        geometry = card_geometry(card_type)
+        analysis = analyze_images(images, geometry, readable)
+        trailers = [layout.trailer_block for layout in geometry.sectors]
+        for card in range(len(images)):
+            for sector, block in enumerate(trailers):
+                if not analysis.readable[card][block]:
+                    continue
+                if analysis.access_valid[card][sector]:
+                    stats.access_conditions[bytes(analysis.access_bytes[card][sector]).hex().upper()] += 1
+                else:
+                    stats.invalid_access += 1
+            mask = analysis.value_mask[card]
+            blocks = [block for block, is_value in enumerate(mask) if is_value]
+            stats.add_values(blocks, [analysis.values[card][block] for block in blocks])
+
+    return stats.to_dict()
+
+
+def _load_state(state_path):
+    """(cursor, stats) of an earlier run: the last dump analyzed and the totals so far"""
+    if state_path and os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            return state['cursor'], CorpusStats.from_dict(state['stats'])
+    return None, CorpusStats()
+
+
+def _save_state(state_path, cursor, stats):
+    state = {'version': STATE_VERSION, 'cursor': cursor, 'stats': stats.to_dict()}
+    _atomic_write(state_path, json.dumps(state).encode())
+
+
+def analyze_corpus(directory, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, state_path=None, progress=True):
+    """
+    Analyze every dump below `directory` and return the aggregated CorpusStats
+
+    Chunks of files are analyzed in a process pool with a bounded number of
+    chunks in flight, and only per-chunk statistics come back, so memory
+    does not grow with the corpus. With `state_path` the last dump analyzed
+    and the running statistics are saved after every chunk, and a later
+    run with the same state file continues after that dump. Dumps added
+    since are only picked up if they sort after it.
+    """
+    cursor, stats = _load_state(state_path)
+    # Chunks are collected in path order, so everything up to the cursor is done
+    paths = [path for path in find_dumps(directory) if cursor is None or path > cursor]
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    workers = resolve_workers(workers)
+
+    bar = tqdm(total=len(paths), desc="Analyzing dumps", unit="dump", disable=not progress)
+
+    def collect(chunk, result):
+        stats.merge(CorpusStats.from_dict(result))
+        if state_path:
+            _save_state(state_path, chunk[-1], stats)
+        bar.update(len(chunk))
+
+    try:
+        if workers == 1:
+            for chunk in chunks:
+                collect(chunk, analyze_chunk(chunk))
+        else:
+            pending = deque()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for chunk in chunks:
+                    pending.append((chunk, pool.submit(analyze_chunk, chunk)))
+                    if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                        done_chunk, future = pending.popleft()
+                        collect(done_chunk, future.result())
+                while pending:
+                    done_chunk, future = pending.popleft()
+                    collect(done_chunk, future.result())
+    finally:
+        bar.close()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk analysis of a directory of card dumps')
+    parser.add_argument('directory', help='Directory searched recursively for .mfd dumps')
+    parser.add_argument('-w', '--workers', type=int, default=0,
+                        help='Worker processes (default: 0 = one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Dumps per worker task (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--state', metavar='FILE',
+                        help='Resume file: progress is saved here and picked up by the next run')
+    parser.add_argument('-o', '--output', help='Write the JSON report to a file instead of stdout')
+    parser.add_argument('--top-keys', type=int, default=TOP_KEYS,
+                        help=f'Most reused keys to list (default: {TOP_KEYS})')
+    args = parser.parse_args()
+
+    stats = analyze_corpus(args.directory, args.workers, args.chunk_size, args.state)
+    text = json.dumps(stats.report(args.top_keys), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# Dump Writer - Streams MIFARE Classic dumps to .mfd images with NDJSON metadata
+
+import os
+import json
+import time
+from datetime import datetime
+
+from nfc_utils import card_geometry, tag_geometry
+
+# Sectors written between two fsync() calls; every sector is flushed to the
+# OS right away, so only a power loss can lose the last unsynced batch
+DEFAULT_FSYNC_EVERY = 4
+
+BLOCK_SIZE = 16
+
+
+class DumpWriter:
+    """
+    Write a card dump sector by sector while it is being read
+
+    `<base>.mfd` is a raw card image (block N at offset N * 16, blocks that
+    could not be read stay zero), `<base>.ndjson` holds one JSON line per
+    event: a "card" header, one "sector" line with the keys, read blocks and
+    errors of each sector, and a final "done" line. A dump without the
+    "done" line was interrupted, e.g. by the card leaving the field; every
+    sector written before that is kept.
+    """
+
+    def __init__(self, base, geometry, uid=None, card_type=None, fsync_every=DEFAULT_FSYNC_EVERY):
+        self.base = base
+        self.geometry = geometry
+        self.fsync_every = fsync_every
+        self.sectors_written = 0
+        self._unsynced = 0
+
+        directory = os.path.dirname(base)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._image = open(f"{base}.mfd", 'wb')
+        self._image.truncate(geometry.num_blocks * BLOCK_SIZE)
+        self._meta = open(f"{base}.ndjson", 'w')
+        self._event('card', uid=uid.hex().upper() if uid else None,
+                    card_type=geometry.card_type, product=card_type,
+                    num_sectors=geometry.num_sectors, started=time.time())
+
+    @classmethod
+    def for_tag(cls, directory, tag, fsync_every=DEFAULT_FSYNC_EVERY):
+        """Open a writer for a tag, named after its UID and the current time"""
+        uid = getattr(tag, 'identifier', None)
+        name = f"{uid.hex().upper() if uid else 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        return cls(os.path.join(directory, name), tag_geometry(tag), uid,
+                   getattr(tag, 'product', None), fsync_every)
+
+    def _event(self, kind, **data):
+        self._meta.write(json.dumps(dict(type=kind, **data)) + '\n')
+
+    def write_sector(self, sector, blocks, key_a=None, key_b=None, errors=None):
+        """Append one sector; `blocks` may be None or contain None for unread blocks"""
+        first_block = self.geometry.sector(sector).first_block
+        read = []
+        for i, block in enumerate(blocks or ()):
+            if block is None:
+                continue
+            self._image.seek((first_block + i) * BLOCK_SIZE)
+            self._image.write(block)
+            read.append(first_block + i)
+
+        self._event('sector', sector=sector,
+                    key_a=key_a.hex().upper() if key_a else None,
+                    key_b=key_b.hex().upper() if key_b else None,
+                    blocks=read, errors={str(block): error for block, error in (errors or {}).items()})
+
+        self._image.flush()
+        self._meta.flush()
+        self.sectors_written += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._image.fileno())
+        os.fsync(self._meta.fileno())
+        self._unsynced = 0
+
+    def close(self, complete=True, **summary):
+        """Finish the dump; an incomplete dump gets no "done" line"""
+        if self._image.closed:
+            return
+        if complete:
+            self._event('done', finished=time.time(), **summary)
+        self._image.flush()
+        self._meta.flush()
+        self._sync()
+        self._image.close()
+        self._meta.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(complete=exc_type is None)
+
+
+def load_dump(base):
+    """
+    Load a streamed dump back into the NFCDump dump format
+
+    Returns (dump, complete, geometry) where dump maps each written sector
+    to {'data', 'key_a', 'key_b', 'errors'} like NFCDump.dump_mifare_classic
+    and geometry is the layout of the card, however few sectors were read.
+    """
+    geometry = card_geometry()
+    dump = {}
+    complete = False
+    events = []
+    with open(f"{base}.ndjson", 'r') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # Torn last line of an interrupted dump
+    with open(f"{base}.mfd", 'rb') as f:
+        image = f.read()
+
+    for event in events:
+        if event['type'] == 'card':
+            geometry = card_geometry(event['card_type'])
+        elif event['type'] == 'sector':
+            sector = event['sector']
+            read = set(event['blocks'])
+            first_block, block_count, _ = geometry.sector(sector)
+            blocks = [image[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE] if block in read else None
+                      for block in range(first_block, first_block + block_count)]
+            dump[sector] = {
+                'data': blocks if read else None,
+                'key_a': bytes.fromhex(event['key_a']) if event['key_a'] else None,
+                'key_b': bytes.fromhex(event['key_b']) if event['key_b'] else None,
+                'errors': {int(block): error for block, error in event['errors'].items()},
+            }
+        elif event['type'] == 'done':
+            complete = True
+
+    return dump, complete, geometry
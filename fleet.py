@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Fleet - Audit cards on several NFC readers in parallel
+
+import json
+import time
+import asyncio
+import logging
+
+from lazy import LazyImport
+from async_reader import DEFAULT_POLL_INTERVAL, AsyncStation
+
+# Console colours are only loaded when a result is printed
+Fore = LazyImport('colorama', 'Fore')
+Style = LazyImport('colorama', 'Style')
+
+logger = logging.getLogger(__name__)
+
+
+def discover_readers():
+    """Return a usb:BBB:DDD path for every attached reader nfcpy supports"""
+    import nfc.clf.device
+    import nfc.clf.transport
+
+    found = nfc.clf.transport.USB.find('usb') or []
+    return [f"usb:{bus:03}:{dev:03}" for vid, pid, bus, dev in found
+            if (vid, pid) in nfc.clf.device.usb_device_map]
+
+
+def card_result(data):
+    """JSON-ready result of a card_done event"""
+    return {
+        'uid': data['uid'].hex().upper() if data.get('uid') else None,
+        'card_type': data.get('card_type'),
+        'cracked_sectors': data.get('cracked_sectors'),
+        'num_sectors': data.get('num_sectors'),
+        'auth_attempts': data.get('auth_attempts'),
+        'plan_saved': data.get('plan_saved'),
+        'keys': [key.hex().upper() for key in data.get('keys', [])],
+    }
+
+
+class ResultsSink:
+    """
+    Aggregated results of every reader in the fleet
+
+    Stations render their events here instead of on the console, so output
+    from several readers does not interleave: each finished card becomes one
+    console line and, with `results_file`, one JSON line. With a Progress
+    display, its status line is cleared before a card line is printed.
+    """
+
+    def __init__(self, results_file=None, quiet=False, progress=None):
+        self.results_file = results_file
+        self.quiet = quiet
+        self.progress = progress
+        self.cards = []
+        self.per_reader = {}
+        self._started = time.monotonic()
+        self._out = open(results_file, 'a') if results_file else None
+
+    def render(self, reader, kind, data):
+        """Station render callback, bound to one reader name"""
+        if kind != 'card_done':
+            return
+        result = {'reader': reader, 'time': time.time(), **card_result(data)}
+        self.cards.append(result)
+        self.per_reader[reader] = self.per_reader.get(reader, 0) + 1
+
+        if self._out:
+            self._out.write(json.dumps(result) + '\n')
+            self._out.flush()
+        if not self.quiet:
+            line = (f"{Fore.BLUE}[{reader}]{Style.RESET_ALL} UID {Fore.CYAN}{result['uid']}{Style.RESET_ALL}: "
+                    f"{result['cracked_sectors']}/{result['num_sectors']} sectors, "
+                    f"keys {', '.join(result['keys']) or '-'}")
+            if self.progress is not None:
+                with self.progress.suspended():
+                    print(line)
+            else:
+                print(line)
+
+    def summary(self):
+        """Cards per reader and overall throughput"""
+        elapsed = time.monotonic() - self._started
+        return {
+            'cards': len(self.cards),
+            'per_reader': dict(self.per_reader),
+            'elapsed': elapsed,
+            'cards_per_second': len(self.cards) / elapsed if elapsed else 0.0,
+        }
+
+    def close(self):
+        if self._out:
+            self._out.close()
+            self._out = None
+
+
+class FleetRunner:
+    """
+    Run one AsyncStation per reader on a shared event loop
+
+    `readers` is a list of (name, cracker) pairs whose crackers already hold
+    a connected device and share one KeyStore, so a key recovered on one
+    reader is tried first on the cards of all the others. Every station has
+    its own reader thread, so the readers poll and attack concurrently and
+    throughput grows with the number of readers.
+    """
+
+    def __init__(self, readers, targets=(), poll_interval=DEFAULT_POLL_INTERVAL, sink=None):
+        self.readers = readers
+        self.targets = targets
+        self.poll_interval = poll_interval
+        self.sink = sink or ResultsSink()
+
+    def _render(self, name):
+        return lambda kind, data: self.sink.render(name, kind, data)
+
+    async def run(self, max_cards=None):
+        """Audit cards on every reader until cancelled, or until each reader did max_cards"""
+        stations = [AsyncStation(cracker, self.targets, self.poll_interval, render=self._render(name))
+                    for name, cracker in self.readers]
+        logger.info(f"Fleet running on {len(stations)} readers")
+        results = await asyncio.gather(*(station.run(continuous=True, max_cards=max_cards)
+                                         for station in stations), return_exceptions=True)
+        for (name, _), result in zip(self.readers, results):
+            if isinstance(result, Exception):
+                logger.error(f"Reader {name} stopped: {result}")
+        return self.sink.summary()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Key Search - Multiprocess sharded search of the candidate key space
+
+import os
+from collections import deque
+
+from lazy import LazyImport
+from crypto1 import DEFAULT_BATCH_SIZE, filter_keys, int_to_key, key_chunks, recover_key, recover_keys
+
+# Largest number of candidate keys handed to a worker per task. Large enough
+# that pickling a shard is negligible next to searching it, small enough to
+# stop quickly; smaller spaces are cut finer so that every worker gets work.
+MAX_SHARD_SIZE = 1 << 22
+
+# Shards queued per worker before we start waiting on results
+SHARDS_IN_FLIGHT = 4
+
+# The process pool machinery is only loaded when more than one worker is used
+multiprocessing = LazyImport('multiprocessing')
+ProcessPoolExecutor = LazyImport('concurrent.futures', 'ProcessPoolExecutor')
+
+# No shard has matched yet
+_NOT_FOUND = 1 << 62
+
+# Lowest shard index known to contain the key, shared by all workers
+_found_shard = None
+
+# (keys, key_range) searched by the tasks of a solver_pool() worker
+_candidates = None
+
+
+def _init_worker(found_shard):
+    global _found_shard
+    _found_shard = found_shard
+
+
+def _init_solver(keys, key_range):
+    global _candidates
+    _candidates = (keys, key_range)
+
+
+def _search_shard(index, shard, traces, batch_size):
+    """Search one shard, giving up as soon as an earlier shard has matched"""
+    for low in range(0, len(shard), batch_size):
+        if _found_shard.value < index:
+            return None
+        matches = filter_keys(shard[low:low + batch_size], traces)
+        if matches:
+            with _found_shard.get_lock():
+                if index < _found_shard.value:
+                    _found_shard.value = index
+            return matches[0]
+    return None
+
+
+def solve_traces(traces, keys=None, key_range=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Recover one key in the calling process (picklable pool task)"""
+    return recover_key(traces, key_chunks(keys, key_range, batch_size))
+
+
+def solve_trace_sets(trace_sets, keys=None, key_range=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Recover the keys of several targets in the calling process (picklable pool task)"""
+    return recover_keys(trace_sets, key_chunks(keys, key_range, batch_size))
+
+
+def solver_pool(workers, keys=None, key_range=None):
+    """
+    Process pool for solve_shared() and solve_shared_sets() tasks
+
+    The candidate keys are sent once to each worker process instead of with
+    every task; pass a KeySnapshot so that packed dictionaries travel by path.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_solver,
+                               initargs=(keys, key_range))
+
+
+def solve_shared(traces, batch_size=DEFAULT_BATCH_SIZE):
+    """solve_traces() over the candidates of the worker's solver_pool() (picklable pool task)"""
+    keys, key_range = _candidates
+    return solve_traces(traces, keys, key_range, batch_size)
+
+
+def solve_shared_sets(trace_sets, batch_size=DEFAULT_BATCH_SIZE):
+    """solve_trace_sets() over the candidates of the worker's solver_pool() (picklable pool task)"""
+    keys, key_range = _candidates
+    return solve_trace_sets(trace_sets, keys, key_range, batch_size)
+
+
+def search_trace_sets(trace_sets, keys=None, key_range=None, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recover the keys of many targets, {target: traces} -> {target: key or None}
+
+    Targets are dealt round-robin to the workers, and each worker streams
+    the candidate space once for all of its targets (see recover_keys).
+    `keys` must be picklable when more than one worker is used.
+    """
+    workers = min(resolve_workers(workers), max(1, len(trace_sets)))
+    if workers == 1:
+        return solve_trace_sets(trace_sets, keys, key_range, batch_size)
+
+    targets = list(trace_sets)
+    groups = [{target: trace_sets[target] for target in targets[i::workers]} for i in range(workers)]
+    found = {}
+    with solver_pool(workers, keys, key_range) as pool:
+        for result in pool.map(solve_shared_sets, groups, [batch_size] * workers):
+            found.update(result)
+    return found
+
+
+def resolve_workers(workers):
+    """Map a --workers value to a process count (0 means one per CPU)"""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+
+def candidate_count(keys=None, key_range=None):
+    """Number of candidate keys searched for `keys` and `key_range`"""
+    count = len(keys) if hasattr(keys, '__len__') else 0
+    if key_range:
+        count += max(0, key_range[1] - key_range[0])
+    return count
+
+
+def shard_size_for(count, workers, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Shard size that spreads `count` candidates over about SHARDS_IN_FLIGHT
+    shards per worker, in whole filter batches of at least one batch
+    """
+    shard_size = -(-count // (workers * SHARDS_IN_FLIGHT))
+    shard_size = -(-shard_size // batch_size) * batch_size
+    return max(batch_size, min(shard_size, MAX_SHARD_SIZE))
+
+
+def search_key_space(traces, keys=None, key_range=None, workers=1,
+                     shard_size=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Find the key consistent with `traces` across a pool of worker processes
+
+    The candidate space (dictionary keys first, then `key_range`) is cut into
+    shards that are searched in parallel. The result is always the first
+    match in candidate order, so it does not depend on the number of workers:
+    shards are collected in order, and once a shard matches every later
+    shard is cancelled or abandoned by its worker. Unless `shard_size` is
+    given, it follows the size of the candidate space (see shard_size_for).
+    """
+    if not traces:
+        return None
+
+    workers = resolve_workers(workers)
+    if workers == 1:
+        return recover_key(traces, key_chunks(keys, key_range, batch_size))
+
+    if shard_size is None:
+        shard_size = shard_size_for(candidate_count(keys, key_range), workers, batch_size)
+
+    found_shard = multiprocessing.Value('q', _NOT_FOUND)
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(found_shard,)) as pool:
+        def collect_next():
+            match = pending.popleft().result()
+            if match is not None:
+                for future in pending:
+                    future.cancel()
+                pending.clear()
+            return match
+
+        shards = enumerate(key_chunks(keys, key_range, shard_size))
+        for index, shard in shards:
+            pending.append(pool.submit(_search_shard, index, shard, traces, batch_size))
+            if len(pending) >= workers * SHARDS_IN_FLIGHT:
+                match = collect_next()
+                if match is not None:
+                    return int_to_key(match)
+
+        while pending:
+            match = collect_next()
+            if match is not None:
+                return int_to_key(match)
+
+    return None
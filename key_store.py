@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# Key Store - Persistent MIFARE key dictionary ranked by historical hit rate
+
+import os
+import sys
+import mmap
+import json
+import time
+import struct
+import logging
+import threading
+import argparse
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+# Keys that are always part of the dictionary
+DEFAULT_KEYS = [
+    bytes.fromhex("FFFFFFFFFFFF"),  # Default key
+    bytes.fromhex("000000000000"),  # All zeros
+    bytes.fromhex("A0A1A2A3A4A5"),  # Common key
+    bytes.fromhex("B0B1B2B3B4B5"),  # Common key
+    bytes.fromhex("D3F7D3F7D3F7"),  # Common key
+]
+
+DEFAULT_STORE_PATH = "nfc_keys.db"
+
+# Store and packed dictionary layout: magic, little-endian key count, then
+# contiguous 6-byte key records
+STORE_MAGIC = b'NFCKEYS1'
+STORE_HEADER = struct.Struct('<8sI')
+KEY_SIZE = 6
+
+# Number of UID bytes that identify a card batch for ranking
+UID_PREFIX_BYTES = 2
+
+
+def load_text_keys(key_file):
+    """Yield keys from a text file (hex format, one per line, # comments)"""
+    with open(key_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield bytes.fromhex(line)
+
+
+def is_packed_key_file(path):
+    """Check whether `path` is a packed binary key dictionary"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(STORE_MAGIC)) == STORE_MAGIC
+    except OSError:
+        return False
+
+
+def convert_text_keys(text_path, packed_path):
+    """
+    Convert a text key file into a packed binary dictionary
+
+    Duplicate keys are dropped, the first occurrence keeps its position.
+    Returns the number of keys written.
+    """
+    seen = set()
+    tmp_path = f"{packed_path}.tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(STORE_HEADER.pack(STORE_MAGIC, 0))
+        for key in load_text_keys(text_path):
+            if len(key) != KEY_SIZE:
+                raise ValueError(f"MIFARE keys are {KEY_SIZE} bytes, got {key.hex()}")
+            if key not in seen:
+                seen.add(key)
+                out.write(key)
+        out.seek(0)
+        out.write(STORE_HEADER.pack(STORE_MAGIC, len(seen)))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, packed_path)
+    return len(seen)
+
+
+def _int_chunks(view, batch_size):
+    """Yield the 6-byte keys in `view` as batches of integers"""
+    step = batch_size * KEY_SIZE
+    for offset in range(0, len(view), step):
+        chunk = view[offset:offset + step]
+        yield [int.from_bytes(chunk[i:i + KEY_SIZE], 'big') for i in range(0, len(chunk), KEY_SIZE)]
+
+
+class PackedKeyFile:
+    """
+    Read-only, memory-mapped packed key dictionary
+
+    Opening only maps the file, so even million-key dictionaries load in
+    milliseconds; keys are sliced out of the mapping one at a time while
+    iterating instead of being held as a list of bytes objects.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < STORE_HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a packed key dictionary")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = STORE_HEADER.unpack_from(self._mmap)
+        if magic != STORE_MAGIC or size < STORE_HEADER.size + self._count * KEY_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not a packed key dictionary")
+        self._view = memoryview(self._mmap)[STORE_HEADER.size:STORE_HEADER.size + self._count * KEY_SIZE]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        view = self._view
+        for offset in range(0, len(view), KEY_SIZE):
+            yield view[offset:offset + KEY_SIZE].tobytes()
+
+    def int_chunks(self, batch_size):
+        """Yield the keys as batches of integers for the Crypto1 engine"""
+        return _int_chunks(self._view, batch_size)
+
+    def close(self):
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        self._mmap.close()
+        self._file.close()
+
+
+class KeySnapshot:
+    """
+    The candidate keys of a KeyStore at one point in time
+
+    Cheap to send to worker processes: the in-memory keys are one packed
+    bytes object, and attached packed dictionaries travel by path and are
+    mapped again by the receiving process. Keys that are both in memory and
+    in a packed dictionary are listed twice.
+    """
+
+    def __init__(self, keys=b'', packed=()):
+        self._keys = keys
+        self._packed = list(packed)
+        self._paths = [dictionary.path for dictionary in self._packed]
+        self._count = len(keys) // KEY_SIZE + sum(len(dictionary) for dictionary in self._packed)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_packed'] = None
+        return state
+
+    def _dictionaries(self):
+        if self._packed is None:
+            self._packed = [PackedKeyFile(path) for path in self._paths]
+        return self._packed
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        keys = self._keys
+        for offset in range(0, len(keys), KEY_SIZE):
+            yield keys[offset:offset + KEY_SIZE]
+        for dictionary in self._dictionaries():
+            yield from dictionary
+
+    def int_chunks(self, batch_size):
+        """Yield the keys as batches of integers for the Crypto1 engine"""
+        yield from _int_chunks(memoryview(self._keys), batch_size)
+        for dictionary in self._dictionaries():
+            yield from dictionary.int_chunks(batch_size)
+
+
+def _atomic_write(path, data):
+    """Write `data` to `path` so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class KeyStore:
+    """
+    Deduplicated key dictionary with per-scope hit statistics
+
+    Keys are kept in insertion order. For every scope (all cards, a card
+    family such as "MIFARE Classic 1K", and a UID prefix) the store counts
+    the cards seen and, per key, on how many of those cards it worked.
+    ordered() puts the keys with the best hit rate for a card first and
+    the rest of the dictionary after them in file order.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._keys = {}
+        self._stats = {}
+        # Packed dictionaries streamed after the in-memory keys
+        self._packed = []
+        # Guards updates against a concurrent save() on another thread
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        if path:
+            self._load()
+
+    @property
+    def stats_path(self):
+        return f"{self.path}.stats.json"
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+                magic, count = STORE_HEADER.unpack_from(data)
+                if magic != STORE_MAGIC:
+                    raise ValueError("not a key store file")
+                start = STORE_HEADER.size
+                for offset in range(start, start + count * KEY_SIZE, KEY_SIZE):
+                    self._keys[data[offset:offset + KEY_SIZE]] = None
+            except Exception as e:
+                logger.error(f"Error loading key store {self.path}: {e}")
+
+        if os.path.exists(self.stats_path):
+            try:
+                with open(self.stats_path, 'r') as f:
+                    self._stats = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading key statistics {self.stats_path}: {e}")
+
+    def save(self):
+        """Persist keys and statistics (no-op for in-memory stores)"""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Snapshot under the lock, write outside it so updates never wait on disk I/O
+        with self._lock:
+            header = STORE_HEADER.pack(STORE_MAGIC, len(self._keys))
+            keys = header + b''.join(self._keys)
+            stats = json.dumps(self._stats, sort_keys=True).encode()
+        with self._write_lock:
+            _atomic_write(self.path, keys)
+            _atomic_write(self.stats_path, stats)
+
+    def __len__(self):
+        """Number of keys (keys in several dictionaries count once per dictionary)"""
+        return len(self._keys) + sum(len(packed) for packed in self._packed)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        # Iterate a snapshot: other reader threads may add keys meanwhile
+        with self._lock:
+            keys = list(self._keys)
+        yield from keys
+        for packed in self._packed:
+            for key in packed:
+                if key not in self._keys:
+                    yield key
+
+    def snapshot(self):
+        """Freeze the current keys for offline key recovery (see KeySnapshot)"""
+        with self._lock:
+            keys = b''.join(self._keys)
+        return KeySnapshot(keys, self._packed)
+
+    def attach(self, path):
+        """Stream a packed key dictionary after the in-memory keys"""
+        packed = PackedKeyFile(path)
+        self._packed.append(packed)
+        return len(packed)
+
+    def add(self, key):
+        """Add a key, returning False if it was already present"""
+        if len(key) != KEY_SIZE:
+            raise ValueError(f"MIFARE keys are {KEY_SIZE} bytes, got {len(key)}")
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys[key] = None
+        return True
+
+    def add_many(self, keys):
+        """Add several keys and return how many were new"""
+        return sum(1 for key in keys if self.add(key))
+
+    @staticmethod
+    def _scopes(card_type=None, uid=None):
+        scopes = ['all']
+        if card_type:
+            scopes.append(f"family:{card_type}")
+        if uid:
+            scopes.append(f"uid:{uid[:UID_PREFIX_BYTES].hex().upper()}")
+        return scopes
+
+    def record_card(self, found_keys, card_type=None, uid=None):
+        """Count one card in each scope and a hit for every key that worked on it"""
+        found = {key.hex().upper() for key in found_keys if key}
+        with self._lock:
+            for key in found_keys:
+                if key:
+                    self.add(key)
+            for scope in self._scopes(card_type, uid):
+                stats = self._stats.setdefault(scope, {'cards': 0, 'hits': {}})
+                stats['cards'] += 1
+                for key in found:
+                    stats['hits'][key] = stats['hits'].get(key, 0) + 1
+
+    def hit_rate(self, key, scope):
+        """Fraction of the cards seen in `scope` that `key` opened"""
+        with self._lock:
+            stats = self._stats.get(scope)
+            if not stats or not stats['cards']:
+                return 0.0
+            return stats['hits'].get(key.hex().upper(), 0) / stats['cards']
+
+    def ordered(self, card_type=None, uid=None, ranked=None):
+        """
+        Return every key, best candidates for this card first
+
+        Hot keys are ranked by hit rate in the most specific scope first
+        (UID prefix, then card family, then all cards); ties keep file order.
+        The result is a lazy sequence: packed dictionaries are streamed.
+        Passing the `ranked` keys of an earlier result restores its order.
+        """
+        with self._lock:
+            if ranked is not None:
+                return _OrderedKeys(self, [key for key in ranked if key in self._keys])
+
+            scopes = self._scopes(card_type, uid)[::-1]
+            hot = set()
+            for scope in scopes:
+                hot.update(bytes.fromhex(key) for key in self._stats.get(scope, {}).get('hits', {}))
+            # Every hit key was added to the store by record_card()
+            hot = {key for key in hot if key in self._keys}
+
+            position = {key: index for index, key in enumerate(self._keys) if key in hot}
+            ranked = sorted(hot, key=lambda key: ([-self.hit_rate(key, scope) for scope in scopes],
+                                                  position[key]))
+        return _OrderedKeys(self, ranked)
+
+
+class _OrderedKeys:
+    """Ranked hot keys followed by the rest of a KeyStore, without copying it"""
+
+    def __init__(self, store, ranked):
+        self._store = store
+        self.ranked = ranked
+
+    def __len__(self):
+        return len(self._store)
+
+    def __iter__(self):
+        hot = set(self.ranked)
+        yield from self.ranked
+        for key in self._store:
+            if key not in hot:
+                yield key
+
+
+class CardKeyCache:
+    """
+    Keys confirmed on the card being attacked, tried before the dictionary
+
+    Real cards usually reuse one or two keys across sectors, so once a key
+    opens a sector it is the best candidate for every later sector and key
+    type. Iterating yields the confirmed keys (most recent first) followed
+    by the rest of `keys` in their original order.
+    """
+
+    def __init__(self, keys):
+        self._keys = keys
+        self.confirmed = []
+
+    def confirm(self, key):
+        """Remember a key that authenticated on this card"""
+        if key in self.confirmed:
+            self.confirmed.remove(key)
+        self.confirmed.insert(0, key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for _, key in self.candidates():
+            yield key
+
+    def candidates(self, start=0):
+        """
+        Yield (position, key): the confirmed keys with position None, then
+        the keys from dictionary position `start` on, skipping confirmed ones
+        """
+        confirmed = list(self.confirmed)
+        for key in confirmed:
+            yield None, key
+        for position, key in enumerate(islice(self._keys, start, None), start):
+            if key not in confirmed:
+                yield position, key
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Key dictionary tools')
+    parser.add_argument('--convert', nargs=2, metavar=('TEXT_FILE', 'PACKED_FILE'),
+                        help='Convert a text key file (hex, one per line) to a packed dictionary')
+    parser.add_argument('--info', metavar='PACKED_FILE',
+                        help='Show the key count and load time of a packed dictionary')
+    args = parser.parse_args()
+
+    if args.convert:
+        count = convert_text_keys(*args.convert)
+        print(f"Wrote {count} keys to {args.convert[1]}")
+    elif args.info:
+        start = time.perf_counter()
+        packed = PackedKeyFile(args.info)
+        elapsed = time.perf_counter() - start
+        print(f"{args.info}: {len(packed)} keys, opened in {elapsed * 1000:.2f} ms")
+        packed.close()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
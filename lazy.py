@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Lazy - Deferred imports that keep the command-line tools quick to start
+
+import sys
+import importlib
+
+
+class LazyImport:
+    """
+    Stand-in for a module, or an attribute of one, imported on first use
+
+    Attribute access and calls are forwarded to the real object, so
+    `Fore = LazyImport('colorama', 'Fore')` and `tqdm = LazyImport('tqdm',
+    'tqdm')` work like the plain imports once something uses them. Code
+    paths that never touch the object never pay for importing it.
+    """
+
+    def __init__(self, module, attribute=None):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            if self._attribute:
+                target = getattr(target, self._attribute)
+            self._target = target
+        return self._target
+
+    def __getattr__(self, name):
+        if name in ('_module', '_attribute', '_target'):
+            # Not initialized (e.g. during copying)
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        name = f"{self._module}.{self._attribute}" if self._attribute else self._module
+        return f"<lazy {name}{' (loaded)' if self._target is not None else ''}>"
+
+
+def require(module, package):
+    """
+    Import a module a command cannot run without
+
+    Exits with install instructions when `package` is missing, as the tools
+    do for their hardware stack, but only once a command actually needs it.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        from colorama import Fore, Style
+        print(f"{Fore.RED}Error: Required module '{package}' not found.{Style.RESET_ALL}")
+        print("Please install required dependencies: pip install -r requirements.txt")
+        sys.exit(1)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Log Config - Queue-based logging that keeps file and console I/O off the attack threads
+
+import sys
+import json
+import time
+import atexit
+import logging
+from datetime import datetime, timezone
+
+LOG_FORMATS = ('json', 'text')
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Console log lines per second; further INFO and DEBUG lines are dropped
+# (warnings and errors always get through)
+DEFAULT_CONSOLE_RATE = 10.0
+
+# Attributes of every LogRecord; anything else was passed with `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed with `extra`"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class RateLimitedStreamHandler(logging.StreamHandler):
+    """
+    Console handler that drops INFO and DEBUG lines beyond `rate` per second
+
+    Up to a second's worth of lines may come in a burst. How many lines
+    were dropped is reported before the next line shown, so a flood of
+    progress messages from several readers neither scrolls warnings away
+    nor ties the listener up on terminal I/O.
+    """
+
+    def __init__(self, stream=None, rate=DEFAULT_CONSOLE_RATE):
+        super().__init__(stream)
+        self.rate = rate
+        self.suppressed = 0
+        self._allowance = rate
+        self._last = time.monotonic()
+
+    def emit(self, record):
+        if self.rate and record.levelno < logging.WARNING:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            if self._allowance < 1:
+                self.suppressed += 1
+                return
+            self._allowance -= 1
+        self._report_suppressed()
+        super().emit(record)
+
+    def _report_suppressed(self):
+        if self.suppressed:
+            self.stream.write(f"... {self.suppressed} log messages suppressed ...{self.terminator}")
+            self.suppressed = 0
+
+    def close(self):
+        self.acquire()
+        try:
+            self._report_suppressed()
+            self.flush()
+        finally:
+            self.release()
+        super().close()
+
+
+def setup_logging(log_file=None, log_format='json', console_rate=DEFAULT_CONSOLE_RATE, level=logging.INFO):
+    """
+    Route every log record through a queue to a listener thread
+
+    Loggers only enqueue records; the listener writes them to `log_file`
+    (JSON lines or plain text) and to a rate-limited console. Calling it
+    again replaces the previous configuration. Records still queued are
+    written at exit.
+    """
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+    global _listener
+    shutdown_logging()
+
+    handlers = []
+    if log_file:
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+        handlers.append(file_handler)
+    console = RateLimitedStreamHandler(sys.stderr, rate=console_rate)
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers.append(console)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Write out the queued records and close the handlers"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def add_logging_arguments(parser, default_file):
+    """Add the log destination options to an argparse parser"""
+    parser.add_argument('--log-file', default=default_file, metavar='FILE',
+                        help=f'Log file (default: {default_file}; empty to disable)')
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='json',
+                        help='Log file format: one JSON object per line, or plain text (default: json)')
+    parser.add_argument('--console-rate', type=float, default=DEFAULT_CONSOLE_RATE,
+                        help=f'Console log lines per second before INFO lines are dropped; 0 for no limit '
+                             f'(default: {DEFAULT_CONSOLE_RATE:g})')
+
+
+def logging_from_args(args):
+    """Set up logging as configured on the command line"""
+    return setup_logging(args.log_file, args.log_format, args.console_rate)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Metrics - Latency histograms of reader commands and attack phases
+
+import time
+import json
+import bisect
+import threading
+
+from key_store import _atomic_write
+
+# Histogram of every instrumented reader or tag command, labelled by
+# command and outcome
+COMMAND_METRIC = "nfc_command_duration_seconds"
+
+# Histogram of the attack phases (nonce capture, offline key recovery...)
+PHASE_METRIC = "nfc_phase_duration_seconds"
+
+# Upper bounds (seconds) of the histogram buckets: RF commands take
+# milliseconds, offline key recovery up to minutes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Commands timed on instrumented readers and tags
+DEVICE_COMMANDS = ('sense',)
+TAG_COMMANDS = ('authenticate', 'read', 'read_blocks', 'nested_nonce', 'darkside_nack')
+
+# Outcome labels: a truthy result (card found, key accepted, data read), a
+# falsy one (no card, key rejected) and an exception
+OK = 'ok'
+MISS = 'miss'
+ERROR = 'error'
+
+
+class Histogram:
+    """Count, sum and bucketed distribution of observed latencies"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One slot per bucket plus the overflow (+Inf) slot
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) pairs, ending with +Inf"""
+        total = 0
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        pairs = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'buckets': dict(self.cumulative()),
+        }
+
+
+class Metrics:
+    """
+    Labelled latency histograms, in the spirit of Prometheus metrics
+
+    Every observation belongs to a metric and a set of labels, so one
+    histogram per command and outcome gives the attempts (count), the
+    successes and failures (the ok, miss and error outcomes) and where the
+    time went (sum and buckets). Safe to share between the reader threads
+    of a fleet.
+
+    Simulated readers spend their latency on a VirtualClock instead of wall
+    time; pass it as `virtual_clock` and the virtual time the calling thread
+    slept during a call is added to its latency, so simulated RF time is
+    measured too, without the sleeps of other readers sharing the clock.
+    """
+
+    def __init__(self, virtual_clock=None):
+        self.virtual_clock = virtual_clock
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric, seconds, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def call(self, metric, labels, func, *args, **kwargs):
+        """Run func(*args, **kwargs), observing its latency under `metric` with `labels` and the outcome"""
+        outcome = ERROR
+        virtual_start = self.virtual_clock.slept() if self.virtual_clock is not None else 0.0
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            outcome = OK if result else MISS
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            if self.virtual_clock is not None:
+                seconds += self.virtual_clock.slept() - virtual_start
+            self.observe(metric, seconds, outcome=outcome, **labels)
+
+    def to_dict(self):
+        """{metric: [{'labels': {...}, 'count', 'sum', 'mean', 'buckets'}]}"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            data = {}
+            for (metric, labels), histogram in items:
+                data.setdefault(metric, []).append({'labels': dict(labels), **histogram.to_dict()})
+        return data
+
+    def to_prometheus(self):
+        """The histograms in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            items = sorted(self._histograms.items())
+            metric = None
+            for (name, labels), histogram in items:
+                if name != metric:
+                    metric = name
+                    lines.append(f"# TYPE {name} histogram")
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{label_text}{"," if label_text else ""}le="{bound}"}} {count}')
+                lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Save the metrics to `path`: Prometheus text for .prom files, JSON otherwise"""
+        if path.endswith('.prom'):
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.to_dict(), indent=2)
+        _atomic_write(path, data.encode())
+
+
+class Instrumented:
+    """
+    Proxy of a reader or tag that times some of its commands
+
+    Everything else, including hasattr() checks for optional commands, is
+    passed through to the wrapped object.
+    """
+
+    def __init__(self, target, metrics, commands):
+        self._target = target
+        self._metrics = metrics
+        self._commands = commands
+
+    def __getattr__(self, name):
+        if name in ('_target', '_metrics', '_commands'):
+            # Not initialized (e.g. during copying)
+            raise AttributeError(name)
+        attribute = getattr(self._target, name)
+        if name not in self._commands:
+            return attribute
+        metrics = self._metrics
+
+        def timed(*args, **kwargs):
+            return metrics.call(COMMAND_METRIC, {'command': name}, attribute, *args, **kwargs)
+        return timed
+
+    def __repr__(self):
+        return repr(self._target)
+
+    def __str__(self):
+        return str(self._target)
+
+
+def instrument(target, metrics, commands):
+    """Wrap a reader or tag to time `commands`, or return it as is when metrics are disabled"""
+    if metrics is None or target is None:
+        return target
+    return Instrumented(target, metrics, commands)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# NFC Bench - Benchmarks of the dictionary, dump and attack hot paths on simulated cards
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+from argparse import Namespace
+
+from key_store import DEFAULT_KEYS, KeyStore, convert_text_keys
+from simulator import SimulatedDevice
+from nfc_utils import NFCDump
+from nfc_cracker import NFCCracker
+from advanced_attacks import MifareClassicAttacks
+
+BENCHMARKS = ['load_keys', 'crack', 'dump', 'analyze', 'mfoc', 'startup']
+
+DEFAULT_DICT_SIZES = [100, 1000]
+DEFAULT_CARD_TYPES = ["MIFARE Classic 1K", "MIFARE Classic 4K"]
+DEFAULT_LATENCIES = [0.0, 0.0002]
+DEFAULT_CARDS = 3
+
+# Import time budget (median seconds in a fresh interpreter) of the
+# command-line entry points; batch scripts launch them thousands of times
+STARTUP_BUDGETS = {
+    'nfc_cracker': 0.10,
+    'advanced_attacks': 0.10,
+    'dump_corpus': 0.30,
+    'nfc_daemon': 0.10,
+}
+STARTUP_RUNS = 10
+
+# Benchmarks whose peak memory is not worth a traced run
+UNTRACED_BENCHMARKS = ('startup',)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def make_dictionary(size, seed):
+    """
+    In-memory KeyStore of `size` keys: random keys that open nothing,
+    followed by the default keys, so every card has to work through the
+    dictionary until the hit statistics move the right keys forward
+    """
+    rng = random.Random(seed)
+    store = KeyStore()
+    filler = max(0, size - len(DEFAULT_KEYS))
+    store.add_many(rng.getrandbits(48).to_bytes(6, 'big') for _ in range(filler))
+    store.add_many(DEFAULT_KEYS)
+    return store
+
+
+class SectorTimer:
+    """
+    Tag proxy that measures the time spent on each sector
+
+    A sector's time runs from its first authentication attempt until the
+    first authentication attempt on another sector (or stop()).
+    """
+
+    def __init__(self, tag):
+        self._tag = tag
+        self.sector_times = []
+        self._sector = None
+        self._started = None
+
+    def __getattr__(self, name):
+        return getattr(self._tag, name)
+
+    def authenticate(self, sector, key, key_type_a=True):
+        if sector != self._sector:
+            self.stop()
+            self._sector = sector
+            self._started = time.perf_counter()
+        return self._tag.authenticate(sector, key, key_type_a)
+
+    def stop(self):
+        if self._started is not None:
+            self.sector_times.append(time.perf_counter() - self._started)
+            self._started = None
+
+
+def _simulated_tags(card_type, latency, seed, count):
+    device = SimulatedDevice(seed=seed, tag_type=card_type, detect_rate=1.0, latency=latency)
+    return [device.activate(device.sense()) for _ in range(count)]
+
+
+def bench_load_keys(config):
+    """Load a text and a packed dictionary through NFCCracker._load_keys"""
+    cracker = NFCCracker(Namespace(key_file=None, key_store=None, simulation=True),
+                         key_store=KeyStore())
+    rng = random.Random(config['seed'])
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path = os.path.join(tmp, 'keys.txt')
+        packed_path = os.path.join(tmp, 'keys.bin')
+        with open(text_path, 'w') as f:
+            for _ in range(config['dict_size']):
+                f.write(f"{rng.getrandbits(48):012X}\n")
+        convert_text_keys(text_path, packed_path)
+
+        timings = {}
+        for name, path in (('text', text_path), ('packed', packed_path)):
+            start = time.perf_counter()
+            store = cracker._load_keys(path)
+            timings[name] = time.perf_counter() - start
+            for packed in store._packed:
+                packed.close()
+
+    return {
+        'items': 2 * config['dict_size'],
+        'text_load_seconds': timings['text'],
+        'packed_load_seconds': timings['packed'],
+    }
+
+
+def bench_crack(config):
+    """Crack simulated cards with NFCCracker._crack_mifare_classic"""
+    store = make_dictionary(config['dict_size'], config['seed'])
+    cracker = NFCCracker(Namespace(key_file=None, key_store=None, simulation=True), key_store=store)
+    cracker.on_event = lambda kind, data: None
+    cracker.autosave = False
+
+    sector_times, card_times = [], []
+    for tag in _simulated_tags(config['card_type'], config['latency'], config['seed'], config['cards']):
+        timed = SectorTimer(tag)
+        start = time.perf_counter()
+        cracker._crack_mifare_classic(timed)
+        card_times.append(time.perf_counter() - start)
+        timed.stop()
+        sector_times.extend(timed.sector_times)
+    return {'items': len(sector_times), 'sector_times': sector_times, 'card_times': card_times}
+
+
+def bench_dump(config):
+    """Dump simulated cards with NFCDump.dump_mifare_classic"""
+    store = make_dictionary(config['dict_size'], config['seed'])
+
+    sector_times, card_times = [], []
+    for tag in _simulated_tags(config['card_type'], config['latency'], config['seed'], config['cards']):
+        timed = SectorTimer(tag)
+        start = time.perf_counter()
+        NFCDump.dump_mifare_classic(timed, store)
+        card_times.append(time.perf_counter() - start)
+        timed.stop()
+        sector_times.extend(timed.sector_times)
+    return {'items': len(sector_times), 'sector_times': sector_times, 'card_times': card_times}
+
+
+def bench_analyze(config):
+    """Analyze dumps of simulated cards with NFCDump.analyze_dump"""
+    dumps = [NFCDump.dump_mifare_classic(tag, DEFAULT_KEYS)
+             for tag in _simulated_tags(config['card_type'], 0.0, config['seed'], config['cards'])]
+
+    card_times = []
+    for dump in dumps * config['repeat']:
+        start = time.perf_counter()
+        NFCDump.analyze_dump(dump)
+        card_times.append(time.perf_counter() - start)
+    return {'items': len(card_times), 'card_times': card_times}
+
+
+def bench_mfoc(config):
+    """Recover every key of simulated cards with the MFOC flow"""
+    store = make_dictionary(config['dict_size'], config['seed'])
+    card_times, cracked = [], 0
+    for tag in _simulated_tags(config['card_type'], config['latency'], config['seed'], config['cards']):
+        attacks = MifareClassicAttacks(None, keys=store.snapshot(), workers=config['workers'])
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = attacks.mfoc_attack(tag)
+        card_times.append(time.perf_counter() - start)
+        cracked += sum(1 for keys in result.values() if keys['key_a'] or keys['key_b'])
+    return {'items': cracked, 'card_times': card_times}
+
+
+def _import_time(module, cwd):
+    """Seconds a fresh interpreter spends importing `module`, and the wall time of the whole process"""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    repo = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.split()[-1]), time.perf_counter() - start
+
+
+def bench_startup(config):
+    """Cold import time of each command-line entry point against its budget"""
+    modules = {}
+    # The tools create their log files in the working directory
+    with tempfile.TemporaryDirectory() as cwd:
+        for module, budget in STARTUP_BUDGETS.items():
+            imports, processes = zip(*(_import_time(module, cwd) for _ in range(STARTUP_RUNS)))
+            modules[module] = {
+                'budget': budget,
+                'import_p50': percentile(imports, 0.50),
+                'import_p99': percentile(imports, 0.99),
+                'process_p50': percentile(processes, 0.50),
+                'within_budget': percentile(imports, 0.50) <= budget,
+            }
+    return {'items': len(STARTUP_BUDGETS) * STARTUP_RUNS, 'modules': modules}
+
+
+BENCH_FUNCTIONS = {
+    'load_keys': bench_load_keys,
+    'crack': bench_crack,
+    'dump': bench_dump,
+    'analyze': bench_analyze,
+    'mfoc': bench_mfoc,
+    'startup': bench_startup,
+}
+
+# Parameters each benchmark depends on (others are left out of its matrix)
+BENCH_PARAMETERS = {
+    'load_keys': ('dict_size',),
+    'crack': ('card_type', 'dict_size', 'latency'),
+    'dump': ('card_type', 'dict_size', 'latency'),
+    'analyze': ('card_type',),
+    'mfoc': ('card_type', 'latency'),
+    'startup': (),
+}
+
+
+def run_benchmark(name, config, measure_memory=True):
+    """Run one benchmark configuration and summarize it"""
+    func = BENCH_FUNCTIONS[name]
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        raw = func(config)
+    elapsed = time.perf_counter() - start
+
+    result = {'benchmark': name}
+    result.update({param: config[param] for param in BENCH_PARAMETERS[name]})
+    result['elapsed'] = elapsed
+    result['throughput'] = raw.pop('items') / elapsed if elapsed else None
+
+    sector_times = raw.pop('sector_times', None)
+    if sector_times is not None:
+        result['sector_p50'] = percentile(sector_times, 0.50)
+        result['sector_p99'] = percentile(sector_times, 0.99)
+    card_times = raw.pop('card_times', None)
+    if card_times is not None:
+        result['card_p50'] = percentile(card_times, 0.50)
+        result['card_p99'] = percentile(card_times, 0.99)
+    result.update(raw)
+
+    # Peak memory comes from a separate traced run on one card without
+    # latency: tracemalloc slows the hot paths down too much to time them
+    # in the same run
+    if measure_memory and name not in UNTRACED_BENCHMARKS:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                func(dict(config, cards=1, repeat=1, latency=0.0))
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def _configurations(name, args):
+    """Parameter matrix of one benchmark"""
+    axes = {
+        'card_type': args.card_types,
+        'dict_size': args.dict_sizes,
+        'latency': args.latencies,
+    }
+    configs = [{}]
+    for param in BENCH_PARAMETERS[name]:
+        configs = [dict(config, **{param: value}) for config in configs for value in axes[param]]
+    for config in configs:
+        config.update(seed=args.seed, cards=args.cards, repeat=args.repeat, workers=args.workers)
+        config.setdefault('card_type', DEFAULT_CARD_TYPES[0])
+        config.setdefault('dict_size', len(DEFAULT_KEYS))
+        config.setdefault('latency', 0.0)
+    return configs
+
+
+def _environment():
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': numpy_version,
+        'cpus': os.cpu_count(),
+    }
+
+
+def _csv(convert):
+    return lambda value: [convert(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the NFC cracker hot paths on simulated cards')
+    parser.add_argument('-b', '--benchmarks', type=_csv(str), default=BENCHMARKS,
+                        help=f'Comma-separated benchmarks to run (default: {",".join(BENCHMARKS)})')
+    parser.add_argument('--dict-sizes', type=_csv(int), default=DEFAULT_DICT_SIZES,
+                        help='Comma-separated dictionary sizes (default: 100,1000)')
+    parser.add_argument('--card-types', type=_csv(str), default=DEFAULT_CARD_TYPES,
+                        help='Comma-separated simulated card types (default: MIFARE Classic 1K,MIFARE Classic 4K)')
+    parser.add_argument('--latencies', type=_csv(float), default=DEFAULT_LATENCIES,
+                        help='Comma-separated simulated seconds per card command (default: 0,0.0002)')
+    parser.add_argument('--cards', type=int, default=DEFAULT_CARDS,
+                        help=f'Simulated cards per configuration (default: {DEFAULT_CARDS})')
+    parser.add_argument('--repeat', type=int, default=100,
+                        help='Passes over the dumps in the analyze benchmark (default: 100)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Worker processes for the MFOC key recovery (default: 1)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the simulated cards and dictionaries (default: 0)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Skip the traced runs that measure peak memory')
+    parser.add_argument('-o', '--output', help='Write the JSON report to a file instead of stdout')
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # The code under test logs every key dictionary it loads
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    for name in args.benchmarks:
+        for config in _configurations(name, args):
+            print(f"Running {name} {config}", file=sys.stderr)
+            results.append(run_benchmark(name, config, measure_memory=not args.no_memory))
+
+    report = {'environment': _environment(), 'seed': args.seed, 'results': results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    # A blown start-up budget fails the run, so batch scripts and CI notice
+    over_budget = [module for result in results for module, timing in result.get('modules', {}).items()
+                   if not timing['within_budget']]
+    if over_budget:
+        print(f"Import time over budget: {', '.join(over_budget)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
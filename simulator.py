@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# Simulator - Deterministic simulated NFC readers and tags for testing without hardware
+
+import os
+import random
+
+from crypto1 import DEFAULT_KEY_RANGE, int_to_key, prng_successor, nested_trace, darkside_trace
+from nfc_utils import CLASSIC_SECTORS, card_geometry
+from clock import SYSTEM_CLOCK
+
+# Pages of 4 bytes per MIFARE Ultralight variant
+ULTRALIGHT_PAGES = {
+    "MIFARE Ultralight": 16,
+    "MIFARE Ultralight C": 48,
+}
+
+SIMULATED_CARD_TYPES = list(CLASSIC_SECTORS) + list(ULTRALIGHT_PAGES)
+
+# Sector keys of simulated MIFARE Classic cards: sectors below 5 use the
+# default key, sectors below 10 the common A0../B0.. keys, and the rest keys
+# outside the default dictionary that only the nested or darkside attacks
+# recover
+DEFAULT_SECTOR_KEYS = (bytes.fromhex("FFFFFFFFFFFF"), bytes.fromhex("FFFFFFFFFFFF"))
+COMMON_SECTOR_KEYS = (bytes.fromhex("A0A1A2A3A4A5"), bytes.fromhex("B0B1B2B3B4B5"))
+
+# Transport configuration access bits (key B readable, data blocks open to both keys)
+TRANSPORT_ACCESS_BITS = bytes.fromhex("FF078069")
+
+# Fraction of polls that find a card
+DEFAULT_DETECT_RATE = 0.8
+
+
+class SimulatedFailure(Exception):
+    """A simulated RF command that got no (valid) answer"""
+
+
+class LatencyModel:
+    """
+    Per-command cost of a simulated reader
+
+    Every tag command waits `latency` seconds plus up to `jitter` seconds
+    on `clock`, and fails with SimulatedFailure with probability
+    `failure_rate`. The default model is free and never fails.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, rng=None, clock=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = rng or random.Random()
+        self.clock = clock or SYSTEM_CLOCK
+        self.commands = 0
+
+    def command(self, name):
+        """Account for one command, raising SimulatedFailure if it fails"""
+        self.commands += 1
+        delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            self.clock.sleep(delay)
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            raise SimulatedFailure(f"{name} timed out")
+
+
+def _random_bytes(rng, count):
+    """Bulk random bytes from a seeded generator, or the OS when unseeded"""
+    if rng is None:
+        return os.urandom(count)
+    return rng.getrandbits(count * 8).to_bytes(count, 'little') if count else b''
+
+
+class SimulatedTag:
+    """
+    A simulated MIFARE Classic tag
+
+    Memory is one bytearray filled in a single call, from `seed` when given
+    (so the same seed always yields the same UID, data, keys and nonces)
+    or from os.urandom otherwise. Sector trailers hold the sector keys and
+    transport access bits; key A reads back as zeros like on real cards.
+    """
+
+    def __init__(self, tag_type="MIFARE Classic 1K", seed=None, latency=None):
+        self.product = tag_type
+        self.rng = random.Random(seed)
+        self.latency = latency or LatencyModel(rng=self.rng)
+        self.geometry = card_geometry(tag_type)
+        self.size = self.geometry.num_blocks * 16
+        bulk = self.rng if seed is not None else None
+
+        self.identifier = _random_bytes(bulk, 4)
+        self._memory = bytearray(_random_bytes(bulk, self.size))
+        self._nonce = self.rng.getrandbits(32)
+        self._keys = {}
+
+        for sector, layout in enumerate(self.geometry.sectors):
+            if sector < 5:
+                key_a, key_b = DEFAULT_SECTOR_KEYS
+            elif sector < 10:
+                key_a, key_b = COMMON_SECTOR_KEYS
+            else:
+                key_a = int_to_key(self.rng.randrange(*DEFAULT_KEY_RANGE))
+                key_b = int_to_key(self.rng.randrange(*DEFAULT_KEY_RANGE))
+            self._keys[sector] = {'A': key_a, 'B': key_b}
+
+            offset = layout.trailer_block * 16
+            self._memory[offset:offset + 16] = bytes(6) + TRANSPORT_ACCESS_BITS + key_b
+
+        # Manufacturer block: UID, BCC, then manufacturer data
+        bcc = self.identifier[0] ^ self.identifier[1] ^ self.identifier[2] ^ self.identifier[3]
+        self._memory[0:5] = self.identifier + bytes([bcc])
+
+    def authenticate(self, sector, key, key_type_a=True):
+        """Simulate authentication with a sector"""
+        self.latency.command('authenticate')
+        keys = self._keys.get(sector)
+        return keys is not None and key == keys['A' if key_type_a else 'B']
+
+    def read(self, block):
+        """Simulate reading a block"""
+        self.latency.command('read')
+        if not 0 <= block < self.geometry.num_blocks:
+            raise SimulatedFailure("Failed to read block")
+        return bytes(self._memory[block * 16:(block + 1) * 16])
+
+    def read_blocks(self, first_block, count):
+        """Simulate a bulk read of consecutive blocks in one command"""
+        self.latency.command('read_blocks')
+        if first_block < 0 or first_block + count > self.geometry.num_blocks:
+            raise SimulatedFailure("Failed to read blocks")
+        return bytes(self._memory[first_block * 16:(first_block + count) * 16])
+
+    def _next_nonce(self):
+        """Advance the card PRNG to the next tag nonce"""
+        self._nonce = prng_successor(self._nonce, self.rng.randint(160, 320))
+        return self._nonce
+
+    def nested_nonce(self, known_sector, known_key, target_sector, key_type_a=True,
+                     known_key_type_a=True):
+        """Simulate a nested authentication and return (nt, encrypted nt)"""
+        if not self.authenticate(known_sector, known_key, known_key_type_a):
+            raise SimulatedFailure("Authentication with known key failed")
+
+        self.latency.command('nested_nonce')
+        key = self._keys.get(target_sector, {}).get('A' if key_type_a else 'B')
+        if key is None:
+            raise SimulatedFailure("Target sector did not answer")
+
+        uid = int.from_bytes(self.identifier[:4], 'big')
+        trace = nested_trace(key, uid, self._next_nonce())
+        return trace.nt, trace.nt_enc
+
+    def darkside_nack(self, sector, key_type_a, nr_enc):
+        """Simulate a failed authentication and return (nt, encrypted NACK)"""
+        self.latency.command('darkside_nack')
+        key = self._keys.get(sector, {}).get('A' if key_type_a else 'B')
+        if key is None:
+            raise SimulatedFailure("Sector did not answer")
+
+        uid = int.from_bytes(self.identifier[:4], 'big')
+        trace = darkside_trace(key, uid, self._next_nonce(), nr_enc)
+        return trace.nt, trace.nack_enc
+
+
+class SimulatedUltralight:
+    """A simulated MIFARE Ultralight / Ultralight C tag"""
+
+    def __init__(self, tag_type="MIFARE Ultralight", seed=None, latency=None):
+        self.product = tag_type
+        self.rng = random.Random(seed)
+        self.latency = latency or LatencyModel(rng=self.rng)
+        self.num_pages = ULTRALIGHT_PAGES[tag_type]
+        self.size = self.num_pages * 4
+        bulk = self.rng if seed is not None else None
+
+        # 7-byte UID stored in pages 0-2 with its two check bytes
+        self.identifier = b'\x04' + _random_bytes(bulk, 6)
+        self._memory = bytearray(_random_bytes(bulk, self.size))
+        uid = self.identifier
+        self._memory[0:3] = uid[0:3]
+        self._memory[3] = 0x88 ^ uid[0] ^ uid[1] ^ uid[2]
+        self._memory[4:8] = uid[3:7]
+        self._memory[8] = uid[3] ^ uid[4] ^ uid[5] ^ uid[6]
+
+    def read(self, page):
+        """Simulate a READ command: four pages starting at `page`, wrapping around"""
+        self.latency.command('read')
+        if not 0 <= page < self.num_pages:
+            raise SimulatedFailure("Failed to read page")
+        data = self._memory + self._memory[:16]
+        return bytes(data[page * 4:page * 4 + 16])
+
+
+class SimulatedDevice:
+    """
+    A simulated NFC reader for testing without hardware
+
+    Polls find a card with probability `detect_rate`; activate() then
+    returns a new simulated tag of `tag_type`. With a seed the sequence of
+    polls and cards is reproducible. Command latency is spent on `clock`
+    (a VirtualClock makes it free in wall time).
+    """
+
+    def __init__(self, seed=None, tag_type="MIFARE Classic 1K", detect_rate=DEFAULT_DETECT_RATE,
+                 latency=0.0, jitter=0.0, failure_rate=0.0, clock=None):
+        if tag_type not in SIMULATED_CARD_TYPES:
+            raise ValueError(f"Cannot simulate {tag_type}")
+        self.name = "Simulated NFC Reader"
+        self.seed = seed
+        self.tag_type = tag_type
+        self.detect_rate = detect_rate
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, jitter, failure_rate, rng=self.rng, clock=clock)
+
+    def sense(self, *targets, **options):
+        """Simulate sensing a card"""
+        if self.rng.random() < self.detect_rate:
+            return "Simulated Card"
+        return None
+
+    def activate(self, target):
+        """Return a new simulated tag for a sensed target"""
+        seed = self.rng.getrandbits(64) if self.seed is not None else None
+        tag_class = SimulatedUltralight if self.tag_type in ULTRALIGHT_PAGES else SimulatedTag
+        return tag_class(self.tag_type, seed=seed, latency=self.latency)
+
+    def close(self):
+        """Simulate closing the device"""
+        pass
+
+
+def add_simulation_arguments(parser):
+    """Add the simulated reader options to an argparse parser"""
+    parser.add_argument('--seed', type=int,
+                        help='Seed for reproducible simulated readers and cards')
+    parser.add_argument('--sim-card', choices=SIMULATED_CARD_TYPES, default="MIFARE Classic 1K",
+                        help='Card type presented by simulated readers (default: MIFARE Classic 1K)')
+    parser.add_argument('--sim-latency', type=float, default=0.0,
+                        help='Simulated seconds per card command (default: 0)')
+    parser.add_argument('--sim-failure-rate', type=float, default=0.0,
+                        help='Probability that a simulated card command fails (default: 0)')
+
+
+def device_from_args(args, index=0, clock=None):
+    """Create the simulated reader configured on the command line (`index` offsets the seed)"""
+    seed = args.seed + index if args.seed is not None else None
+    return SimulatedDevice(seed=seed, tag_type=args.sim_card, latency=args.sim_latency,
+                           failure_rate=args.sim_failure_rate, clock=clock)
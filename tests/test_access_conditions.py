@@ -0,0 +1,114 @@
+# Sector trailer access bits against the MF1S50 datasheet tables
+
+import itertools
+
+import pytest
+
+from access_conditions import (NO_ACCESS, TRANSPORT_ACCESS, block_group, block_permissions,
+                               decode_access_bytes, decode_trailer, describe, encode_access_bits,
+                               readable_blocks)
+from nfc_utils import card_geometry
+
+# MF1S50 table 8, data blocks: C1C2C3 -> read, write, increment,
+# decrement/transfer/restore ("" = never)
+DATASHEET_DATA = [
+    ("000", "AB", "AB", "AB", "AB"),
+    ("010", "AB", "", "", ""),
+    ("100", "AB", "B", "", ""),
+    ("110", "AB", "B", "B", "AB"),
+    ("001", "AB", "", "", "AB"),
+    ("011", "B", "B", "", ""),
+    ("101", "B", "", "", ""),
+    ("111", "", "", "", ""),
+]
+
+# MF1S50 table 7, sector trailer: C1C2C3 -> key A read/write, access bits
+# read/write, key B read/write
+DATASHEET_TRAILER = [
+    ("000", "", "A", "A", "", "A", "A"),
+    ("010", "", "", "A", "", "A", ""),
+    ("100", "", "B", "AB", "", "", "B"),
+    ("110", "", "", "AB", "", "", ""),
+    ("001", "", "A", "A", "A", "A", "A"),
+    ("011", "", "B", "AB", "B", "", "B"),
+    ("101", "", "", "AB", "B", "", ""),
+    ("111", "", "", "AB", "", "", ""),
+]
+
+# Trailer code whose key B is secret, so key B keeps its data permissions
+SECRET_KEY_B = 0b011
+
+
+@pytest.mark.parametrize('code, read, write, increment, decrement', DATASHEET_DATA)
+def test_data_block_permissions(code, read, write, increment, decrement):
+    conditions = decode_access_bytes(encode_access_bits((int(code, 2),) * 3 + (SECRET_KEY_B,)))
+
+    assert conditions.valid
+    for group in range(3):
+        assert tuple(conditions.data[group]) == (read, write, increment, decrement)
+
+
+@pytest.mark.parametrize('code, key_a_read, key_a_write, access_read, access_write, key_b_read, key_b_write',
+                         DATASHEET_TRAILER)
+def test_trailer_permissions(code, key_a_read, key_a_write, access_read, access_write,
+                             key_b_read, key_b_write):
+    conditions = decode_access_bytes(encode_access_bits((0, 0, 0, int(code, 2))))
+
+    assert conditions.valid
+    assert tuple(conditions.trailer) == (key_a_read, key_a_write, access_read, access_write,
+                                         key_b_read, key_b_write)
+
+
+def test_readable_key_b_grants_no_data_access():
+    # Transport configuration: key B is readable with key A, so only key A
+    # authenticates for the data blocks
+    conditions = decode_access_bytes(TRANSPORT_ACCESS)
+
+    assert conditions.valid
+    assert conditions.bits == (0b000, 0b000, 0b000, 0b001)
+    assert tuple(conditions.data[0]) == ("A", "A", "A", "A")
+    assert readable_blocks(conditions, 4, "B") == set()
+    assert readable_blocks(conditions, 4, "A") == {0, 1, 2, 3}
+
+
+def test_decode_known_trailer():
+    # 78 77 88: data blocks read AB / write B, trailer managed with key B
+    conditions = decode_trailer(bytes(6) + bytes.fromhex("787788") + bytes(7))
+
+    assert conditions.valid
+    assert conditions.bits == (0b100, 0b100, 0b100, 0b011)
+
+
+@pytest.mark.parametrize('byte, mask', [(0, 0x01), (0, 0x10), (1, 0x01)])
+def test_mismatched_inverted_bits_are_rejected(byte, mask):
+    access = bytearray(encode_access_bits((0b100, 0b100, 0b100, SECRET_KEY_B)))
+    access[byte] ^= mask
+    conditions = decode_access_bytes(bytes(access))
+
+    assert not conditions.valid
+    assert block_permissions(conditions, 4, 0) == NO_ACCESS
+    assert readable_blocks(conditions, 4, "A") == set()
+    assert readable_blocks(conditions, 4, "B") == set()
+    assert describe(conditions) == {'valid': False}
+
+
+def test_encode_decode_round_trip():
+    for bits in itertools.product(range(8), repeat=4):
+        access = encode_access_bits(bits)
+        conditions = decode_access_bytes(access)
+        assert conditions.valid
+        assert conditions.bits == bits
+
+
+def test_16_block_sectors_of_a_4k_card():
+    geometry = card_geometry("MIFARE Classic 4K")
+    # Data groups 0-2 readable by key A, key B and never, respectively
+    conditions = decode_access_bytes(encode_access_bits((0b000, 0b101, 0b111, SECRET_KEY_B)))
+
+    for sector in range(32, 40):
+        layout = geometry.sectors[sector]
+        assert layout.block_count == 16
+        assert [block_group(16, offset) for offset in range(16)] == [0] * 5 + [1] * 5 + [2] * 5 + [3]
+        assert block_permissions(conditions, 16, 15) == NO_ACCESS
+        assert readable_blocks(conditions, 16, "A") == set(range(5)) | {15}
+        assert readable_blocks(conditions, 16, "B") == set(range(10)) | {15}
@@ -0,0 +1,63 @@
+# MFOC attack flow on simulated cards
+
+import io
+import pickle
+import contextlib
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
+
+from advanced_attacks import MifareClassicAttacks, _timed_solve
+from key_store import DEFAULT_KEYS, KeyStore, convert_text_keys
+from simulator import SimulatedTag
+
+
+def test_mfoc_blocks_while_the_solver_backlog_is_full(monkeypatch):
+    # With one worker the backlog fills after two captures; collecting the
+    # results must then block in wait() instead of polling it
+    polls = []
+    real_wait = concurrent.futures.wait
+
+    def counting_wait(futures, timeout=None, return_when=concurrent.futures.ALL_COMPLETED):
+        done, pending = real_wait(futures, timeout, return_when)
+        polls.append(len(done))
+        return done, pending
+    monkeypatch.setattr(concurrent.futures, 'wait', counting_wait)
+
+    tag = SimulatedTag("MIFARE Classic 1K", seed=7)
+    attacks = MifareClassicAttacks(None, keys=DEFAULT_KEYS, workers=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = attacks.mfoc_attack(tag)
+
+    assert all(keys['key_a'] and keys['key_b'] for keys in result.values())
+    assert polls
+    assert 0 not in polls
+
+
+def test_mfoc_sends_the_candidate_keys_once_per_worker(tmp_path, monkeypatch):
+    # The key store's packed dictionary goes to each worker by path; the
+    # solver tasks only carry the captured traces (key space shards of the
+    # darkside search carry their own slice of the candidates)
+    packed_path = tmp_path / 'keys.bin'
+    (tmp_path / 'keys.txt').write_text('\n'.join(f'{i:012X}' for i in range(1, 5000)))
+    convert_text_keys(str(tmp_path / 'keys.txt'), str(packed_path))
+    store = KeyStore()
+    store.add_many(DEFAULT_KEYS)
+    store.attach(str(packed_path))
+
+    tasks = []
+    real_submit = ProcessPoolExecutor.submit
+
+    def recording_submit(pool, func, *args, **kwargs):
+        if func is _timed_solve:
+            tasks.append(len(pickle.dumps(args)))
+        return real_submit(pool, func, *args, **kwargs)
+    monkeypatch.setattr(ProcessPoolExecutor, 'submit', recording_submit)
+
+    tag = SimulatedTag("MIFARE Classic 1K", seed=7)
+    attacks = MifareClassicAttacks(None, workers=2, key_store=store)
+    assert len(pickle.dumps(attacks.keys)) < 1024
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = attacks.mfoc_attack(tag)
+
+    assert all(keys['key_a'] and keys['key_b'] for keys in result.values())
+    assert tasks and max(tasks) < 1024
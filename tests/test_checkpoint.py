@@ -0,0 +1,90 @@
+# Resumable attack progress shared by the readers of a fleet
+
+import io
+import threading
+import contextlib
+
+import checkpoint
+from advanced_attacks import MifareClassicAttacks
+from checkpoint import CheckpointStore
+from key_store import DEFAULT_KEYS
+from simulator import SimulatedTag
+
+
+class FlakyTag:
+    """Tag proxy that is taken off the reader after `budget` nested captures"""
+
+    def __init__(self, tag, budget):
+        self.tag = tag
+        self.budget = budget
+        self.captures = 0
+
+    def __getattr__(self, name):
+        return getattr(self.tag, name)
+
+    def nested_nonce(self, *args, **kwargs):
+        if self.captures >= self.budget:
+            raise IOError("Card removed")
+        self.captures += 1
+        return self.tag.nested_nonce(*args, **kwargs)
+
+
+def _mfoc(path, tag):
+    attacks = MifareClassicAttacks(None, keys=DEFAULT_KEYS, workers=1, checkpoints=CheckpointStore(path))
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        result = attacks.mfoc_attack(tag)
+    return result, output.getvalue()
+
+
+def test_interrupted_mfoc_resumes_from_the_checkpoint(tmp_path):
+    path = str(tmp_path / 'checkpoints.json')
+    tag = SimulatedTag("MIFARE Classic 1K", seed=7)
+    uid = tag.identifier
+
+    interrupted = FlakyTag(tag, budget=6)
+    _, output = _mfoc(path, interrupted)
+    assert "present the card again" in output
+    saved = CheckpointStore(path).get(uid)
+    assert saved.keys()
+
+    resumed = FlakyTag(tag, budget=1 << 20)
+    result, output = _mfoc(path, resumed)
+    assert "Resuming an interrupted attack" in output
+    assert all(keys['key_a'] and keys['key_b'] for keys in result.values())
+    assert uid not in CheckpointStore(path)
+
+    # The resumed run captures only what the first run did not solve
+    fresh = FlakyTag(SimulatedTag("MIFARE Classic 1K", seed=7), budget=1 << 20)
+    _mfoc(str(tmp_path / 'fresh.json'), fresh)
+    assert resumed.captures < fresh.captures
+
+
+def test_save_writes_outside_the_store_lock(tmp_path, monkeypatch):
+    # A reader blocked on a slow disk must not hold up the other readers
+    writing, release = threading.Event(), threading.Event()
+    real_atomic_write = checkpoint._atomic_write
+
+    def slow_atomic_write(path, data):
+        writing.set()
+        release.wait(5)
+        real_atomic_write(path, data)
+    monkeypatch.setattr(checkpoint, '_atomic_write', slow_atomic_write)
+
+    store = CheckpointStore(str(tmp_path / 'checkpoints.json'))
+    store.get(b'\x01\x02\x03\x04').set_key(0, 'A', DEFAULT_KEYS[0])
+    saver = threading.Thread(target=store.save)
+    saver.start()
+    try:
+        assert writing.wait(5)
+        other = threading.Thread(target=lambda: store.get(b'\x05\x06\x07\x08').set_key(1, 'B', DEFAULT_KEYS[1]))
+        other.start()
+        other.join(1)
+        assert not other.is_alive()
+    finally:
+        release.set()
+        saver.join()
+
+    store.save()
+    reloaded = CheckpointStore(str(tmp_path / 'checkpoints.json'))
+    assert reloaded.get(b'\x01\x02\x03\x04').key(0, 'A') == DEFAULT_KEYS[0]
+    assert reloaded.get(b'\x05\x06\x07\x08').key(1, 'B') == DEFAULT_KEYS[1]
@@ -0,0 +1,79 @@
+# Crypto1 reference cipher and the bitsliced key filter
+
+import random
+
+import pytest
+
+import crypto1
+from crypto1 import (Crypto1, DarksideTrace, _filter, _filter_bitsliced, _matches, _trace_program,
+                     darkside_trace, filter_keys, int_to_key, key_chunks, key_to_int, nested_trace,
+                     prng_successor, recover_key)
+
+# mfkey64 test vector: uid, nt, {nr}, {ar}, {at} of an authentication with
+# key FFFFFFFFFFFF
+MFKEY64_KEY = bytes.fromhex('FFFFFFFFFFFF')
+MFKEY64_UID = 0x9C599B32
+MFKEY64_NT = 0x82A4166C
+MFKEY64_NR_ENC = 0xA1E458CE
+MFKEY64_AR_ENC = 0x6EEA41E0
+MFKEY64_AT_ENC = 0x5CADF439
+
+
+def test_mfkey64_vector():
+    cipher = Crypto1(MFKEY64_KEY)
+    cipher.word(MFKEY64_UID ^ MFKEY64_NT)
+    cipher.word(MFKEY64_NR_ENC, encrypted=True)
+    assert cipher.word() ^ prng_successor(MFKEY64_NT, 64) == MFKEY64_AR_ENC
+    assert cipher.word() ^ prng_successor(MFKEY64_NT, 96) == MFKEY64_AT_ENC
+
+
+@pytest.fixture
+def np():
+    numpy = pytest.importorskip('numpy')
+    crypto1._numpy()
+    return numpy
+
+
+def _scalar(keys, program):
+    return [key for key in keys if _matches(int_to_key(key), program)]
+
+
+def test_bitsliced_keystream_matches_scalar(np):
+    keys = np.array([random.Random(1).getrandbits(48) for _ in range(128)], dtype=np.uint64)
+    window = crypto1._bitslice(keys)
+    ks = _filter(window)
+    for word in range(2):
+        for lane in range(64):
+            expected = Crypto1(int_to_key(int(keys[64 * word + lane]))).peek()
+            assert (int(ks[word]) >> lane) & 1 == expected
+
+
+def test_bitsliced_filter_matches_scalar_on_arrays(np):
+    rng = random.Random(2)
+    # Four observed keystream bits: about one key in 16 survives
+    program = _trace_program(DarksideTrace(0x01020304, 0x0A0B0C0D, 0x11223344, 0x7))
+    keys = [rng.getrandbits(48) for _ in range(1000)]  # Not a whole number of words
+    survivors = _filter_bitsliced(np.asarray(keys, dtype=np.uint64), program)
+    assert [int(key) for key in survivors] == _scalar(keys, program)
+    assert survivors.size
+
+
+def test_bitsliced_filter_matches_scalar_on_ranges(np):
+    program = _trace_program(DarksideTrace(0x01020304, 0x0A0B0C0D, 0x11223344, 0x7))
+    keys = range(0xA0A1A2A30000 + 37, 0xA0A1A2A30000 + 37 + 700)  # Unaligned start and stop
+    survivors = _filter_bitsliced(keys, program)
+    assert [int(key) for key in survivors] == _scalar(keys, program)
+
+
+def test_nested_recovery_finds_the_key(np):
+    key = int_to_key(0x3A7C5)
+    traces = [nested_trace(key, 0xDEADBEEF, nt) for nt in (0x01200145, 0x8A3F10C2)]
+    assert filter_keys(range(1 << 18), traces) == [key_to_int(key)]
+    assert recover_key(traces, key_chunks([bytes(6)], (0, 1 << 20), batch_size=1 << 16)) == key
+
+
+def test_darkside_traces_accept_their_key():
+    key = bytes.fromhex('A0A1A2A3A4A5')
+    rng = random.Random(3)
+    traces = [darkside_trace(key, 0xDEADBEEF, rng.getrandbits(32), rng.getrandbits(32)) for _ in range(16)]
+    assert all(_matches(key, _trace_program(trace)) for trace in traces)
@@ -0,0 +1,74 @@
+# Daemon jobs on a simulated fleet
+
+import os
+import sys
+import time
+import socket
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import nfc_daemon
+
+DAEMON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nfc_daemon.py')
+
+# Wrong keys that keep the dump's dictionary loop busy while MFOC runs
+DICTIONARY_SIZE = 15000
+# Seconds MFOC runs before the dump starts
+DUMP_DELAY = 0.5
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """A simulated two-reader daemon; yields (socket path, process)"""
+    socket_path = str(tmp_path / 'nfc_daemon.sock')
+    key_file = tmp_path / 'keys.txt'
+    key_file.write_text(''.join(f"{0xDEAD00000000 + index:012X}\n" for index in range(DICTIONARY_SIZE)))
+    process = subprocess.Popen(
+        [sys.executable, DAEMON, '--socket', socket_path, 'serve', '--simulation', '--fleet',
+         '--sim-readers', '2', '--seed', '1', '--key-file', str(key_file), '--log-file', ''],
+        cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + 30
+    while not os.path.exists(socket_path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.fail(f"daemon did not start: {process.communicate()}")
+        time.sleep(0.05)
+    try:
+        yield socket_path, process
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def test_mfoc_and_dump_jobs_share_the_key_store(daemon):
+    # MFOC adds recovered keys to the shared dictionary on one reader
+    # thread while the dump iterates it on the other
+    socket_path, process = daemon
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for _ in range(3):
+            mfoc = pool.submit(nfc_daemon.call, 'mfoc', {'timeout': 30}, socket_path)
+            # Dump while MFOC recovers its keys, after its initial key search
+            time.sleep(DUMP_DELAY)
+            dump = pool.submit(nfc_daemon.call, 'dump', {'timeout': 30}, socket_path)
+            mfoc, dump = mfoc.result(), dump.result()
+            assert mfoc['reader'] != dump['reader']
+            assert all(keys['key_a'] and keys['key_b'] for keys in mfoc['sectors'].values())
+            assert dump['blocks']
+
+    status = nfc_daemon.call('status', socket_path=socket_path)
+    assert status['jobs'] == 6
+    assert status['idle_readers'] == 2
+
+
+def test_stop_with_idle_connections_is_clean(daemon):
+    socket_path, process = daemon
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+        idle.connect(socket_path)
+        assert nfc_daemon.call('stop', socket_path=socket_path) == {'stopping': True}
+        _, stderr = process.communicate(timeout=30)
+    assert process.returncode == 0
+    assert 'ERROR' not in stderr
+    assert not os.path.exists(socket_path)
@@ -0,0 +1,39 @@
+# Sharding of the candidate key space across worker processes
+
+import pytest
+
+import key_search
+from crypto1 import DEFAULT_BATCH_SIZE, DEFAULT_KEY_RANGE, int_to_key, key_chunks, nested_trace
+from key_search import MAX_SHARD_SIZE, candidate_count, search_key_space, shard_size_for
+from key_store import DEFAULT_KEYS
+
+
+@pytest.mark.parametrize('workers', [2, 4, 8, 16])
+def test_default_key_space_gives_every_worker_a_shard(workers):
+    shard_size = shard_size_for(candidate_count(DEFAULT_KEYS, DEFAULT_KEY_RANGE), workers)
+    shards = list(key_chunks(DEFAULT_KEYS, DEFAULT_KEY_RANGE, shard_size))
+    assert len(shards) >= workers
+
+
+def test_shard_size_is_whole_filter_batches_within_bounds():
+    assert shard_size_for(1, 4) == DEFAULT_BATCH_SIZE
+    assert shard_size_for(1 << 40, 4) == MAX_SHARD_SIZE
+    assert shard_size_for(5 * DEFAULT_BATCH_SIZE * 4 * 3, 3) % DEFAULT_BATCH_SIZE == 0
+
+
+def test_search_key_space_shards_by_candidate_count(monkeypatch):
+    shard_sizes = []
+    real_key_chunks = key_search.key_chunks
+
+    def recording_key_chunks(keys, key_range, batch_size):
+        shard_sizes.append(batch_size)
+        return real_key_chunks(keys, key_range, batch_size)
+
+    monkeypatch.setattr(key_search, 'key_chunks', recording_key_chunks)
+    key = int_to_key(3 * DEFAULT_BATCH_SIZE + 12345)
+    traces = [nested_trace(key, 0xDEADBEEF, nt) for nt in (0x01200145, 0x8A3F10C2)]
+
+    assert search_key_space(traces, DEFAULT_KEYS, DEFAULT_KEY_RANGE, workers=2) == key
+    count = candidate_count(DEFAULT_KEYS, DEFAULT_KEY_RANGE)
+    assert shard_sizes == [shard_size_for(count, 2)]
+    assert -(-count // shard_sizes[0]) >= 2
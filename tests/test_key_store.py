@@ -0,0 +1,47 @@
+# Key dictionaries handed to the offline key recovery
+
+import pickle
+
+from crypto1 import key_chunks, key_to_int
+from key_store import KeyStore, convert_text_keys
+
+
+def _store_with_packed(tmp_path, count):
+    text_path = tmp_path / 'keys.txt'
+    text_path.write_text('\n'.join(f'{i:012X}' for i in range(1000, 1000 + count)))
+    convert_text_keys(str(text_path), str(tmp_path / 'keys.bin'))
+    store = KeyStore()
+    store.add(bytes.fromhex('FFFFFFFFFFFF'))
+    store.add(bytes.fromhex('A0A1A2A3A4A5'))
+    store.attach(str(tmp_path / 'keys.bin'))
+    return store
+
+
+def test_snapshot_streams_memory_keys_then_packed_keys(tmp_path):
+    store = _store_with_packed(tmp_path, 300)
+    snapshot = store.snapshot()
+
+    assert len(snapshot) == 302
+    assert list(snapshot) == list(store)
+    chunks = list(key_chunks(snapshot, None, 128))
+    assert [key for chunk in chunks for key in chunk] == [key_to_int(key) for key in store]
+
+
+def test_snapshot_pickles_packed_dictionaries_by_path(tmp_path):
+    store = _store_with_packed(tmp_path, 100000)
+    snapshot = store.snapshot()
+
+    data = pickle.dumps(snapshot)
+    assert len(data) < 1024
+    copy = pickle.loads(data)
+    assert len(copy) == len(snapshot)
+    assert list(key_chunks(copy, None, 4096)) == list(key_chunks(snapshot, None, 4096))
+
+
+def test_snapshot_ignores_keys_added_later(tmp_path):
+    store = _store_with_packed(tmp_path, 10)
+    snapshot = store.snapshot()
+    store.add(bytes.fromhex('B0B1B2B3B4B5'))
+
+    assert len(snapshot) == 12
+    assert bytes.fromhex('B0B1B2B3B4B5') not in list(snapshot)
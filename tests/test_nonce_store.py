@@ -0,0 +1,56 @@
+# Nonce files written by capture stations and read back by the solver
+
+import pytest
+
+from crypto1 import DarksideTrace, NestedTrace
+from nonce_store import NONCE_MAGIC, RECORD, NonceWriter, Target, read_traces
+
+NESTED_TRACES = [NestedTrace(0x01020304, 0x01200145, 0x11111111),
+                 NestedTrace(0x01020304, 0x8A3F10C2, 0x22222222)]
+DARKSIDE_TRACES = [DarksideTrace(0x01020304, 0x01200145, 0x33333333, 0x5)]
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'nonces.bin'
+    with NonceWriter(str(path)) as writer:
+        writer.add(3, True, NESTED_TRACES)
+        writer.add(0, False, DARKSIDE_TRACES)
+
+    assert read_traces(str(path)) == {Target(0x01020304, 3, 'A'): NESTED_TRACES,
+                                      Target(0x01020304, 0, 'B'): DARKSIDE_TRACES}
+
+
+def test_torn_record_is_cut_before_appending(tmp_path):
+    path = tmp_path / 'nonces.bin'
+    with NonceWriter(str(path)) as writer:
+        writer.add(3, True, NESTED_TRACES[:1])
+    # An interrupted capture left half a record behind
+    with open(path, 'ab') as f:
+        f.write(RECORD.pack(1, 3, 0, 1, 2, 3, 0)[:RECORD.size // 2])
+    assert read_traces(str(path)) == {Target(0x01020304, 3, 'A'): NESTED_TRACES[:1]}
+
+    with NonceWriter(str(path)) as writer:
+        writer.add(3, True, NESTED_TRACES[1:])
+
+    assert path.stat().st_size == len(NONCE_MAGIC) + 2 * RECORD.size
+    assert read_traces(str(path)) == {Target(0x01020304, 3, 'A'): NESTED_TRACES}
+
+
+def test_torn_header_is_rewritten(tmp_path):
+    path = tmp_path / 'nonces.bin'
+    path.write_bytes(NONCE_MAGIC[:3])
+
+    with NonceWriter(str(path)) as writer:
+        writer.add(3, True, NESTED_TRACES)
+
+    assert read_traces(str(path)) == {Target(0x01020304, 3, 'A'): NESTED_TRACES}
+
+
+@pytest.mark.parametrize('content', [b'NFCKEYS1' + bytes(RECORD.size), b'dump', b'\x00' * 100])
+def test_writer_refuses_other_files(tmp_path, content):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(content)
+
+    with pytest.raises(ValueError, match='not a nonce file'):
+        NonceWriter(str(path))
+    assert path.read_bytes() == content